@@ -0,0 +1,187 @@
+"""
+Bit-plane (src.bitboard) vs numpy-array backend for the set logic of the generators and verifiers.
+
+Operations, each on random planes of ~20% density:
+  overlap     does a 3x3 stamp at a random position hit the occupied cells
+  union       add the stamp to the occupied cells
+  popcount    number of occupied cells
+  shift       move a plane by (1, 1), dropping cells that leave the grid
+  ray         cells reachable from the occupied cells toward (1, 1) before a blocker (expansion rays)
+  cross_plus  the whole stamp placement loop of generate_cross_plus_recolor (bitboard vs array vs Python set)
+
+Each sample times `--inner` calls; numbers are per call.
+
+Usage (from the repository root):
+  python benchmarks/bench_bitboard.py --out bench_bitboard.json
+  python benchmarks/bench_bitboard.py --sizes 12 30 64 --compare bench_bitboard.json
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import summarize, write_results, compare, print_table  # noqa: E402
+from src.bitboard import Bitboard, shift_bits, stamp_bits  # noqa: E402
+from src.rules.color import OFFSETS  # noqa: E402
+
+KEY_FIELDS = ("op", "grid_size", "backend")
+
+
+def per_call(fn, inner: int, reps: int) -> list[float]:
+    samples = []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        for _ in range(inner):
+            fn()
+        samples.append((time.perf_counter() - t0) / inner)
+    return samples
+
+
+# ------------ array backend ------------
+
+def _np_shift(mask: np.ndarray, dr: int, dc: int) -> np.ndarray:
+    out = np.zeros_like(mask)
+    h, w = mask.shape
+    out[max(dr, 0):h + min(dr, 0), max(dc, 0):w + min(dc, 0)] = mask[max(-dr, 0):h - max(dr, 0),
+                                                                     max(-dc, 0):w - max(dc, 0)]
+    return out
+
+
+def _np_ray(mask: np.ndarray, blockers: np.ndarray, dr: int, dc: int) -> np.ndarray:
+    empty = ~blockers
+    reached = _np_shift(mask, dr, dc) & empty
+    while True:
+        grown = reached | (_np_shift(reached, dr, dc) & empty)
+        if np.array_equal(grown, reached):
+            return reached
+        reached = grown
+
+
+# ------------ cross_plus placement ------------
+
+def _placements(size: int, seed: int):
+    rng = random.Random(seed)
+    candidates = [(r, c) for r in range(size - 2) for c in range(size - 2)]
+    rng.shuffle(candidates)
+    return [(r, c, rng.choice(("cross", "plus"))) for r, c in candidates]
+
+
+def _place_bits(size, placements, stamps):
+    used, n = 0, 0
+    for r, c, shape in placements:
+        stamp = stamps[shape] << (r * size + c)
+        if not used & stamp:
+            used |= stamp
+            n += 1
+    return n
+
+
+def _place_array(size, placements, stamp_masks):
+    used, n = np.zeros((size, size), dtype=bool), 0
+    for r, c, shape in placements:
+        window = used[r:r + 3, c:c + 3]
+        if not (window & stamp_masks[shape]).any():
+            window |= stamp_masks[shape]
+            n += 1
+    return n
+
+
+def _place_set(size, placements):
+    used, n = set(), 0
+    for r, c, shape in placements:
+        cells = [(r + dr, c + dc) for dr, dc in OFFSETS[shape]]
+        if not any(cell in used for cell in cells):
+            used.update(cells)
+            n += 1
+    return n
+
+
+# ------------ run ------------
+
+def run(sizes, inner: int, reps: int) -> list[dict]:
+    results = []
+    for size in sizes:
+        rng = np.random.default_rng(size)
+        occupied = rng.random((size, size)) < 0.2
+        blockers = rng.random((size, size)) < 0.2
+        stamp_mask = np.zeros((3, 3), dtype=bool)
+        stamp_mask[tuple(zip(*OFFSETS["plus"]))] = True
+        r, c = size // 3, size // 2
+        board, blocker_board = Bitboard.from_mask(occupied), Bitboard.from_mask(blockers)
+        stamp = stamp_bits(OFFSETS["plus"], size) << (r * size + c)
+
+        ops = {
+            "overlap": {
+                "bitboard": lambda: bool(board.bits & stamp),
+                "array": lambda: bool((occupied[r:r + 3, c:c + 3] & stamp_mask).any()),
+            },
+            "union": {
+                "bitboard": lambda: board.bits | stamp,
+                "array": lambda: np.logical_or(occupied[r:r + 3, c:c + 3], stamp_mask,
+                                               out=occupied[r:r + 3, c:c + 3].copy()),
+            },
+            "popcount": {
+                "bitboard": lambda: board.bits.bit_count(),
+                "array": lambda: int(np.count_nonzero(occupied)),
+            },
+            "shift": {
+                "bitboard": lambda: shift_bits(board.bits, size, size, 1, 1),
+                "array": lambda: _np_shift(occupied, 1, 1),
+            },
+            "ray": {
+                "bitboard": lambda: board.ray(1, 1, blocker_board),
+                "array": lambda: _np_ray(occupied, blockers, 1, 1),
+            },
+        }
+        placements = _placements(size, seed=size)
+        stamps = {shape: stamp_bits(offsets, size) for shape, offsets in OFFSETS.items()}
+        stamp_masks = {}
+        for shape, offsets in OFFSETS.items():
+            stamp_masks[shape] = np.zeros((3, 3), dtype=bool)
+            stamp_masks[shape][tuple(zip(*offsets))] = True
+        ops["cross_plus"] = {
+            "bitboard": lambda: _place_bits(size, placements, stamps),
+            "array": lambda: _place_array(size, placements, stamp_masks),
+            "set": lambda: _place_set(size, placements),
+        }
+
+        for op, backends in ops.items():
+            n = max(1, inner // 100) if op == "cross_plus" else inner
+            for backend, fn in backends.items():
+                summary = summarize(per_call(fn, n, reps))
+                results.append({"op": op, "grid_size": size, "backend": backend, **summary})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="*", type=int, default=[12, 30])
+    parser.add_argument("--inner", type=int, default=2000, help="calls per timing sample")
+    parser.add_argument("--reps", type=int, default=20, help="timing samples per op")
+    parser.add_argument("--out", default="bench_bitboard.json")
+    parser.add_argument("--compare", help="earlier result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.2, help="p50 slowdown ratio counted as regression")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.inner, args.reps)
+    for r in results:
+        r["p50_us"] = 1e3 * r["p50_ms"]
+    print_table(results, ["op", "grid_size", "backend", "p50_us", "per_s"])
+    write_results(args.out, "bitboard", vars(args), results)
+
+    if args.compare:
+        regressions = compare(args.compare, results, KEY_FIELDS, args.threshold)
+        print(f"{len(regressions)} regression(s) vs {args.compare}")
+        print_table(regressions, list(KEY_FIELDS) + ["old_p50_ms", "new_p50_ms", "ratio"])
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Start-up cost of the entry points: wall time of a fresh interpreter per target, plus what `python -X importtime`
+attributes to imports.
+
+Targets are module imports ("import main", "import src.verify", ...) and short commands (`main.py --list`, a
+single-stimulus regeneration with and without a PNG). Per target:
+  p50_ms     wall time of the whole process (the regression-compared number)
+  import_ms  summed cumulative time of the top-level imports (importtime, median run)
+  modules    modules imported
+  numpy / matplotlib   whether the target loaded them
+
+Usage (from the repository root):
+  python benchmarks/bench_import.py --out bench_import.json
+  python benchmarks/bench_import.py --reps 10 --compare bench_import.json
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from benchmarks.common import summarize, write_results, compare, print_table  # noqa: E402
+
+KEY_FIELDS = ("target",)
+
+MODULES = ("main", "src.registry", "src.grid", "src.rules.attraction", "src.visualize", "src.render_service",
+           "src.regenerate", "src.verify", "src.metrics")
+
+
+def targets(png_path: str) -> dict:
+    """name -> argv after `python -X importtime`."""
+    out = {f"import {m}": ["-c", f"import {m}"] for m in MODULES}
+    out["main.py --list"] = ["main.py", "--list"]
+    out["regenerate (json)"] = ["-m", "src.regenerate", "--rule", "color.odd_recolor", "--seed", "1"]
+    out["regenerate (png)"] = ["-m", "src.regenerate", "--rule", "color.odd_recolor", "--seed", "1", "--png", png_path]
+    return out
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Summed top-level cumulative import time (ms), module count and the heavy modules seen."""
+    top_us, names = 0, set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        names.add(name.strip())
+        if not name[1:].startswith(" "):  # top level: "| name", nested imports are indented further
+            top_us += int(cumulative)
+    return {"import_ms": top_us / 1e3, "modules": len(names),
+            "numpy": "numpy" in names, "matplotlib": "matplotlib" in names}
+
+
+def run_target(argv: list, reps: int) -> dict:
+    walls, parsed = [], []
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-X", "importtime", *argv], cwd=ROOT, capture_output=True, text=True)
+        walls.append(time.perf_counter() - t0)
+        if proc.returncode != 0:
+            raise RuntimeError(f"{argv} failed:\n{proc.stderr[-2000:]}")
+        parsed.append(parse_importtime(proc.stderr))
+    median = sorted(parsed, key=lambda p: p["import_ms"])[len(parsed) // 2]
+    return {**summarize(walls), **median, "import_ms": statistics.median(p["import_ms"] for p in parsed)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reps", type=int, default=5, help="fresh interpreters per target")
+    parser.add_argument("--target", action="append", metavar="NAME", help="only these targets (default: all)")
+    parser.add_argument("--out", default="bench_import.json")
+    parser.add_argument("--compare", help="earlier result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.2, help="p50 slowdown ratio counted as regression")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, target_argv in targets(str(Path(tmp) / "combined.png")).items():
+            if args.target and name not in args.target:
+                continue
+            results.append({"target": name, **run_target(target_argv, args.reps)})
+    print_table(results, ["target", "p50_ms", "import_ms", "modules", "numpy", "matplotlib"])
+    write_results(args.out, "import", vars(args), results)
+
+    if args.compare:
+        regressions = compare(args.compare, results, KEY_FIELDS, args.threshold)
+        print(f"{len(regressions)} regression(s) vs {args.compare}")
+        print_table(regressions, list(KEY_FIELDS) + ["old_p50_ms", "new_p50_ms", "ratio"])
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+End-to-end benchmark for every rule in the rule registry (src.registry).
+
+For each rule, grid size and object count it times separately:
+  generate             the src/rules/* generator call
+  save_grid            one single-grid render (input and output are both timed)
+  save_combined_grids  the side-by-side render
+  metadata             Stimulus record creation + one JSONL append
+
+Object counts are applied through the same kwargs the quota scheduler uses (src.quota.steer); rules without a
+count knob run once per grid size with their defaults. Renders go to in-memory buffers, so disk speed is not part
+of the render numbers. Grids above --max-render-size (default 64: a figure is one inch per cell, so a 128x128
+render is ~12800 px square and can exhaust memory) are not rendered; those configurations get a
+{"stage": "render", "render": "skipped"} row instead of render timings and no "total", and a warning is printed.
+
+Usage (from the repository root):
+  python benchmarks/bench_rules.py --out bench.json
+  python benchmarks/bench_rules.py --rules "expansion.*" --sizes 12 32 --compare bench.json
+"""
+
+import argparse
+import io
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import summarize, timed, write_results, compare, print_table  # noqa: E402
+from src.quota import steer, N_OBJECTS_STEERING  # noqa: E402
+from src.registry import REGISTRY  # noqa: E402
+from src.stimulus import Stimulus  # noqa: E402
+from src.util import append_jsonl  # noqa: E402
+from src.visualize import save_grid, save_combined_grids  # noqa: E402
+
+KEY_FIELDS = ("rule", "grid_size", "n_objects", "stage")
+
+
+def bench_config(rule, gen, kwargs, gen_reps, render_reps, jsonl_path):
+    samples = {"generate": [], "save_grid": [], "save_combined_grids": [], "metadata": []}
+    pairs = []
+    for i in range(gen_reps):
+        random.seed(i)
+        dt, produced = timed(gen, **kwargs)
+        samples["generate"].append(dt)
+        if len(pairs) < render_reps:
+            pairs.append((i, produced))
+
+    for i, produced in pairs:
+        inp, out, params = (*produced, {})[:3]
+        for grid in (inp, out):
+            samples["save_grid"].append(timed(save_grid, grid, io.BytesIO())[0])
+        samples["save_combined_grids"].append(timed(save_combined_grids, inp, out, io.BytesIO())[0])
+
+        def write_meta():
+            stim = Stimulus(id=f"{rule}.t{i}", rule=rule, family=rule.split(".", 1)[0], seed=i, params=params)
+            append_jsonl(jsonl_path, stim.to_json_dict())
+
+        samples["metadata"].append(timed(write_meta)[0])
+    return samples
+
+
+def run(rules, sizes, counts, gen_reps, render_reps, max_render_size):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        jsonl_path = Path(tmp) / "stimuli.jsonl"
+        for rule in rules:
+            gen = REGISTRY.get(rule).generator
+            rule_counts = counts if rule in N_OBJECTS_STEERING else [None]
+            for size in sizes:
+                for count in rule_counts:
+                    kwargs = {"grid_size": (size, size)}
+                    if count is not None:
+                        kwargs.update(steer("n_objects", rule, count))
+                    skip_render = size > max_render_size
+                    reps = 0 if skip_render else render_reps
+                    base = {"rule": rule, "grid_size": size, "n_objects": count}
+                    try:
+                        samples = bench_config(rule, gen, kwargs, gen_reps, reps, jsonl_path)
+                    except (ValueError, IndexError) as e:  # infeasible size/count for this generator
+                        results.append({**base, "stage": "error", "error": f"{type(e).__name__}: {e}"})
+                        continue
+
+                    if skip_render and render_reps:
+                        results.append({**base, "stage": "render", "render": "skipped",
+                                        "error": f"grid_size > --max-render-size {max_render_size}"})
+                    summaries = {stage: summarize(s) for stage, s in samples.items() if s}
+                    for stage, summary in summaries.items():
+                        results.append({**base, "stage": stage, **summary})
+                    if len(summaries) == 4:
+                        per_stim = (summaries["generate"]["mean_ms"] + 2 * summaries["save_grid"]["mean_ms"]
+                                    + summaries["save_combined_grids"]["mean_ms"] + summaries["metadata"]["mean_ms"])
+                        results.append({**base, "stage": "total", "mean_ms": per_stim, "per_s": 1e3 / per_stim})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", nargs="*", default=["*"], help="glob patterns over rule names and families")
+    parser.add_argument("--sizes", nargs="*", type=int, default=[12, 32, 128])
+    parser.add_argument("--counts", nargs="*", type=int, default=[1, 4, 16])
+    parser.add_argument("--gen-reps", type=int, default=200)
+    parser.add_argument("--render-reps", type=int, default=5)
+    parser.add_argument("--max-render-size", type=int, default=64,
+                        help="skip rendering above this grid size (figures grow with the grid); raise it to time "
+                             "renders of the largest --sizes")
+    parser.add_argument("--out", default="bench_rules.json")
+    parser.add_argument("--compare", help="earlier result file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=1.2, help="p50 slowdown ratio counted as regression")
+    args = parser.parse_args(argv)
+
+    rules = [spec.name for spec in REGISTRY.select(args.rules)]
+    skipped = [size for size in args.sizes if size > args.max_render_size]
+    if skipped and args.render_reps:
+        print(f"warning: no render timings for grid sizes {skipped} (--max-render-size {args.max_render_size})",
+              file=sys.stderr)
+    results = run(rules, args.sizes, args.counts, args.gen_reps, args.render_reps, args.max_render_size)
+
+    print_table([r for r in results if r["stage"] in ("generate", "total", "render", "error")],
+                ["rule", "grid_size", "n_objects", "stage", "p50_ms", "p99_ms", "per_s", "error"])
+    write_results(args.out, "rules", vars(args), results)
+
+    if args.compare:
+        regressions = compare(args.compare, results, KEY_FIELDS, args.threshold)
+        print(f"{len(regressions)} regression(s) vs {args.compare}")
+        print_table(regressions, list(KEY_FIELDS) + ["old_p50_ms", "new_p50_ms", "ratio"])
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+"""Shared helpers for the benchmark scripts: timing summaries, result files and regression comparison."""
+
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(samples_s: list[float]) -> dict:
+    """Latency summary in milliseconds plus throughput (items/s) from per-item timings in seconds."""
+    values = sorted(samples_s)
+    total = sum(values)
+    return {
+        "n": len(values),
+        "mean_ms": 1e3 * total / len(values) if values else float("nan"),
+        "p50_ms": 1e3 * percentile(values, 0.50),
+        "p99_ms": 1e3 * percentile(values, 0.99),
+        "per_s": len(values) / total if total > 0 else float("inf"),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - t0, result
+
+
+def environment() -> dict:
+    env = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+    }
+    for mod in ("numpy", "matplotlib"):
+        try:
+            env[mod] = __import__(mod).__version__
+        except ImportError:
+            env[mod] = None
+    try:
+        env["git_rev"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        env["git_rev"] = None
+    return env
+
+
+def write_results(path, name: str, config: dict, results: list[dict]) -> None:
+    doc = {"benchmark": name, "environment": environment(), "config": config, "results": results}
+    Path(path).write_text(json.dumps(doc, indent=2), encoding="utf-8")
+    print("Wrote:", path)
+
+
+def compare(baseline_path, results: list[dict], key_fields: tuple, threshold: float = 1.2) -> list[dict]:
+    """Entries whose p50 got slower than `threshold` x the baseline's p50 for the same key."""
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))["results"]
+    base_by_key = {tuple(r.get(k) for k in key_fields): r for r in baseline}
+    regressions = []
+    for r in results:
+        old = base_by_key.get(tuple(r.get(k) for k in key_fields))
+        if not old or not old.get("p50_ms") or r.get("p50_ms") is None:
+            continue
+        ratio = r["p50_ms"] / old["p50_ms"]
+        if ratio > threshold:
+            regressions.append({**{k: r.get(k) for k in key_fields}, "old_p50_ms": old["p50_ms"],
+                                "new_p50_ms": r["p50_ms"], "ratio": ratio})
+    return regressions
+
+
+def print_table(rows: list[dict], columns: list[str]) -> None:
+    def fmt(v):
+        return f"{v:.3f}" if isinstance(v, float) else str(v)
+
+    cells = [[fmt(r.get(c, "")) for c in columns] for r in rows]
+    widths = [max(len(c), *(len(row[i]) for row in cells)) if cells else len(c) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in cells:
+        print("  ".join(v.ljust(w) for v, w in zip(row, widths)))
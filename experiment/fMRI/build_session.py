@@ -42,6 +42,14 @@ Expected directory layout:
   out/<rule_dir>/stimuli.jsonl
   out/<rule_dir>/<stim_id>.combined.png
 
+or, for sharded builds (main.py with fmt="tar"):
+
+  out/shards/index.jsonl
+  out/shards/shard-XXXXXX.tar
+
+Combined images of sharded stimuli are extracted next to the session file (stimuli/<stim_id>.combined.png)
+only for the stimuli that end up in the session.
+
 Each JSONL row should contain at least:
   - id:        unique stimulus identifier (used to find <id>.combined.png)
   - rule:      sub_rule string (e.g., "expansion.star_full")
@@ -76,6 +84,7 @@ trial entry = {
 
 import json
 import random
+import sqlite3
 from pathlib import Path
 
 
@@ -90,6 +99,13 @@ def relpath(path: Path, base_dir: Path) -> str:
     return str(path.resolve().relative_to(base_dir)).replace("\\", "/")
 
 
+def read_shard_member(shard_dir: Path, entry: dict, suffix: str) -> bytes:
+    member = entry["members"][suffix]
+    with (shard_dir / entry["shard"]).open("rb") as f:
+        f.seek(member["offset"])
+        return f.read(member["size"])
+
+
 # ---------------- pretty key labels ----------------
 DISPLAY_KEY = {
     "LeftArrow": "←",
@@ -110,6 +126,20 @@ def tip_pair(left_key: str, left_text: str, right_key: str, right_text: str, gap
 
 
 # ---------------- stimuli pool ----------------
+def collect_pools_from_shards(out_root: Path) -> dict[str, dict[str, list[dict]]]:
+    pools: dict[str, dict[str, list[dict]]] = {}
+    shard_dir = out_root / "shards"
+    for entry in load_jsonl(shard_dir / "index.jsonl"):
+        sub_rule, stim_id = entry.get("rule"), entry.get("id")
+        if not sub_rule or not stim_id or "combined.png" not in entry.get("members", {}):
+            continue
+        family = entry.get("family") or sub_rule.split(".", 1)[0] or "unknown"
+        pools.setdefault(family, {}).setdefault(sub_rule, []).append(
+            {"id": stim_id, "seed": entry.get("seed"), "shard_dir": shard_dir, "shard_entry": entry}
+        )
+    return pools
+
+
 def collect_pools(out_root: Path) -> dict[str, dict[str, list[dict]]]:
     """
     Build stimulus pools from `out_root`.
@@ -117,16 +147,18 @@ def collect_pools(out_root: Path) -> dict[str, dict[str, list[dict]]]:
     Returns:
       pools[family][sub_rule] = list of stimulus dicts:
         {"id": <str>, "seed": <int|None>, "combined_path": <Path>}
+      sharded stimuli carry {"shard_dir", "shard_entry"} instead of "combined_path" (see resolve_combined)
 
     Expects:
       out/<rule_dir>/stimuli.jsonl
       out/<rule_dir>/<stim_id>.combined.png
+      and/or out/shards/index.jsonl
 
     Notes:
       - sub_rule is read from JSON key "rule"
       - family is read from JSON key "family" or inferred from sub_rule prefix
     """
-    pools: dict[str, dict[str, list[dict]]] = {}
+    pools = collect_pools_from_shards(out_root)
 
     for rule_dir in out_root.iterdir():
         if not rule_dir.is_dir():
@@ -151,11 +183,52 @@ def collect_pools(out_root: Path) -> dict[str, dict[str, list[dict]]]:
     return pools
 
 
+def collect_pools_from_catalog(catalog_path: Path, out_root: Path) -> dict[str, dict[str, list[dict]]]:
+    """
+    Same as `collect_pools`, but reads loose-file stimuli from the SQLite catalog written by main.py
+    (out/catalog.sqlite) instead of scanning every rule directory. Sharded stimuli still come from the shard index.
+    """
+    pools = collect_pools_from_shards(out_root)
+    with sqlite3.connect(catalog_path) as conn:
+        rows = conn.execute(
+            "SELECT id, rule, family, seed, combined_path FROM stimuli "
+            "WHERE shard IS NULL AND combined_path IS NOT NULL"
+        )
+        for stim_id, sub_rule, family, seed, combined in rows:
+            combined_path = out_root / combined
+            if not combined_path.exists():
+                continue
+            pools.setdefault(family or sub_rule.split(".", 1)[0], {}).setdefault(sub_rule, []).append(
+                {"id": stim_id, "seed": seed, "combined_path": combined_path}
+            )
+    return pools
+
+
+def drop_ambiguous(pools: dict[str, dict[str, list[dict]]], report_path: Path) -> dict[str, dict[str, list[dict]]]:
+    """Remove stimuli that the ambiguity report flags as consistent with more than one sub_rule."""
+    flagged = {f["id"] for f in json.loads(report_path.read_text(encoding="utf-8"))["flagged"]}
+    return {
+        family: {sub_rule: [s for s in pool if s.get("id") not in flagged] for sub_rule, pool in family_pool.items()}
+        for family, family_pool in pools.items()
+    }
+
+
 # ---------------- picking ----------------
 def uid(stimulus: dict) -> str:
     return str(stimulus.get("id") or stimulus["combined_path"])
 
 
+def resolve_combined(stimulus: dict, base_dir: Path) -> Path:
+    """Path of the combined image; sharded stimuli are extracted to base_dir/stimuli/ on first use."""
+    if "combined_path" not in stimulus:
+        dest = base_dir / "stimuli" / f"{stimulus['id']}.combined.png"
+        if not dest.exists():
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            dest.write_bytes(read_shard_member(stimulus["shard_dir"], stimulus["shard_entry"], "combined.png"))
+        stimulus["combined_path"] = dest
+    return stimulus["combined_path"]
+
+
 def available_pairs(pool: list[dict], used_stimuli_ids: set[str]) -> int:
     return sum(1 for stimulus in pool if uid(stimulus) not in used_stimuli_ids) // 2
 
@@ -218,7 +291,10 @@ def trial_entry(
 ) -> dict:
     stim_first, stim_second = pair
     trial = {
-        "imgs": [relpath(stim_first["combined_path"], base_dir), relpath(stim_second["combined_path"], base_dir)],
+        "imgs": [
+            relpath(resolve_combined(stim_first, base_dir), base_dir),
+            relpath(resolve_combined(stim_second, base_dir), base_dir),
+        ],
         "family": family,
         "sub_rule": sub_rule,
         "ids": [stim_first.get("id"), stim_second.get("id")],
@@ -336,6 +412,8 @@ def build_session(
         inference_hint: str = "Previous rule",
         application_bg: str = "red",
         application_hint: str = "Memorized rule",
+        catalog_path: str | None = None,
+        ambiguity_report: str | None = None,  # JSON from `python -m src.ambiguity`; its flagged stimuli are skipped
 ):
     rng = random.Random(seed)
     out_base = Path(out_root).resolve()
@@ -343,7 +421,9 @@ def build_session(
     base_dir = session_file.parent.resolve()
     base_dir.mkdir(parents=True, exist_ok=True)
 
-    pools = collect_pools(out_base)
+    pools = collect_pools_from_catalog(Path(catalog_path), out_base) if catalog_path else collect_pools(out_base)
+    if ambiguity_report:
+        pools = drop_ambiguous(pools, Path(ambiguity_report))
     families = sorted(pools.keys())
     rng.shuffle(families)
 
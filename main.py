@@ -1,113 +1,756 @@
+import argparse
+import json
 import random
+from collections import defaultdict, deque
+from concurrent.futures import Future
 from pathlib import Path
 
-from src.visualize import save_grid, save_combined_grids
 from src.stimulus import Stimulus
-from src.util import append_jsonl, next_idx, new_seed
-
-from src.rules.color import (
-    generate_cross_plus_recolor,
-    generate_inversion_recolor,
-    generate_odd_color_recolor,
-)
-
-from src.rules.arithmetic import (
-    generate_majority_recolor,
-    generate_minority_recolor,
-
-)
-from src.rules.expansion import (
-    generate_star_expansion_single_step,
-    generate_star_expansion_full,
-    generate_plus_expansion_single_step,
-    generate_plus_expansion_full,
-    generate_3diagonal_expansion_full,
-)
-from src.rules.occlusion import (
-    generate_occlusion_reversal,
-)
-from src.rules.attraction import (
-    generate_color_attraction,
-    generate_size_attraction,
-    generate_repulsion_gun,
-    generate_repulsion_ambiguous,
-    generate_gravity,
-    generate_float, generate_dots_gravity,
-)
-
-from src.rules.mirror_rotate import (
-    generate_occlusion_mirror_x,
-    generate_occlusion_mirror_y,
-    generate_occlusion_rotate_90,
-    generate_occlusion_rotate_180,
-)
-
-
-def main(N=15):
-    tasks = {
-        "occlusion_reversal": generate_occlusion_reversal,
-        "mirror_rotate.occlusion_mirror_x": generate_occlusion_mirror_x,
-        "mirror_rotate.occlusion_mirror_y": generate_occlusion_mirror_y,
-        "mirror_rotate.occlusion_rotate_90": generate_occlusion_rotate_90,
-        "mirror_rotate.occlusion_rotate_180": generate_occlusion_rotate_180,
-        "attraction.color": generate_color_attraction,
-        "attraction.size": generate_size_attraction,
-        "attraction.gravity": generate_gravity,
-        "attraction.float": generate_float,
-        "attraction.repulsion_gun": generate_repulsion_gun,
-        "attraction.repulsion_ambiguous": generate_repulsion_ambiguous,
-        "expansion.star_step": generate_star_expansion_single_step,
-        "expansion.star_full": generate_star_expansion_full,
-        "expansion.plus_step": generate_plus_expansion_single_step,
-        "expansion.plus_full": generate_plus_expansion_full,
-        "expansion.3diagonal_full": generate_3diagonal_expansion_full,
-        "arithmetic.majority_recolor": generate_majority_recolor,
-        "arithmetic.minority_recolor": generate_minority_recolor,
-        "color.inversion_recolor": generate_inversion_recolor,
-        "color.odd_recolor": generate_odd_color_recolor,
-        "color.cross_plus_recolor": generate_cross_plus_recolor,
-        "attraction.gravity_dots": generate_dots_gravity,
-    }
-
-    for name, gen in tasks.items():
-        for _ in range(N):
-            _generate_task(name, gen)
-
-
-def _generate_task(rule: str, gen, out_root: str = "out") -> None:
-    base = Path(out_root) / rule
-    base.mkdir(parents=True, exist_ok=True)
-    jsonl_path = base / "stimuli.jsonl"
-
-    idx = next_idx(jsonl_path)
-    seed = new_seed()
+from src import profiling
+from src.util import new_seed
+from src.dedup import DedupIndex
+from src.quota import QuotaScheduler
+from src.catalog import Catalog, CATALOG_NAME
+from src.manifest import DirectoryWriter, load_records, record_idx
+from src.registry import REGISTRY, parse_param
+from src.shards import ShardWriter, npy_bytes
+from src.grid import Grid
+
+# numpy (metrics, codec, delta, augment) and matplotlib (render_service) are imported inside the functions that
+# use them, so `--help`, `--list` and tools importing this module start without them.
+
+
+def main(
+        N=15,
+        out_root="out",
+        fmt="png",
+        rules=("*",),
+        counts=None,
+        overrides=None,
+        seed=None,
+        workers=1,
+        render_workers=0,
+        augment=0,
+        matched_sets=0,
+        quotas=None,
+        quota_key="n_objects",
+        dedup=True,
+        modulo_symmetry=False,
+        modulo_palette=False,
+        catalog=True,
+        profile=None,
+        memprofile=None,
+        memprofile_threshold_mb=512.0,
+):
+    """
+    `rules`: glob patterns over rule names and families (see src.registry); only the selected rules' modules
+    are imported.
+    `counts`: rule name -> number of stimuli, overriding `N`; `overrides`: rule name -> generator kwargs.
+    `seed`: master seed; each rule's seed stream is derived from it and the rule name, so a fresh build is
+    reproducible independent of `workers`.
+    `workers`: rules are built in that many processes ("png" and "none" formats only).
+    `render_workers`: render the PNGs of a single-worker build in that many processes (src.render_service);
+    records are written in order as their PNGs arrive.
+    `augment`: derived stimuli (dihedral transforms / palette permutations, see src.augment) added per
+    generated stimulus.
+    `matched_sets`: additionally build that many matched sets of the selected occlusion-derived rules (one shared
+    input per set, see `ensure_matched_sets`).
+    `quotas`: rule name -> {bin value: count}, binned by `quota_key` (a params or difficulty name, see
+    src.quota); these rules are filled bin by bin (`fill_quotas`) instead of to a flat count.
+    `profile`: path for a Chrome trace of the build; also prints a per-stage summary table.
+    `memprofile`: path for a JSON peak-memory report (per rule/stage peaks, peak RSS, top allocators,
+    stimuli over `memprofile_threshold_mb`); see src.memprofile.
+    """
+    plan = build_plan(rules, N, counts, overrides)
+    if workers > 1:
+        if matched_sets:
+            raise ValueError("Matched sets span several rules and need a single worker")
+        if fmt not in ("png", "none"):
+            raise ValueError(f"Format {fmt!r} writes shared shards and cannot be built with several workers")
+        if profile or memprofile:
+            raise ValueError("Profiling needs a single worker")
+        if render_workers:
+            raise ValueError("Rule workers render in-process; use either workers or render_workers")
+        if quotas:
+            raise ValueError("Quota builds need a single worker")
+        _build_parallel(plan, out_root, fmt, seed, workers, augment, (dedup, modulo_symmetry, modulo_palette), catalog)
+        return
+
+    tracker, catalog_db = None, None
+    try:
+        if memprofile:
+            from src import memprofile as memprofile_mod  # tracemalloc + platform RSS probes, only in this mode
+
+            tracker = memprofile_mod.enable(threshold_mb=memprofile_threshold_mb)
+        if profile and not tracker:
+            profiling.enable()
+        index = DedupIndex(modulo_symmetry, modulo_palette) if dedup else None
+        catalog_db = Catalog(Path(out_root) / CATALOG_NAME) if catalog else None
+        scheduler = QuotaScheduler(quotas, key=quota_key) if quotas else None
+        if render_workers:
+            start_renderer(render_workers)
+        with open_writer(out_root, fmt, catalog=catalog_db) as writer:
+            for spec, n, kwargs in plan:
+                if scheduler is not None and spec.name in scheduler.targets:
+                    fill_quotas(scheduler, writer, dedup=index, rules=[spec.name], overrides={spec.name: kwargs},
+                                seed=seed)
+                else:
+                    ensure_rule(spec.name, spec.generator, n, writer, dedup=index, kwargs=kwargs, seed=seed)
+                flush_renders()  # augment_rule reads the rule's records back
+                if augment:
+                    augment_rule(spec.name, spec.generator, augment, writer, dedup=index)
+            if matched_sets:
+                ensure_matched_sets(plan, matched_sets, writer, dedup=index, seed=seed)
+            flush_renders()
+    finally:
+        # also on failure: unpatch / stop tracing for later builds in this process, keep the partial profile
+        stop_renderer()
+        if catalog_db is not None:
+            catalog_db.close()
+        if tracker is not None:
+            memprofile_mod.disable()
+            tracker.print_summary()
+            tracker.print_top_allocators()
+            Path(memprofile).write_text(json.dumps(tracker.report(), indent=2), encoding="utf-8")
+        if profile:
+            profiling.disable()
+            profiling.print_summary()
+            profiling.dump_trace(profile)
+
+
+def build_plan(rules=("*",), n: int = 15, counts: dict | None = None, overrides: dict | None = None) -> list:
+    """[(RuleSpec, count, generator kwargs)] for the rules matching the `rules` globs."""
+    specs = REGISTRY.select(rules)
+    if not specs:
+        raise ValueError(f"No rule matches {list(rules)}; known rules: {REGISTRY.names()}")
+    plan = []
+    for spec in specs:
+        kwargs = (overrides or {}).get(spec.name, {})
+        spec.check_kwargs(kwargs)
+        plan.append((spec, (counts or {}).get(spec.name, n), kwargs))
+    return plan
+
+
+def _build_parallel(plan, out_root, fmt, seed, workers, augment, dedup_opts, catalog) -> None:
+    from concurrent.futures import ProcessPoolExecutor
+
+    jobs = [(spec.name, n, kwargs, out_root, fmt, seed, augment, dedup_opts) for spec, n, kwargs in plan]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for name, generated in zip([job[0] for job in jobs], pool.map(_build_rule_job, jobs)):
+            print(f"{name}: {generated} new")
+    if catalog:  # workers only write manifests; the catalog has a single writer
+        with Catalog(Path(out_root) / CATALOG_NAME) as catalog_db:
+            for spec, _, _ in plan:
+                catalog_db.replace_rule(spec.name, load_records(Path(out_root) / spec.name / "stimuli.jsonl"))
+
+
+def _build_rule_job(job) -> int:
+    name, n, kwargs, out_root, fmt, seed, augment, (dedup, modulo_symmetry, modulo_palette) = job
+    index = DedupIndex(modulo_symmetry, modulo_palette) if dedup else None
+    gen = REGISTRY.get(name).generator
+    with open_writer(out_root, fmt) as writer:
+        generated = ensure_rule(name, gen, n, writer, dedup=index, kwargs=kwargs, seed=seed)
+        if augment:
+            generated += augment_rule(name, gen, augment, writer, dedup=index)
+        return generated
+
+
+def open_writer(out_root: str = "out", fmt: str = "png", shard_size: int = 1000, catalog: Catalog | None = None):
+    """
+    "png": loose files in out_root/<rule>/ (default)
+    "tar": tar shards with PNGs in out_root/shards/; "tar-npy" stores palette-index arrays instead of PNGs,
+    "tar-delta" the input array and the output as a src.delta (output array where the shapes differ)
+    "none": manifests only, nothing is rendered (matplotlib is never imported)
+    Written records are also added to `catalog` if given.
+    """
+    if fmt == "png":
+        return DirectoryWriter(out_root, catalog=catalog)
+    if fmt == "none":
+        return DirectoryWriter(out_root, catalog=catalog, payload=())
+    if fmt == "tar":
+        return ShardWriter(out_root, shard_size=shard_size, payload=("png",), catalog=catalog)
+    if fmt == "tar-npy":
+        return ShardWriter(out_root, shard_size=shard_size, payload=("npy",), catalog=catalog)
+    if fmt == "tar-delta":
+        return ShardWriter(out_root, shard_size=shard_size, payload=("delta",), catalog=catalog)
+    raise ValueError(f"Unknown output format: {fmt}")
+
+
+def fill_quotas(scheduler: QuotaScheduler, writer, dedup: DedupIndex | None = None, rules=None,
+                overrides: dict | None = None, seed: int | None = None):
+    """
+    Generate until every (rule, bin) quota of `scheduler` is met, for `rules` (default: all of its rules).
+
+    Generator kwargs are steered towards the most under-filled bin, on top of the rule's `overrides`; pairs
+    landing in a full bin are dropped before rendering. Stimuli already in `writer`'s output count towards the
+    quotas. `seed` fixes each rule's seed stream as in `ensure_rule`.
+    """
+    rules = list(rules or scheduler.targets)
+    for rule in rules:
+        if seed is not None:
+            random.seed(f"{seed}:{rule}")
+        with profiling.rule_scope(rule):
+            _fill_rule_quota(rule, REGISTRY.get(rule).generator, scheduler, writer, dedup,
+                             (overrides or {}).get(rule))
+
+    for rule, bins in scheduler.unfilled().items():
+        if rule in rules:
+            print(f"{rule}: gave up on bins {bins}")
+
+
+def _fill_rule_quota(rule: str, gen, scheduler: QuotaScheduler, writer, dedup: DedupIndex | None,
+                     base_kwargs: dict | None = None) -> None:
+    records = writer.existing(rule)
+    scheduler.load_records(rule, records)
+    if dedup is not None:
+        dedup.load_records(rule, records, regenerate=_regenerator(gen))
+
+    idx = max((record_idx(rec) for rec in records), default=0) + 1
+    while not scheduler.done(rule):
+        target, steered = scheduler.next_kwargs(rule)
+        kwargs = {**(base_kwargs or {}), **steered}
+        try:
+            written = _generate_task(
+                rule, gen, writer, idx, dedup=dedup, kwargs=kwargs,
+                accept=lambda rec: scheduler.accept(rule, rec),
+            )
+        except ValueError:  # steered kwargs can be infeasible, e.g. a grid too small for the objects
+            written = False
+        if written:
+            idx += 1
+        else:
+            scheduler.miss(rule, target)
+
+
+def ensure_rule(
+        rule: str,
+        gen,
+        n: int,
+        writer,
+        dedup: DedupIndex | None = None,
+        kwargs: dict | None = None,
+        seed: int | None = None,
+) -> int:
+    """
+    Make sure `writer`'s output holds `n` complete stimuli of `rule` and generate only the missing ones.
+    Derived stimuli (see `augment_rule`) do not count towards `n`.
+
+    Incomplete records and orphaned files from an interrupted build are cleaned up first (see `src.manifest`).
+    With `dedup`, pairs already present for the rule are rejected before rendering.
+    `kwargs` are passed to the generator; `seed` fixes the rule's seed stream.
+    Returns the number of newly generated stimuli.
+    """
+    from src.augment import is_derived
+
+    if seed is not None:
+        random.seed(f"{seed}:{rule}")  # stimulus seeds are drawn from the global stream, see _generate_task
+    with profiling.rule_scope(rule):
+        records = writer.existing(rule)
+        if dedup is not None:
+            dedup.load_records(rule, records, regenerate=_regenerator(gen))
+
+        idx = max((record_idx(rec) for rec in records), default=0) + 1
+        sources = sum(not is_derived(rec) for rec in records)
+        generated = 0
+        for _ in range(max(0, n - sources)):
+            if not _generate_task(rule, gen, writer, idx, dedup=dedup, kwargs=kwargs):
+                print(f"{rule}: no new unique pair found, stopping at {sources + generated}/{n}")
+                break
+            generated += 1
+            idx += 1
+
+    return generated
+
+
+def _regenerator(gen):
+    """Rebuild the (input, output) grids of a record from its seed, without rendering."""
+    from src.augment import is_derived, reapply
+
+    def regenerate(rec):
+        produced = _produce(gen, rec["seed"], rec.get("gen_kwargs"))
+        return (reapply(rec["params"], produced) if is_derived(rec) else produced)[:2]
+    return regenerate
+
+
+# rule -> output of src.rules.mirror_rotate.OcclusionSet; their generators share one input per seed
+MATCHED_OUTPUTS = {
+    "occlusion_reversal": "reversal",
+    "mirror_rotate.occlusion_mirror_x": "mirror_x",
+    "mirror_rotate.occlusion_mirror_y": "mirror_y",
+    "mirror_rotate.occlusion_rotate_90": "rotate_90",
+    "mirror_rotate.occlusion_rotate_180": "rotate_180",
+}
+
+
+def ensure_matched_sets(plan, n: int, writer, dedup: DedupIndex | None = None, seed: int | None = None) -> int:
+    """
+    Make sure `writer`'s output holds `n` matched sets: for one random input, a stimulus of every rule of `plan`
+    in MATCHED_OUTPUTS. All members of a set have the same seed (each regenerates from its own rule) and
+    params["matched_set"]; a set with any duplicate pair is dropped as a whole. Returns the number of new sets.
+    """
+    from src.metrics import batch_metrics
+
+    from src.rules.mirror_rotate import OcclusionSet
+
+    members = [(spec.name, kwargs) for spec, _, kwargs in plan if spec.name in MATCHED_OUTPUTS]
+    if not members:
+        raise ValueError(f"Matched sets need some of {list(MATCHED_OUTPUTS)}")
+    kwargs = members[0][1]
+    if any(k != kwargs for _, k in members):
+        raise ValueError("The rules of a matched set need the same generator kwargs")
+    rules = [name for name, _ in members]
+
+    if seed is not None:
+        random.seed(f"{seed}:matched_sets")
+    records = {rule: writer.existing(rule) for rule in rules}
+    if dedup is not None:
+        for rule in rules:
+            dedup.load_records(rule, records[rule], regenerate=_regenerator(REGISTRY.get(rule).generator))
+    done = {(rec.get("params") or {}).get("matched_set") for recs in records.values() for rec in recs}
+    done.discard(None)
+    idx = {rule: max((record_idx(rec) for rec in recs), default=0) + 1 for rule, recs in records.items()}
+
+    generated = 0
+    for k in range(len(done) + 1, n + 1):
+        for _ in range(100):
+            set_seed = new_seed()
+            random.seed(set_seed)
+            shared = OcclusionSet(**kwargs)
+            pairs = {rule: shared.pair(MATCHED_OUTPUTS[rule]) for rule in rules}
+            fingerprints = ({rule: dedup.fingerprint(*pair[:2]) for rule, pair in pairs.items()}
+                            if dedup is not None else {})
+            if not any(dedup.contains(rule, fp) for rule, fp in fingerprints.items()):
+                break
+        else:
+            print(f"matched sets: no new unique set found, stopping at {k - 1}/{n}")
+            break
+
+        difficulties = batch_metrics([p[0] for p in pairs.values()], [p[1] for p in pairs.values()])
+        for (rule, (inp, out, params)), difficulty in zip(pairs.items(), difficulties):
+            with profiling.rule_scope(rule):
+                if dedup is not None:
+                    dedup.add(rule, fingerprints[rule])
+                params = {**params, "matched_set": f"occlusion.s{k}"}
+                _write_stimulus(rule, writer, idx[rule], set_seed, inp, out, params, difficulty,
+                                fingerprints.get(rule), kwargs)
+                idx[rule] += 1
+        generated += 1
+    return generated
+
+
+def augment_rule(rule: str, gen, per_source: int, writer, dedup: DedupIndex | None = None, palette=None) -> int:
+    """
+    Add up to `per_source` derived stimuli per generated stimulus of `rule`: the source pair under a transform
+    the rule is invariant to (src.augment), recorded in params["augment"] and rebuilt from the source's seed.
+    A source's transforms are fixed by its seed, so reruns only add the missing ones. With `dedup`, derived
+    pairs equal to an existing one are dropped (with modulo_symmetry, all dihedral ones are).
+    Returns the number of new stimuli.
+    """
+    from src.augment import augment_pairs, choose, is_derived, transformed_params
+    from src.metrics import batch_metrics
+
+    with profiling.rule_scope(rule):
+        records = writer.existing(rule)
+        if dedup is not None:
+            dedup.load_records(rule, records, regenerate=_regenerator(gen))
+        taken = defaultdict(list)
+        for rec in records:
+            if is_derived(rec):
+                aug = rec["params"]["augment"]
+                taken[aug["source"]].append((aug["dihedral"], aug.get("palette") or {}))
+
+        sources, transforms = [], []
+        for rec in records:
+            if not is_derived(rec) and rec.get("seed") is not None:
+                todo = choose(rule, rec, per_source - len(taken[rec["id"]]), palette, taken[rec["id"]])
+                if todo:
+                    sources.append(rec)
+                    transforms.append(todo)
+        if not sources:
+            return 0
+
+        with profiling.stage("generate"):
+            produced = [_produce(gen, rec["seed"], rec.get("gen_kwargs")) for rec in sources]
+        with profiling.stage("augment"):
+            derived = augment_pairs([p[0] for p in produced], [p[1] for p in produced], transforms)
+        jobs = [(rec, transformed_params(params, d, m, rec["id"]), pair)
+                for rec, (_, _, params), ts, pairs in zip(sources, produced, transforms, derived)
+                for (d, m), pair in zip(ts, pairs)]
+        with profiling.stage("metrics"):
+            difficulties = batch_metrics([pair[0] for _, _, pair in jobs], [pair[1] for _, _, pair in jobs])
+
+        idx = max((record_idx(rec) for rec in records), default=0) + 1
+        generated = 0
+        for (rec, params, (a, b)), difficulty in zip(jobs, difficulties):
+            profiling.set_item(f"{rule}.t{idx}")
+            inp, out = Grid.from_array(a), Grid.from_array(b)
+            fingerprint = None
+            if dedup is not None:
+                with profiling.stage("fingerprint"):
+                    fingerprint = dedup.fingerprint(inp, out)
+                if dedup.contains(rule, fingerprint):
+                    profiling.count("dedup_rejects")
+                    continue
+                dedup.add(rule, fingerprint)
+            _write_stimulus(rule, writer, idx, rec["seed"], inp, out, params, difficulty, fingerprint,
+                            rec.get("gen_kwargs"))
+            generated += 1
+            idx += 1
+    return generated
+
+
+def _produce(gen, seed: int, kwargs: dict | None = None):
     random.seed(seed)
+    produced = gen(**(kwargs or {}))
+    return (*produced, {})[:3]
+
 
-    produced = gen()
-    inp, out, params = (*produced, {})[:3]
+def _generate_task(
+        rule: str,
+        gen,
+        writer,
+        idx: int,
+        dedup: DedupIndex | None = None,
+        max_attempts: int = 100,
+        kwargs: dict | None = None,
+        accept=None,
+) -> bool:
+    """
+    Generate, render and record one stimulus. Returns False if nothing was written: no unique pair within
+    `max_attempts` seeds, or `accept(record)` turned the pair down (checked before rendering).
+    """
+    from src.metrics import pair_metrics
 
-    stim_id = f"{rule}.t{idx}"
-    p_in = base / f"{stim_id}.input.png"
-    p_out = base / f"{stim_id}.output.png"
-    p_comb = base / f"{stim_id}.combined.png"
+    profiling.set_item(f"{rule}.t{idx}")
+    fingerprint = None
+    for _ in range(max_attempts):
+        seed = new_seed()
+        with profiling.stage("generate"):
+            try:
+                inp, out, params = _produce(gen, seed, kwargs)
+            except Exception:
+                profiling.count("failures")
+                raise
+        if dedup is None:
+            break
+        with profiling.stage("fingerprint"):
+            fingerprint = dedup.fingerprint(inp, out)
+        if not dedup.contains(rule, fingerprint):
+            break
+        profiling.count("dedup_rejects")
+    else:
+        return False
 
-    save_grid(inp, str(p_in))
-    save_grid(out, str(p_out))
-    save_combined_grids(inp, out, str(p_comb))
+    with profiling.stage("metrics"):
+        difficulty = pair_metrics(inp, out)
+    if accept is not None and not accept({"params": params, "difficulty": difficulty}):
+        profiling.count("quota_rejects")
+        return False
+    if dedup is not None:
+        dedup.add(rule, fingerprint)
+    _write_stimulus(rule, writer, idx, seed, inp, out, params, difficulty, fingerprint, kwargs)
+    return True
+
+
+def _write_stimulus(rule: str, writer, idx: int, seed: int, inp, out, params: dict, difficulty: dict,
+                    fingerprint: str | None, kwargs: dict | None) -> None:
+    """Render the pair in `writer`'s payload formats and write its record."""
+    from src.codec import encode_pair
+
+    blobs = {}
+    with profiling.stage("render"):
+        if "png" in writer.payload:
+            blobs["input.png"] = _cached_png("grid", inp)
+            blobs["output.png"] = _cached_png("grid", out)
+            blobs["combined.png"] = _cached_png("combined", inp, out)
+        if "npy" in writer.payload:
+            blobs["input.npy"] = npy_bytes(inp.to_array())
+            blobs["output.npy"] = npy_bytes(out.to_array())
+        if "delta" in writer.payload:
+            from src.delta import delta_bytes, diff
+
+            a, b = inp.to_array(), out.to_array()
+            blobs["input.npy"] = npy_bytes(a)
+            if a.shape == b.shape:
+                blobs["delta.bin"] = delta_bytes(diff(a, b))
+            else:
+                blobs["output.npy"] = npy_bytes(b)
 
     family = rule.split(".", 1)[0]
 
     stim = Stimulus(
-        id=stim_id,
+        id=f"{rule}.t{idx}",
         rule=rule,
         family=family,
         seed=seed,
-        params=params
+        params=params,
+        difficulty=difficulty,
+        fingerprint=fingerprint,
+        gen_kwargs=kwargs or None,
+        grids=encode_pair(inp, out),
     )
 
-    rec = stim.to_json_dict()
-    append_jsonl(jsonl_path, rec)
+    profiling.count("stimuli")
+    if _RENDERER is not None and "png" in writer.payload:
+        _PENDING.append((writer, stim.to_json_dict(), blobs))
+        while len(_PENDING) > RENDER_WINDOW:
+            _write_record(*_PENDING.popleft())
+    else:
+        _write_record(writer, stim.to_json_dict(), blobs)
+
+
+def _write_record(writer, rec: dict, blobs: dict) -> None:
+    blobs = {name: data.result() if isinstance(data, Future) else data for name, data in blobs.items()}
+    with profiling.stage("write"):
+        writer.write(rec, blobs)
+    profiling.count("bytes_written", sum(len(data) for data in blobs.values()))
+
+
+# ------------ rendering ------------
+
+_RENDERER = None  # RenderService, set while a build renders in worker processes (render_workers)
+_PENDING = deque()  # (writer, record, blobs with PNG futures), written in order once rendered
+RENDER_WINDOW = 256  # stimuli in flight before the oldest is waited for
+
+_PNG_CACHE = {}  # (kind, grid keys) -> PNG bytes (or their future)
+PNG_CACHE_SIZE = 64
+
+
+def _cached_png(kind: str, *grids):
+    """
+    PNG of the grids, reused for grids equal to a recent one (Grid.key): matched sets share their input,
+    symmetric grids repeat across augmented variants. A Future while a RenderService is running.
+    """
+    from src.render_service import render_png
+
+    key = (kind, *(g.key() for g in grids))
+    if key in _PNG_CACHE:
+        profiling.count("render_cache_hits")
+        return _PNG_CACHE[key]
+    arrays = [g.to_array() for g in grids]
+    data = _RENDERER.submit(kind, *arrays) if _RENDERER is not None else render_png(kind, *arrays)
+    if len(_PNG_CACHE) >= PNG_CACHE_SIZE:
+        del _PNG_CACHE[next(iter(_PNG_CACHE))]
+    _PNG_CACHE[key] = data
+    return data
+
+
+def flush_renders() -> None:
+    """Wait for every pending render and write its record."""
+    while _PENDING:
+        _write_record(*_PENDING.popleft())
+
+
+def start_renderer(workers: int):
+    from src.render_service import RenderService
+
+    global _RENDERER
+    _RENDERER = RenderService(workers)
+    return _RENDERER
+
+
+def stop_renderer() -> None:
+    """Shut the pool down; renders still pending are dropped (flush_renders first to keep them)."""
+    global _RENDERER
+    _PENDING.clear()
+    if _RENDERER is not None:
+        _RENDERER.close()
+        _RENDERER = None
+
+
+# ------------ dry run ------------
+
+def estimate(plan, fmt: str = "png", sample: int = 3, workers: int = 1) -> list[dict]:
+    """
+    Build `sample` stimuli per planned rule into a scratch directory and extrapolate time and disk use.
+    The first stimulus of a rule is a warm-up (imports, font cache) and is not timed when `sample` > 1.
+    """
+    import tempfile
+    import time
+
+    rows = []
+    for spec, n, kwargs in plan:
+        with tempfile.TemporaryDirectory() as tmp:
+            times = []
+            with open_writer(tmp, fmt) as writer:
+                for idx in range(1, sample + 1):
+                    t0 = time.perf_counter()
+                    _generate_task(spec.name, spec.generator, writer, idx, kwargs=kwargs)
+                    times.append(time.perf_counter() - t0)
+            disk = sum(f.stat().st_size for f in Path(tmp).rglob("*") if f.is_file())
+        timed = times[1:] or times
+        per_stim = sum(timed) / len(timed)
+        rows.append({"rule": spec.name, "n": n, "s_per_stimulus": per_stim, "est_s": per_stim * n,
+                     "est_bytes": disk / sample * n})
+
+    # rules are the unit of parallelism, so the slowest rule bounds the wall time
+    total_s = max(sum(r["est_s"] for r in rows) / workers, max((r["est_s"] for r in rows), default=0.0))
+    total_bytes = sum(r["est_bytes"] for r in rows)
+    print(f"{'rule':38} {'n':>8} {'ms/stim':>9} {'est_time':>10} {'est_disk':>10}")
+    for r in rows:
+        print(f"{r['rule']:38} {r['n']:>8} {1e3 * r['s_per_stimulus']:>9.1f} {_duration(r['est_s']):>10} "
+              f"{_size(r['est_bytes']):>10}")
+    print(f"{'total':38} {sum(r['n'] for r in rows):>8} {'':>9} {_duration(total_s):>10} "
+          f"{_size(total_bytes):>10}  ({workers} worker(s))")
+    return rows
+
+
+def _duration(seconds: float) -> str:
+    h, rem = divmod(int(seconds), 3600)
+    return f"{h}h{rem // 60:02d}m" if h else f"{rem // 60}m{rem % 60:02d}s"
+
+
+def _size(n_bytes: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n_bytes < 1024:
+            return f"{n_bytes:.1f}{unit}"
+        n_bytes /= 1024
+    return f"{n_bytes:.1f}TB"
+
+
+# ------------ command line ------------
+
+def _matching(specs, pattern: str) -> list:
+    import fnmatch
+
+    return [spec for spec in specs
+            if fnmatch.fnmatchcase(spec.name, pattern) or fnmatch.fnmatchcase(spec.family_name, pattern)]
+
+
+def parse_counts(items, specs) -> dict:
+    """["GLOB=N", ...] -> rule name -> N; later items win."""
+    counts = {}
+    for item in items or []:
+        pattern, sep, n = item.rpartition("=")
+        matched = _matching(specs, pattern)
+        if not sep or not matched:
+            raise ValueError(f"--count {item!r} does not match any selected rule")
+        counts.update({spec.name: int(n) for spec in matched})
+    return counts
+
+
+def parse_overrides(items, specs) -> dict:
+    """
+    ["[GLOB:]KEY=VALUE", ...] -> rule name -> generator kwargs, values parsed by the rule's schema.
+    An override applies to the rules matching GLOB (default: all selected) whose schema has KEY.
+    """
+    overrides = {}
+    for item in items or []:
+        head, sep, value = item.partition("=")
+        pattern, _, key = head.rpartition(":")
+        matched = [spec for spec in _matching(specs, pattern or "*") if key in spec.params]
+        if not sep or not matched:
+            raise ValueError(f"--set {item!r} does not apply to any selected rule")
+        for spec in matched:
+            overrides.setdefault(spec.name, {})[key] = parse_param(spec.params[key], value)
+    return overrides
+
+
+def _quota_value(text: str):
+    """"3" -> 3, "12,12" -> (12, 12); anything else stays a string."""
+    parts = [p.strip() for p in text.split(",")]
+    try:
+        values = tuple(int(p) for p in parts)
+    except ValueError:
+        return text
+    return values[0] if len(values) == 1 else values
+
+
+def parse_quotas(items, specs) -> tuple:
+    """
+    ["[GLOB:]KEY=VALUE=COUNT", ...] -> (KEY, rule name -> {VALUE: COUNT}); all items must bin by the same KEY.
+    """
+    key, quotas = None, {}
+    for item in items or []:
+        head, _, count = item.rpartition("=")
+        head, sep, value = head.rpartition("=")
+        pattern, _, item_key = head.rpartition(":")
+        matched = _matching(specs, pattern or "*")
+        if not sep or not item_key or not count.isdigit() or not matched:
+            raise ValueError(f"--quota {item!r} is not [GLOB:]KEY=VALUE=COUNT for a selected rule")
+        if key is not None and item_key != key:
+            raise ValueError(f"--quota items bin by different keys ({key!r} and {item_key!r})")
+        key = item_key
+        for spec in matched:
+            quotas.setdefault(spec.name, {})[_quota_value(value)] = int(count)
+    if quotas:
+        QuotaScheduler(quotas, key=key)  # rejects bins a rule can never produce
+    return key, quotas
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Generate ARC-like stimuli.",
+        epilog="examples:\n"
+               "  python main.py --rule 'expansion.*' -n 1000 --set grid_size=32,32 --workers 8 --seed 1\n"
+               "  python main.py --rule attraction --count 'attraction.gravity*=200' --format tar --dry-run",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("-n", type=int, default=15, help="stimuli per rule")
+    parser.add_argument("--rule", action="append", metavar="GLOB",
+                        help="rule name or family glob, repeatable (default: all rules)")
+    parser.add_argument("--count", action="append", metavar="GLOB=N",
+                        help="per-rule count overriding -n for rules matching GLOB, repeatable")
+    parser.add_argument("--set", action="append", metavar="[GLOB:]KEY=VALUE", dest="overrides",
+                        help="generator kwarg override, e.g. grid_size=32,32 or 'color.*:colors=red,green'; "
+                             "applies to the selected rules whose schema has KEY")
+    parser.add_argument("--format", default="png", choices=("png", "tar", "tar-npy", "tar-delta", "none"),
+                        help="output format; 'none' writes metadata only, without rendering")
+    parser.add_argument("--out", default="out", help="output root")
+    parser.add_argument("--seed", type=int, help="master seed for a reproducible build")
+    parser.add_argument("--workers", type=int, default=1, help="build rules in parallel processes")
+    parser.add_argument("--render-workers", type=int, default=0, metavar="N",
+                        help="render PNGs in N worker processes (single-worker builds)")
+    parser.add_argument("--augment", type=int, default=0, metavar="K",
+                        help="add up to K derived stimuli (rotations, mirrors, recolorings) per stimulus")
+    parser.add_argument("--matched-sets", type=int, default=0, metavar="N",
+                        help="also build N sets of occlusion-derived stimuli sharing one input each")
+    parser.add_argument("--quota", action="append", metavar="[GLOB:]KEY=VALUE=COUNT",
+                        help="fill matching rules bin by bin instead of to -n, e.g. 'expansion.*:n_objects=3=50'; "
+                             "KEY is a params or difficulty field (n_objects, grid_size, level), repeatable")
+    parser.add_argument("--no-dedup", action="store_true", help="do not reject duplicate pairs")
+    parser.add_argument("--dry-run", action="store_true", help="estimate time and disk space from a quick sample")
+    parser.add_argument("--sample", type=int, default=3, help="stimuli per rule for --dry-run")
+    parser.add_argument("--list", action="store_true", help="list the selected rules and their parameters")
+    parser.add_argument("--profile", metavar="TRACE_JSON", help="per-stage timing summary + Chrome trace")
+    parser.add_argument("--memprofile", metavar="REPORT_JSON", help="peak memory per rule/stage + top allocators")
+    parser.add_argument("--mem-threshold-mb", type=float, default=512.0, help="flag stimuli above this working set")
+    args = parser.parse_args(argv)
+
+    args.rule = args.rule or ["*"]
+    try:
+        specs = [spec for spec, _, _ in build_plan(args.rule)]
+        args.counts = parse_counts(args.count, specs)
+        args.overrides = parse_overrides(args.overrides, specs)
+        args.quota_key, args.quotas = parse_quotas(args.quota, specs)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.workers > 1 and (args.format not in ("png", "none") or args.profile or args.memprofile):
+        parser.error("--workers > 1 needs --format png or none and no profiling")
+    if args.workers > 1 and args.render_workers:
+        parser.error("use either --workers or --render-workers")
+    if args.workers > 1 and args.quotas:
+        parser.error("--quota needs a single worker")
+    return args
+
+
+def cli(argv=None) -> None:
+    args = parse_args(argv)
+    plan = build_plan(args.rule, args.n, args.counts, args.overrides)
+    if args.list:
+        for spec, n, kwargs in plan:
+            print(f"{spec.name:38} n={n:<6} {spec.params} {kwargs or ''}")
+        return
+    if args.dry_run:
+        estimate(plan, args.format, args.sample, args.workers)
+        return
+    main(N=args.n, out_root=args.out, fmt=args.format, rules=args.rule, counts=args.counts,
+         overrides=args.overrides, seed=args.seed, workers=args.workers,
+         render_workers=args.render_workers, augment=args.augment,
+         matched_sets=args.matched_sets, quotas=args.quotas, quota_key=args.quota_key or "n_objects",
+         dedup=not args.no_dedup,
+         profile=args.profile, memprofile=args.memprofile, memprofile_threshold_mb=args.mem_threshold_mb)
 
 
 if __name__ == "__main__":
-    main()
+    cli()
@@ -0,0 +1,185 @@
+"""
+Cross-rule ambiguity detection: which stimuli are also consistent with a rule other than their own?
+
+    python -m src.ambiguity out --report ambiguity.json
+
+Every pair is checked with every rule's verifier (src.verify), but only where it can possibly pass: pairs are
+first bucketed by cheap invariants (shapes, whether the foreground mask / color histogram / per-column counts
+are preserved, whether the output covers the input, the colors involved), and each rule declares which buckets
+it can produce (REQUIRES). Within a bucket the remaining rules run batched, once per assignment of the
+bucket's colors to the rule's color roles. The cost is linear in the pool size times the few rules left per
+bucket, so full pools are fine.
+
+The report lists, per stimulus, every other rule that reproduces its output; build_session.py can drop those
+stimuli from the same/different pools (`ambiguity_report=`).
+"""
+
+import argparse
+import inspect
+import itertools
+import json
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+from src.components import BACKGROUND
+from src.grid import PALETTE
+from src.verify import VERIFIERS, dataset_records, regenerate, verify_pairs
+
+
+class Invariants(NamedTuple):
+    in_shape: tuple
+    out_shape: tuple
+    fg_same: bool  # same foreground mask
+    hist_same: bool  # same color histogram
+    colsum_same: bool  # same foreground count per column
+    covers_input: bool  # every input cell is kept in the output
+    input_colors: int  # distinct foreground colors of the input
+    colors: tuple  # foreground color names of input and output, sorted
+
+
+def _same_shape(k: Invariants) -> bool:
+    return k.in_shape == k.out_shape
+
+
+# necessary conditions of every rule's output; a rule is only verified on buckets passing its check
+REQUIRES = {
+    "occlusion_reversal": lambda k: _same_shape(k) and k.fg_same,
+    "mirror_rotate.occlusion_mirror_x": lambda k: _same_shape(k) and k.hist_same,
+    "mirror_rotate.occlusion_mirror_y": lambda k: _same_shape(k) and k.hist_same,
+    "mirror_rotate.occlusion_rotate_90": lambda k: k.out_shape == k.in_shape[::-1] and k.hist_same,
+    "mirror_rotate.occlusion_rotate_180": lambda k: _same_shape(k) and k.hist_same,
+    "attraction.color": lambda k: _same_shape(k) and k.hist_same,
+    "attraction.size": lambda k: _same_shape(k) and k.hist_same,
+    "attraction.gravity": lambda k: _same_shape(k) and k.hist_same and k.colsum_same,
+    "attraction.float": lambda k: _same_shape(k) and k.hist_same and k.colsum_same,
+    "attraction.repulsion_gun": _same_shape,
+    "attraction.repulsion_ambiguous": _same_shape,
+    "attraction.gravity_dots": lambda k: _same_shape(k) and k.hist_same and k.colsum_same,
+    "expansion.star_step": lambda k: _same_shape(k) and k.covers_input and k.input_colors <= 1,
+    "expansion.star_full": lambda k: _same_shape(k) and k.covers_input and k.input_colors <= 1,
+    "expansion.plus_step": lambda k: _same_shape(k) and k.covers_input and k.input_colors <= 1,
+    "expansion.plus_full": lambda k: _same_shape(k) and k.covers_input and k.input_colors <= 1,
+    "expansion.3diagonal_full": lambda k: _same_shape(k) and k.covers_input and k.input_colors <= 1,
+    "arithmetic.majority_recolor": lambda k: k.fg_same,
+    "arithmetic.minority_recolor": lambda k: k.fg_same,
+    "color.inversion_recolor": lambda k: k.fg_same,
+    "color.odd_recolor": lambda k: k.fg_same,
+    "color.cross_plus_recolor": lambda k: k.fg_same and k.input_colors <= 1,
+}
+
+
+def invariants(inp: np.ndarray, out: np.ndarray) -> Invariants:
+    fg_in, fg_out = inp != BACKGROUND, out != BACKGROUND
+    same = inp.shape == out.shape
+    colors_in = set(np.unique(inp[fg_in]).tolist())
+    colors = colors_in | set(np.unique(out[fg_out]).tolist())
+    return Invariants(
+        in_shape=inp.shape,
+        out_shape=out.shape,
+        fg_same=same and bool((fg_in == fg_out).all()),
+        hist_same=bool((np.bincount(inp.ravel(), minlength=len(PALETTE)) ==
+                        np.bincount(out.ravel(), minlength=len(PALETTE))).all()) if inp.size == out.size else False,
+        colsum_same=same and bool((fg_in.sum(axis=0) == fg_out.sum(axis=0)).all()),
+        covers_input=same and bool((out[fg_in] == inp[fg_in]).all()),
+        input_colors=len(colors_in),
+        colors=tuple(sorted(PALETTE[c] for c in colors)),
+    )
+
+
+_ARITY: Dict[str, int] = {}
+
+
+def _arity(rule: str) -> int:
+    """Number of color roles of a rule (length of its generator's default `colors`)."""
+    if rule not in _ARITY:
+        from src.registry import REGISTRY
+
+        _ARITY[rule] = len(inspect.signature(REGISTRY.get(rule).generator).parameters["colors"].default)
+    return _ARITY[rule]
+
+
+def _color_roles(colors: tuple, arity: int):
+    """Every assignment of a bucket's colors to `arity` roles; missing roles get colors absent from the pair."""
+    spare = [c for c in PALETTE[1:] if c not in colors]
+    pool = list(colors) + spare[:max(0, arity - len(colors))]
+    return itertools.permutations(pool, arity)
+
+
+def consistent_rules(inputs, outputs, rules=None) -> List[set]:
+    """Per pair, the set of rules whose verifier accepts it for some assignment of its colors."""
+    inputs = [g if isinstance(g, np.ndarray) else g.to_array() for g in inputs]
+    outputs = [g if isinstance(g, np.ndarray) else g.to_array() for g in outputs]
+    rules = [r for r in (rules or VERIFIERS) if r in REQUIRES]
+
+    buckets = defaultdict(list)
+    for i, (a, b) in enumerate(zip(inputs, outputs)):
+        buckets[invariants(a, b)].append(i)
+
+    result = [set() for _ in inputs]
+    for key, members in buckets.items():
+        for rule in rules:
+            if not REQUIRES[rule](key):
+                continue
+            todo = members
+            for roles in _color_roles(key.colors, _arity(rule)):
+                params = [{"colors": roles}] * len(todo)
+                reasons = verify_pairs(rule, [inputs[i] for i in todo], [outputs[i] for i in todo], params)
+                for i, reason in zip(todo, reasons):
+                    if reason is None:
+                        result[i].add(rule)
+                todo = [i for i in todo if rule not in result[i]]
+                if not todo:
+                    break
+    return result
+
+
+def detect_records(by_rule: Dict[str, List[dict]]) -> dict:
+    """Regenerate the records (rule -> records) and report every stimulus that another rule also explains."""
+    recs, inputs, outputs = [], [], []
+    for rule, records in by_rule.items():
+        if rule not in VERIFIERS:
+            continue
+        for rec, produced, error in regenerate(rule, records):
+            if produced is not None:
+                recs.append(rec)
+                inputs.append(produced[0].to_array())
+                outputs.append(produced[1].to_array())
+
+    flagged, pairs = [], defaultdict(int)
+    for rec, rules in zip(recs, consistent_rules(inputs, outputs)):
+        others = sorted(rules - {rec["rule"]})
+        if others:
+            flagged.append({"id": rec["id"], "rule": rec["rule"], "seed": rec.get("seed"), "also": others})
+            for other in others:
+                pairs[(rec["rule"], other)] += 1
+    return {
+        "checked": len(recs),
+        "flagged": flagged,
+        "confusions": [{"rule": r, "also": o, "count": n} for (r, o), n in sorted(pairs.items())],
+    }
+
+
+def detect_dataset(out_root, rules=("*",)) -> dict:
+    import fnmatch
+
+    by_rule = {rule: recs for rule, recs in dataset_records(out_root).items()
+               if any(fnmatch.fnmatchcase(rule, p) or fnmatch.fnmatchcase(rule.split(".", 1)[0], p) for p in rules)}
+    return detect_records(by_rule)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flag stimuli whose pair is consistent with more than one rule.")
+    parser.add_argument("out_root", nargs="?", default="out")
+    parser.add_argument("--rule", action="append", metavar="GLOB", help="rule name or family glob, repeatable")
+    parser.add_argument("--report", metavar="JSON", help="write the full report here")
+    args = parser.parse_args()
+
+    report = detect_dataset(args.out_root, args.rule or ("*",))
+    print(f"{len(report['flagged'])} of {report['checked']} stimuli are consistent with more than one rule")
+    for c in report["confusions"]:
+        print(f"  {c['rule']:38} also {c['also']:38} {c['count']:>6}")
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2), encoding="utf-8")
@@ -0,0 +1,211 @@
+"""
+Dataset expansion by dihedral transforms and palette permutations of existing pairs.
+
+A derived pair applies one transform to input and output together. It is still a stimulus of the rule only if
+the transform commutes with it: a gravity pair mirrored left-right is fine, upside down the blocks fall up.
+INVARIANCES declares per rule which of the 8 dihedral transforms are allowed and whether its colors may be
+permuted (not where a color has a fixed role, e.g. cross -> red / plus -> blue, or "blue moves to red").
+
+    python -m src.augment --check      # every declared transform of every rule still passes src.verify
+
+Pairs are processed as (B, H, W) stacks of equal shapes: each dihedral transform runs once per stack and all
+palette permutations are one lookup-table gather. The transform is recorded in
+params["augment"] = {"source": id, "dihedral": name, "palette": {old: new}}, so a derived record is rebuilt
+from the seed of its source (see `reapply`).
+"""
+
+import argparse
+import itertools
+import random
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from src import transforms as T
+from src.grid import PALETTE, Grid, color_index
+from src.transforms import DIHEDRAL
+
+TRANSPOSING = frozenset({"rot90", "rot270", "transpose", "anti_transpose"})
+
+ALL = tuple(DIHEDRAL)
+ROTATIONS = ("id", "rot90", "rot180", "rot270")
+FLIPS = ("id", "rot180", "mirror_x", "mirror_y")  # commute with mirror_x / mirror_y
+COLUMN_FLIP = ("id", "mirror_y")  # keeps "down" down
+
+
+class Invariance(NamedTuple):
+    dihedral: tuple  # transforms mapping valid pairs to valid pairs
+    palette: bool  # colors may be permuted (params["colors"] is mapped along)
+
+
+INVARIANCES: Dict[str, Invariance] = {
+    "occlusion_reversal": Invariance(ALL, True),
+    "mirror_rotate.occlusion_mirror_x": Invariance(FLIPS, True),
+    "mirror_rotate.occlusion_mirror_y": Invariance(FLIPS, True),
+    "mirror_rotate.occlusion_rotate_90": Invariance(ROTATIONS, True),
+    "mirror_rotate.occlusion_rotate_180": Invariance(ALL, True),
+    # the generators rotate 0-3 times already; a mirror keeps "B moves toward / away from A".
+    # palette=False: the colors have fixed roles the participant learns (which block moves, cross/plus colors)
+    "attraction.color": Invariance(ALL, False),
+    "attraction.size": Invariance(ALL, True),
+    "attraction.gravity": Invariance(COLUMN_FLIP, True),
+    "attraction.float": Invariance(COLUMN_FLIP, True),
+    "attraction.repulsion_gun": Invariance(ALL, False),
+    "attraction.repulsion_ambiguous": Invariance(ALL, False),
+    "attraction.gravity_dots": Invariance(COLUMN_FLIP, True),
+    "expansion.star_step": Invariance(ALL, True),
+    "expansion.star_full": Invariance(ALL, True),
+    "expansion.plus_step": Invariance(ALL, True),
+    "expansion.plus_full": Invariance(ALL, True),
+    "expansion.3diagonal_full": Invariance(ALL, True),
+    "arithmetic.majority_recolor": Invariance(ALL, True),
+    "arithmetic.minority_recolor": Invariance(ALL, True),
+    "color.inversion_recolor": Invariance(ALL, True),
+    "color.odd_recolor": Invariance(ALL, True),
+    "color.cross_plus_recolor": Invariance(ALL, False),
+}
+
+Transform = Tuple[str, Dict[str, str]]  # (dihedral name, color name -> color name)
+
+
+# ------------ transforms ------------
+
+def variants(rule: str, colors, palette=None) -> List[Transform]:
+    """
+    Every transform allowed for `rule`, identity excluded. Colors are permuted among `colors` (the pair's
+    params["colors"]) or, with `palette`, mapped injectively into that wider pool.
+    """
+    inv = INVARIANCES[rule]
+    colors = list(colors)
+    mappings = [{}]
+    if inv.palette:
+        pool = list(palette) if palette else colors
+        mappings = [{old: new for old, new in zip(colors, perm) if old != new}
+                    for perm in itertools.permutations(pool, len(colors))]
+    return [(d, m) for d in inv.dihedral for m in mappings if d != "id" or m]
+
+
+def _lut(mapping: Dict[str, str]) -> np.ndarray:
+    lut = np.arange(256, dtype=np.uint8)
+    for old, new in mapping.items():
+        lut[color_index(old)] = color_index(new)
+    return lut
+
+
+def apply(arrs: np.ndarray, dihedral: str, mapping: Optional[Dict[str, str]] = None) -> np.ndarray:
+    """Transform a 2-D palette array or a (B, H, W) stack."""
+    return (T.dihedral(dihedral) >> T.recolor(mapping or {})).run(arrs)
+
+
+def transformed_params(params: dict, dihedral: str, mapping: Dict[str, str], source: Optional[str] = None) -> dict:
+    """The source's params as seen after the transform, plus params["augment"]."""
+    new = dict(params)
+    if "colors" in new:
+        new["colors"] = tuple(mapping.get(c, c) for c in new["colors"])
+    if dihedral in TRANSPOSING and "grid_size" in new:
+        new["grid_size"] = tuple(new["grid_size"])[::-1]
+    new["augment"] = {"source": source, "dihedral": dihedral, "palette": dict(mapping)}
+    return new
+
+
+def augment_pairs(inputs, outputs, transforms: List[List[Transform]]) -> List[List[Tuple[np.ndarray, np.ndarray]]]:
+    """
+    Derived (input, output) arrays for `transforms[i]` of every pair i. Pairs are stacked by shape; each dihedral
+    transform runs once per stack, the palette mappings of all its uses in one gather.
+    """
+    inputs = [g if isinstance(g, np.ndarray) else g.to_array() for g in inputs]
+    outputs = [g if isinstance(g, np.ndarray) else g.to_array() for g in outputs]
+    groups = defaultdict(list)
+    for i, (a, b) in enumerate(zip(inputs, outputs)):
+        groups[(a.shape, b.shape)].append(i)
+
+    result = [[None] * len(ts) for ts in transforms]
+    for members in groups.values():
+        stack_in = np.stack([inputs[i] for i in members])
+        stack_out = np.stack([outputs[i] for i in members])
+        uses = defaultdict(list)  # dihedral -> [(row in stack, pair, slot)]
+        for row, i in enumerate(members):
+            for slot, (d, _) in enumerate(transforms[i]):
+                uses[d].append((row, i, slot))
+        for d, todo in uses.items():
+            rows = np.array([row for row, _, _ in todo])
+            luts = np.stack([_lut(transforms[i][slot][1]) for _, i, slot in todo])
+            pick = np.arange(len(todo))[:, None, None]
+            new_in = luts[pick, DIHEDRAL[d](stack_in)[rows]]
+            new_out = luts[pick, DIHEDRAL[d](stack_out)[rows]]
+            for k, (_, i, slot) in enumerate(todo):
+                result[i][slot] = (new_in[k], new_out[k])
+    return result
+
+
+# ------------ records ------------
+
+def is_derived(rec: dict) -> bool:
+    return bool((rec.get("params") or {}).get("augment"))
+
+
+def choose(rule: str, rec: dict, k: int, palette=None, taken=()) -> List[Transform]:
+    """
+    Up to `k` transforms for a source record, in an order fixed by its seed (a larger `k` later extends the same
+    list); transforms in `taken` (already derived) are skipped.
+    """
+    options = variants(rule, (rec.get("params") or {}).get("colors") or (), palette)
+    random.Random(f"{rec['seed']}:augment").shuffle(options)
+    return [t for t in options if t not in taken][:k]
+
+
+def reapply(params: dict, produced):
+    """(inp, out, params) of a derived record from its source's regenerated pair."""
+    inp, out, source_params = produced
+    aug = params["augment"]
+    d, m = aug["dihedral"], aug.get("palette") or {}
+    return (
+        Grid.from_array(apply(inp.to_array(), d, m)),
+        Grid.from_array(apply(out.to_array(), d, m)),
+        transformed_params(source_params, d, m, aug.get("source")),
+    )
+
+
+# ------------ checking the declarations ------------
+
+def check(rules=None, seeds: int = 20, palette=None) -> Dict[str, int]:
+    """rule -> number of derived pairs that fail src.verify (0 everywhere = declarations hold)."""
+    from src.registry import REGISTRY
+    from src.verify import verify_pairs
+
+    failures = {}
+    for rule in rules or INVARIANCES:
+        gen = REGISTRY.get(rule).generator
+        inputs, outputs, params = [], [], []
+        for seed in range(seeds):
+            random.seed(seed)
+            inp, out, p = gen()
+            inputs.append(inp)
+            outputs.append(out)
+            params.append(p)
+        transforms = [variants(rule, p["colors"], palette) for p in params]
+        derived = augment_pairs(inputs, outputs, transforms)
+        new_in, new_out, new_params = [], [], []
+        for p, ts, pairs in zip(params, transforms, derived):
+            for (d, m), (a, b) in zip(ts, pairs):
+                new_in.append(a)
+                new_out.append(b)
+                new_params.append(transformed_params(p, d, m))
+        reasons = verify_pairs(rule, new_in, new_out, new_params)
+        failures[rule] = sum(r is not None for r in reasons)
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the per-rule augmentation declarations against src.verify.")
+    parser.add_argument("--check", action="store_true", required=True)
+    parser.add_argument("--rule", action="append", metavar="NAME")
+    parser.add_argument("--seeds", type=int, default=20)
+    parser.add_argument("--palette", action="store_true", help="permute into the whole palette, not just params colors")
+    args = parser.parse_args()
+
+    result = check(args.rule, args.seeds, PALETTE[1:] if args.palette else None)
+    for rule, failed in result.items():
+        print(f"{rule:38} {'ok' if not failed else f'{failed} failing pairs'}")
+    raise SystemExit(1 if any(result.values()) else 0)
@@ -0,0 +1,187 @@
+"""
+Per-color bit planes: the cells of one color as a Python int, bit r * cols + c set for cell (r, c).
+
+Set logic becomes integer arithmetic: overlap = a & b, union = a | b, "stamp fits" = not (stamp & used),
+area = popcount. shift(dr, dc) moves a plane (bits pushed over an edge are dropped) and ray(dr, dc) marks every
+cell reachable in one direction with log2(size) shifts. Python ints have arbitrary precision, so one plane
+covers any grid; at 30x30 a plane is 900 bits, i.e. 15 machine words per operation.
+
+    planes = Bitboard.planes(grid.to_array())           # palette index -> Bitboard
+    stamp = Bitboard.from_cells(12, 12, [(0, 1), (1, 0), (1, 1)]).shift(4, 4)
+    if not stamp & used:
+        used |= stamp
+
+Hot loops can skip the wrapper and work on the raw ints with stamp_bits / shift_bits / lowest_cell
+(generate_cross_plus_recolor and the cross_plus verifier do). benchmarks/bench_bitboard.py compares the
+operations against the numpy array backend on 12x12 and 30x30 grids.
+"""
+
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def full_mask(rows: int, cols: int) -> int:
+    return (1 << (rows * cols)) - 1
+
+
+@lru_cache(maxsize=None)
+def column_mask(rows: int, cols: int, c0: int, c1: int) -> int:
+    """Bits of columns c0..c1 (inclusive) in every row."""
+    if c0 > c1 or rows * cols == 0:
+        return 0
+    row = ((1 << (c1 + 1)) - 1) ^ ((1 << c0) - 1)
+    return row * (full_mask(rows, cols) // ((1 << cols) - 1))  # one copy of `row` per grid row
+
+
+def stamp_bits(offsets, cols: int) -> int:
+    """Template of (dr, dc) offsets anchored at cell (0, 0); place it with `<< (r * cols + c)` if it fits."""
+    bits = 0
+    for dr, dc in offsets:
+        bits |= 1 << (dr * cols + dc)
+    return bits
+
+
+def shift_bits(bits: int, rows: int, cols: int, dr: int, dc: int) -> int:
+    """Move every cell by (dr, dc); cells leaving the grid are dropped (no wrap into the next row)."""
+    if dc > 0:
+        bits = (bits & column_mask(rows, cols, 0, cols - 1 - dc)) << dc
+    elif dc < 0:
+        bits = (bits & column_mask(rows, cols, -dc, cols - 1)) >> -dc
+    if dr > 0:
+        bits <<= dr * cols
+    elif dr < 0:
+        bits >>= -dr * cols
+    return bits & full_mask(rows, cols)
+
+
+def lowest_cell(bits: int, cols: int):
+    """(row, col) of the first set cell in row-major order; bits must be non-zero."""
+    return divmod((bits & -bits).bit_length() - 1, cols)
+
+
+class Bitboard:
+    """An immutable bit plane of a rows x cols grid."""
+
+    __slots__ = ("rows", "cols", "bits")
+
+    def __init__(self, rows: int, cols: int, bits: int = 0):
+        self.rows = int(rows)
+        self.cols = int(cols)
+        self.bits = bits
+
+    # ------------ construction ------------
+
+    @classmethod
+    def from_cells(cls, rows, cols, cells):
+        bits = 0
+        for r, c in cells:
+            if 0 <= r < rows and 0 <= c < cols:
+                bits |= 1 << (r * cols + c)
+        return cls(rows, cols, bits)
+
+    @classmethod
+    def from_rect(cls, rows, cols, xmin, xmax, ymin, ymax):
+        """Grid.fill_rect's convention (x = column, inclusive, clipped to the grid)."""
+        rows, cols = int(rows), int(cols)
+        x0, x1, y0, y1 = max(int(xmin), 0), min(int(xmax), cols - 1), max(int(ymin), 0), min(int(ymax), rows - 1)
+        if x0 > x1 or y0 > y1:
+            return cls(rows, cols)
+        band = full_mask(y1 - y0 + 1, cols) << (y0 * cols)  # rows y0..y1
+        return cls(rows, cols, band & column_mask(rows, cols, x0, x1))
+
+    @classmethod
+    def from_mask(cls, mask):
+        """2-D bool array -> Bitboard."""
+        import numpy as np
+
+        rows, cols = mask.shape
+        packed = np.packbits(mask.ravel(), bitorder="little")
+        return cls(rows, cols, int.from_bytes(packed.tobytes(), "little"))
+
+    @classmethod
+    def planes(cls, arr, background: int = 0) -> dict:
+        """Palette-index array -> {palette index: plane} for every non-background color present."""
+        import numpy as np
+
+        return {int(v): cls.from_mask(arr == v) for v in np.unique(arr) if v != background}
+
+    def to_mask(self):
+        import numpy as np
+
+        n = self.rows * self.cols
+        data = self.bits.to_bytes((n + 7) // 8, "little")
+        return np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=n, bitorder="little").astype(bool).reshape(
+            self.rows, self.cols)
+
+    # ------------ set algebra ------------
+
+    def _new(self, bits):
+        return Bitboard(self.rows, self.cols, bits)
+
+    def __and__(self, other):
+        return self._new(self.bits & other.bits)
+
+    def __or__(self, other):
+        return self._new(self.bits | other.bits)
+
+    def __xor__(self, other):
+        return self._new(self.bits ^ other.bits)
+
+    def __sub__(self, other):
+        return self._new(self.bits & ~other.bits)
+
+    def __invert__(self):
+        return self._new(~self.bits & full_mask(self.rows, self.cols))
+
+    def __bool__(self):
+        return self.bits != 0
+
+    def __eq__(self, other):
+        return isinstance(other, Bitboard) and (self.rows, self.cols, self.bits) == (
+            other.rows, other.cols, other.bits)
+
+    def __hash__(self):
+        return hash((self.rows, self.cols, self.bits))
+
+    def __len__(self):
+        return self.popcount()
+
+    def popcount(self) -> int:
+        return self.bits.bit_count()
+
+    def __contains__(self, cell):
+        r, c = cell
+        return 0 <= r < self.rows and 0 <= c < self.cols and bool(self.bits >> (r * self.cols + c) & 1)
+
+    def cells(self) -> list:
+        """(row, col) of every set cell, row-major."""
+        out, bits = [], self.bits
+        while bits:
+            low = bits & -bits
+            out.append(divmod(low.bit_length() - 1, self.cols))
+            bits ^= low
+        return out
+
+    # ------------ moves ------------
+
+    def shift(self, dr: int, dc: int):
+        return self._new(shift_bits(self.bits, self.rows, self.cols, dr, dc))
+
+    def ray(self, dr: int, dc: int, blockers=None):
+        """
+        Cells reached by walking from any set cell in direction (dr, dc), one or more steps, stopping before a
+        blocker or the edge. Kogge-Stone fill: log2(max(rows, cols)) rounds of shifts.
+        """
+        rows, cols = self.rows, self.cols
+        empty = full_mask(rows, cols) & ~(blockers.bits if blockers is not None else 0)
+        reached = shift_bits(self.bits, rows, cols, dr, dc) & empty
+        open_ = empty
+        step = 1
+        while step < max(rows, cols):
+            reached |= open_ & shift_bits(reached, rows, cols, dr * step, dc * step)
+            open_ &= shift_bits(open_, rows, cols, dr * step, dc * step)
+            step *= 2
+        return self._new(reached)
+
+    def __repr__(self):
+        return f"Bitboard({self.rows}x{self.cols}, {self.popcount()} cells)"
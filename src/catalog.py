@@ -0,0 +1,197 @@
+"""
+SQLite catalog of generated stimuli across all rules.
+
+One row per stimulus with indexed columns for the common cross-rule queries (rule, family, seed, n_objects,
+grid size, fingerprint) and the file locations + checksums. Writers add rows in batched transactions; existing
+`out/` trees (loose rule directories and/or shards) can be imported from their JSONL manifests.
+"""
+
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.manifest import FILE_KINDS, load_records, record_files
+from src.shards import SHARD_DIR, read_index
+
+CATALOG_NAME = "catalog.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stimuli (
+    id              TEXT PRIMARY KEY,
+    rule            TEXT NOT NULL,
+    family          TEXT NOT NULL,
+    seed            INTEGER,
+    n_objects       INTEGER,
+    grid_rows       INTEGER,
+    grid_cols       INTEGER,
+    fingerprint     TEXT,
+    params          TEXT,
+    difficulty      TEXT,
+    shard           TEXT,
+    input_path      TEXT,
+    input_sha256    TEXT,
+    output_path     TEXT,
+    output_sha256   TEXT,
+    combined_path   TEXT,
+    combined_sha256 TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_stimuli_rule ON stimuli (rule);
+CREATE INDEX IF NOT EXISTS ix_stimuli_family ON stimuli (family);
+CREATE INDEX IF NOT EXISTS ix_stimuli_seed ON stimuli (seed);
+CREATE INDEX IF NOT EXISTS ix_stimuli_n_objects ON stimuli (rule, n_objects);
+CREATE INDEX IF NOT EXISTS ix_stimuli_grid ON stimuli (grid_rows, grid_cols);
+CREATE INDEX IF NOT EXISTS ix_stimuli_fingerprint ON stimuli (fingerprint);
+"""
+
+_COLUMNS = (
+    "id", "rule", "family", "seed", "n_objects", "grid_rows", "grid_cols", "fingerprint", "params", "difficulty",
+    "shard", "input_path", "input_sha256", "output_path", "output_sha256", "combined_path", "combined_sha256",
+)
+
+_INSERT = f"INSERT OR REPLACE INTO stimuli ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+
+
+def _row(rec: dict) -> tuple:
+    """Flatten a record from a rule-directory manifest or a shard index into a catalog row."""
+    params = rec.get("params") or {}
+    grid_size = params.get("grid_size") or (None, None)
+    rule = rec["rule"]
+    row = {
+        "id": rec["id"],
+        "rule": rule,
+        "family": rec.get("family") or rule.split(".", 1)[0],
+        "seed": rec.get("seed"),
+        "n_objects": params.get("n_objects"),
+        "grid_rows": grid_size[0],
+        "grid_cols": grid_size[1],
+        "fingerprint": rec.get("fingerprint"),
+        "params": json.dumps(params, ensure_ascii=False),
+        "difficulty": json.dumps(rec["difficulty"]) if rec.get("difficulty") is not None else None,
+        "shard": rec.get("shard"),
+    }
+    if "members" in rec:
+        for kind in FILE_KINDS:
+            member = rec["members"].get(f"{kind}.png") or rec["members"].get(f"{kind}.npy")
+            if member is None and kind == "output":
+                member = rec["members"].get("delta.bin")
+            if member:
+                row[f"{kind}_path"] = f"shards/{rec['shard']}"
+                row[f"{kind}_sha256"] = member["sha256"]
+    else:
+        for kind, entry in record_files(rec).items():
+            row[f"{kind}_path"] = f"{rule}/{entry['path']}"
+            row[f"{kind}_sha256"] = entry.get("sha256")
+    return tuple(row.get(col) for col in _COLUMNS)
+
+
+class Catalog:
+    def __init__(self, path, batch_size: int = 500):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self._conn = sqlite3.connect(self.path, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._pending: List[tuple] = []
+
+    # ---- writing ----
+
+    def add(self, rec: dict) -> None:
+        self._pending.append(_row(rec))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def add_many(self, recs: Iterable[dict]) -> None:
+        for rec in recs:
+            self.add(rec)
+        self.flush()
+
+    def replace_rule(self, rule: str, recs: Iterable[dict], sharded: bool = False) -> None:
+        """
+        Make the loose-file (or, with `sharded`, the shard) rows of `rule` mirror `recs` exactly.
+        Used after a manifest was reconciled, so dropped records disappear from the catalog too.
+        """
+        self.flush()
+        rows = [_row(rec) for rec in recs]
+        shard_clause = "shard IS NOT NULL" if sharded else "shard IS NULL"
+        with self._conn:
+            self._conn.execute(f"DELETE FROM stimuli WHERE rule = ? AND {shard_clause}", (rule,))
+            self._conn.executemany(_INSERT, rows)
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        with self._conn:
+            self._conn.executemany(_INSERT, self._pending)
+        self._pending = []
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---- querying ----
+
+    def query(
+            self,
+            rule: Optional[str] = None,
+            family: Optional[str] = None,
+            n_objects: Optional[int] = None,
+            grid_size: Optional[tuple] = None,
+            limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        where, args = self._where(rule=rule, family=family, n_objects=n_objects, grid_size=grid_size)
+        sql = f"SELECT * FROM stimuli{where} ORDER BY rule, id"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        rows = []
+        for r in self._conn.execute(sql, args):
+            row = dict(r)
+            row["params"] = json.loads(row["params"]) if row["params"] else {}
+            row["difficulty"] = json.loads(row["difficulty"]) if row["difficulty"] else None
+            rows.append(row)
+        return rows
+
+    def count(self, by: str = "rule", **filters) -> Dict[Any, int]:
+        """Row counts grouped by one column, e.g. count("family") or count("n_objects", rule="color.odd_recolor")."""
+        if by not in _COLUMNS:
+            raise ValueError(f"Unknown column: {by}")
+        where, args = self._where(**filters)
+        sql = f"SELECT {by}, COUNT(*) FROM stimuli{where} GROUP BY {by} ORDER BY {by}"
+        return {row[0]: row[1] for row in self._conn.execute(sql, args)}
+
+    def seeds(self, rule: str) -> List[int]:
+        return [row[0] for row in self._conn.execute("SELECT seed FROM stimuli WHERE rule = ? ORDER BY id", (rule,))]
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM stimuli").fetchone()[0]
+
+    @staticmethod
+    def _where(rule=None, family=None, n_objects=None, grid_size=None):
+        clauses, args = [], []
+        for col, value in (("rule", rule), ("family", family), ("n_objects", n_objects)):
+            if value is not None:
+                clauses.append(f"{col} = ?")
+                args.append(value)
+        if grid_size is not None:
+            clauses.append("grid_rows = ? AND grid_cols = ?")
+            args.extend(grid_size)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), args
+
+
+def import_tree(out_root, catalog: Optional[Catalog] = None) -> Catalog:
+    """Index an existing output tree: every `<rule>/stimuli.jsonl` plus `shards/index.jsonl` if present."""
+    out_root = Path(out_root)
+    catalog = catalog or Catalog(out_root / CATALOG_NAME)
+    for rule_dir in sorted(p for p in out_root.iterdir() if p.is_dir() and p.name != SHARD_DIR):
+        catalog.add_many(rec for rec in load_records(rule_dir / "stimuli.jsonl") if rec.get("id") and rec.get("rule"))
+    catalog.add_many(read_index(out_root / SHARD_DIR))
+    return catalog
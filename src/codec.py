@@ -0,0 +1,173 @@
+"""
+Compact text encoding of a stimulus' grids, stored in its record (record["grids"]) so the pairs can be loaded
+from stimuli.jsonl without decoding a single PNG.
+
+    {"palette": ["black", "blue", "red"],                        # local index -> color name
+     "input":  {"shape": [12, 12], "enc": "rle", "data": "..."},
+     "output": {"shape": [12, 12], "enc": "rle", "data": "...", "delta": true}}
+
+`data` is base64 of one of
+  packed   local palette indices, 1/2/4/8 bits per cell (the fewest that fit), row-major
+  rle      (value, run length) byte pairs over the row-major cells; runs longer than 255 are split
+whichever is shorter. With "delta" the output is stored as its src.delta against the input, flattened into one
+array: 0 = unchanged, i + 1 = now palette[i]. Most rules change a minority of cells, so the delta is mostly
+long zero runs.
+
+    python -m src.codec out               # load every encoded pair of a build, print the count and time
+
+load_pairs decodes with numpy only (base64 -> frombuffer -> repeat / unpack); the JSON parsing dominates.
+"""
+
+import argparse
+import base64
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from src.delta import Delta, apply, diff
+from src.grid import PALETTE, color_index
+
+_BITS = (1, 2, 4, 8)
+
+
+# ------------ single arrays ------------
+
+def _bits(n_values: int) -> int:
+    return next(b for b in _BITS if n_values <= 1 << b)
+
+
+def _pack(flat: np.ndarray, bits: int) -> bytes:
+    per = 8 // bits
+    padded = np.zeros(-(-flat.size // per) * per, dtype=np.uint8)
+    padded[:flat.size] = flat
+    shifts = np.arange(per, dtype=np.uint8) * bits
+    return np.bitwise_or.reduce(padded.reshape(-1, per) << shifts, axis=1).astype(np.uint8).tobytes()
+
+
+def _unpack(data: bytes, bits: int, n: int) -> np.ndarray:
+    per = 8 // bits
+    packed = np.frombuffer(data, dtype=np.uint8)
+    shifts = np.arange(per, dtype=np.uint8) * bits
+    return ((packed[:, None] >> shifts) & ((1 << bits) - 1)).ravel()[:n].astype(np.uint8)
+
+
+def _rle(flat: np.ndarray) -> bytes:
+    if flat.size == 0:
+        return b""
+    starts = np.flatnonzero(np.r_[True, flat[1:] != flat[:-1]])
+    lengths = np.diff(np.r_[starts, flat.size])
+    pieces = -(-lengths // 255)  # runs over 255 become several pairs
+    values = np.repeat(flat[starts], pieces)
+    counts = np.full(values.size, 255, dtype=np.int64)
+    last = np.cumsum(pieces) - 1
+    counts[last] = lengths - 255 * (pieces - 1)
+    return np.column_stack([values, counts]).astype(np.uint8).tobytes()
+
+
+def _unrle(data: bytes) -> np.ndarray:
+    pairs = np.frombuffer(data, dtype=np.uint8).reshape(-1, 2)
+    return np.repeat(pairs[:, 0], pairs[:, 1])
+
+
+def encode_array(local: np.ndarray, n_values: int) -> dict:
+    """2-D array of values < n_values -> {"shape", "enc", "data"}, the shorter of packed / rle."""
+    flat = local.ravel()
+    rle = _rle(flat)
+    packed = _pack(flat, _bits(n_values)) if len(rle) > (flat.size * _bits(n_values) + 7) // 8 else None
+    enc, data = ("rle", rle) if packed is None else ("packed", packed)
+    return {"shape": list(local.shape), "enc": enc, "data": base64.b64encode(data).decode("ascii")}
+
+
+def decode_array(entry: dict, n_values: int) -> np.ndarray:
+    h, w = entry["shape"]
+    data = base64.b64decode(entry["data"])
+    flat = _unrle(data) if entry["enc"] == "rle" else _unpack(data, _bits(n_values), h * w)
+    return flat.reshape(h, w)
+
+
+# ------------ pairs ------------
+
+def encode_pair(inp, out, delta: bool = True) -> dict:
+    """record["grids"] for a pair (Grids or palette-index arrays); `delta` stores the output as changed cells."""
+    a = inp if isinstance(inp, np.ndarray) else inp.to_array()
+    b = out if isinstance(out, np.ndarray) else out.to_array()
+    used = np.union1d(np.unique(a), np.unique(b))
+    lut = np.zeros(max(int(used[-1]) + 1, 1) if used.size else 1, dtype=np.uint8)
+    lut[used] = np.arange(used.size)
+    local_a, local_b = lut[a], lut[b]
+    n = used.size
+
+    grids = {"palette": [PALETTE[i] for i in used.tolist()], "input": encode_array(local_a, n)}
+    grids["output"] = encode_array(local_b, n)
+    if delta and a.shape == b.shape:
+        d = diff(local_a, local_b)
+        changed = np.zeros(a.shape, dtype=np.uint8)
+        changed[d.mask] = d.new + 1
+        entry = encode_array(changed, n + 1)
+        if len(entry["data"]) < len(grids["output"]["data"]):
+            grids["output"] = {**entry, "delta": True}
+    return grids
+
+
+def decode_pair(grids: dict) -> Tuple[np.ndarray, np.ndarray]:
+    """(input, output) palette-index arrays (this process' PALETTE) of record["grids"]."""
+    palette = np.array([color_index(c) for c in grids["palette"]], dtype=np.uint8)
+    n = len(palette)
+    local_a = decode_array(grids["input"], n)
+    entry = grids["output"]
+    if entry.get("delta"):
+        changed = decode_array(entry, n + 1)
+        mask = changed != 0
+        local_b = apply(local_a, Delta(mask, local_a[mask], changed[mask] - 1))
+    else:
+        local_b = decode_array(entry, n)
+    return palette[local_a], palette[local_b]
+
+
+# ------------ bulk loading ------------
+
+def load_pairs(out_root, rules=None) -> Tuple[List[dict], List[np.ndarray], List[np.ndarray]]:
+    """
+    (records, inputs, outputs) of every record with encoded grids in a build (rule manifests and shard index),
+    optionally only `rules`.
+    """
+    from src.manifest import load_records
+    from src.shards import SHARD_DIR, read_index
+
+    out_root = Path(out_root)
+    recs = [rec for d in sorted(out_root.iterdir()) if d.is_dir() and d.name != SHARD_DIR
+            and (rules is None or d.name in rules) for rec in load_records(d / "stimuli.jsonl")]
+    recs += [rec for rec in read_index(out_root / SHARD_DIR) if rules is None or rec.get("rule") in rules]
+
+    records, inputs, outputs = [], [], []
+    for rec in recs:
+        grids = rec.get("grids")
+        if not grids:
+            continue
+        a, b = decode_pair(grids)
+        records.append(rec)
+        inputs.append(a)
+        outputs.append(b)
+    return records, inputs, outputs
+
+
+def stats(records: List[dict]) -> Dict[str, float]:
+    sizes = [sum(len(g["data"]) for g in (r["grids"]["input"], r["grids"]["output"])) for r in records]
+    return {"pairs": len(records), "mean_chars": sum(sizes) / max(len(sizes), 1),
+            "delta_share": sum(bool(r["grids"]["output"].get("delta")) for r in records) / max(len(records), 1)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load every encoded pair of a build from its manifests.")
+    parser.add_argument("out_root", nargs="?", default="out")
+    parser.add_argument("--rule", action="append", metavar="NAME")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    records, _, _ = load_pairs(args.out_root, args.rule)
+    elapsed = time.perf_counter() - t0
+    s = stats(records)
+    print(f"{s['pairs']} pairs in {elapsed:.2f} s; {s['mean_chars']:.0f} base64 chars per pair, "
+          f"{100 * s['delta_share']:.0f}% outputs stored as delta")
@@ -0,0 +1,170 @@
+"""
+Connected components ("objects") of palette-index grids.
+
+Labeling runs on a (B, H, W) batch at once: every foreground cell starts with its own flat index as label,
+then rounds of run-min propagation (a whole row or column run of linked cells takes its minimum label in one
+step) and pointer jumping (label <- label of the cell the label points to) repeat until nothing changes.
+Cells are connected when they are 4- or 8-neighbors and (with `by_color`, the default) have the same color;
+background is never part of an object.
+
+    objs = grid.objects()                  # or components(grid.to_array(), connectivity=8)
+    objs[0].color, objs[0].bbox, objs[0].area, objs[0].mask
+
+Bounding boxes use Grid.fill_rect's convention: (xmin, xmax, ymin, ymax), inclusive, x = column.
+"""
+
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+BACKGROUND = 0  # PALETTE index of "black"
+
+_OFFSETS = {
+    4: ((1, 0), (0, 1)),
+    8: ((1, 0), (0, 1), (1, 1), (1, -1)),
+}
+
+
+@dataclass(frozen=True)
+class Component:
+    color: int  # PALETTE index
+    bbox: tuple  # (xmin, xmax, ymin, ymax), inclusive
+    area: int
+    mask: np.ndarray  # bool, cropped to bbox: shape (ymax - ymin + 1, xmax - xmin + 1)
+
+    @property
+    def cells(self) -> list:
+        """(row, col) of every cell in grid coordinates."""
+        rows, cols = np.nonzero(self.mask)
+        return list(zip((rows + self.bbox[2]).tolist(), (cols + self.bbox[0]).tolist()))
+
+
+# ------------ labeling ------------
+
+def _shifted(a: np.ndarray, dr: int, dc: int):
+    """Views (src, dst) pairing every cell with its neighbor at (+dr, +dc)."""
+    _, h, w = a.shape
+    rs, rd = (slice(0, h - dr), slice(dr, h))
+    cs, cd = (slice(0, w - dc), slice(dc, w)) if dc >= 0 else (slice(-dc, w), slice(0, w + dc))
+    return a[:, rs, cs], a[:, rd, cd]
+
+
+def _run_min(labels: np.ndarray, linked: np.ndarray) -> np.ndarray:
+    """Minimum label of every horizontal run of linked cells; `linked[..., c]` joins cells c and c + 1."""
+    starts = np.ones(labels.shape, dtype=bool)
+    starts[:, :, 1:] = ~linked
+    flat, s = labels.ravel(), starts.ravel()
+    mins = np.minimum.reduceat(flat, np.flatnonzero(s))
+    return mins[np.cumsum(s) - 1].reshape(labels.shape)
+
+
+def label(arrs: np.ndarray, connectivity: int = 4, by_color: bool = True) -> np.ndarray:
+    """
+    (B, H, W) or (H, W) palette array -> labels of the same shape. Each foreground cell gets the smallest
+    flat index + 1 of its component (so labels are unique per grid but not consecutive); background is 0.
+    """
+    if connectivity not in _OFFSETS:
+        raise ValueError(f"connectivity must be 4 or 8, got {connectivity}")
+    single = arrs.ndim == 2
+    arrs = arrs[None] if single else arrs
+    b, h, w = arrs.shape
+    fg = arrs != BACKGROUND
+    none = h * w + 1
+    labels = np.where(fg, np.arange(1, h * w + 1, dtype=np.int64).reshape(1, h, w), none)
+
+    links = []
+    for dr, dc in _OFFSETS[connectivity]:
+        src, dst = _shifted(arrs, dr, dc)
+        fs, fd = _shifted(fg, dr, dc)
+        links.append(fs & fd & (src == dst) if by_color else fs & fd)
+    linked_v, linked_h, diagonals = links[0], links[1], list(zip(_OFFSETS[connectivity][2:], links[2:]))
+    linked_vt = linked_v.transpose(0, 2, 1)
+
+    while True:
+        # whole runs collapse in one step: along rows, then along columns
+        new = _run_min(labels, linked_h)
+        new = _run_min(new.transpose(0, 2, 1), linked_vt).transpose(0, 2, 1)
+        for (dr, dc), linked in diagonals:
+            ls, ld = _shifted(new.copy(), dr, dc)
+            ns, nd = _shifted(new, dr, dc)
+            np.minimum(nd, np.where(linked, ls, none), out=nd)
+            np.minimum(ns, np.where(linked, ld, none), out=ns)
+        # pointer jumping: adopt the label of the cell our label points to
+        flat = new.reshape(b, -1)
+        jumped = np.take_along_axis(flat, np.where(flat < none, flat - 1, 0), axis=1)
+        new = np.where(flat < none, np.minimum(flat, jumped), none).reshape(b, h, w)
+        if np.array_equal(new, labels):
+            break
+        labels = new
+
+    labels[~fg] = 0
+    return labels[0] if single else labels
+
+
+def count(labels: np.ndarray) -> np.ndarray:
+    """Number of components per grid of a (B, H, W) label batch."""
+    _, h, w = labels.shape
+    own = np.arange(1, h * w + 1).reshape(1, h, w)
+    return (labels == own).sum(axis=(1, 2))
+
+
+def stats(labels: np.ndarray, arrs: np.ndarray) -> dict:
+    """
+    Per-component columns of a batch, ordered by (grid, label):
+    owner (grid index), label, color, xmin, xmax, ymin, ymax, area.
+    """
+    b, h, w = labels.shape
+    fg = labels != 0
+    bi, ri, ci = np.nonzero(fg)
+    keys, first, inv = np.unique(bi * (h * w + 1) + labels[fg], return_index=True, return_inverse=True)
+    n = len(keys)
+    cols = {
+        "owner": keys // (h * w + 1),
+        "label": keys % (h * w + 1),
+        "color": arrs[fg][first],
+        "xmin": np.full(n, w), "xmax": np.full(n, -1),
+        "ymin": np.full(n, h), "ymax": np.full(n, -1),
+        "area": np.bincount(inv, minlength=n),
+    }
+    np.minimum.at(cols["xmin"], inv, ci)
+    np.maximum.at(cols["xmax"], inv, ci)
+    np.minimum.at(cols["ymin"], inv, ri)
+    np.maximum.at(cols["ymax"], inv, ri)
+    return cols
+
+
+def padded(cols: dict, names, b: int, fill) -> list:
+    """Scatter per-component columns into (B, L) arrays, L = most components in one grid; `fill` per name."""
+    counts = np.bincount(cols["owner"], minlength=b)
+    slot = np.arange(len(cols["owner"])) - np.repeat(np.cumsum(counts) - counts, counts)
+    size = int(counts.max()) if len(counts) else 0
+    out = []
+    for name, empty in zip(names, fill):
+        arr = np.full((b, size), empty)
+        arr[cols["owner"], slot] = cols[name]
+        out.append(arr)
+    return out
+
+
+# ------------ objects ------------
+
+def batch_components(arrs: np.ndarray, connectivity: int = 4, by_color: bool = True) -> List[List[Component]]:
+    """Components of every grid in a (B, H, W) batch, in row-major order of their first cell."""
+    labels = label(arrs, connectivity, by_color)
+    cols = stats(labels, arrs)
+    result = [[] for _ in range(len(arrs))]
+    for i in range(len(cols["owner"])):
+        g, lab = int(cols["owner"][i]), cols["label"][i]
+        x0, x1, y0, y1 = (int(cols[k][i]) for k in ("xmin", "xmax", "ymin", "ymax"))
+        result[g].append(Component(
+            color=int(cols["color"][i]),
+            bbox=(x0, x1, y0, y1),
+            area=int(cols["area"][i]),
+            mask=labels[g, y0:y1 + 1, x0:x1 + 1] == lab,
+        ))
+    return result
+
+
+def components(arr: np.ndarray, connectivity: int = 4, by_color: bool = True) -> List[Component]:
+    return batch_components(arr[None], connectivity, by_color)[0]
@@ -0,0 +1,121 @@
+"""
+Duplicate detection for (input, output) pairs.
+
+A pair is reduced to a fingerprint of its canonical form. Optionally the canonical form is taken modulo the 8
+dihedral symmetries (applied to both grids together) and modulo palette relabeling (non-background colors renamed
+in order of first appearance). Fingerprints are stored in the stimulus records, so the index survives
+incremental builds.
+"""
+
+import hashlib
+
+BACKGROUND = "black"
+
+
+# ------------ canonical forms on nested lists ------------
+
+def _rot90(rows):
+    """Counterclockwise, same convention as Grid.rotate_left_90."""
+    n_rows, n_cols = len(rows), len(rows[0]) if rows else 0
+    return [[rows[r][n_cols - 1 - c] for r in range(n_rows)] for c in range(n_cols)]
+
+
+def _mirror(rows):
+    return [row[::-1] for row in rows]
+
+
+def dihedral_variants(rows):
+    """All 8 images of `rows` under rotations and reflections, identity first."""
+    variants = []
+    for base in (rows, _mirror(rows)):
+        cur = base
+        for _ in range(4):
+            variants.append(cur)
+            cur = _rot90(cur)
+    return variants
+
+
+def _relabel(grids):
+    mapping = {BACKGROUND: BACKGROUND}
+    for rows in grids:
+        for row in rows:
+            for color in row:
+                if color not in mapping:
+                    mapping[color] = f"c{len(mapping)}"
+    return [[[mapping[color] for color in row] for row in rows] for rows in grids]
+
+
+def _serialize(grids) -> str:
+    return "|".join(
+        f"{len(rows)}x{len(rows[0]) if rows else 0}:" + ";".join(",".join(row) for row in rows)
+        for rows in grids
+    )
+
+
+def canonical_key(grids, modulo_symmetry: bool = False, modulo_palette: bool = False) -> str:
+    if not (modulo_symmetry or modulo_palette):
+        return "|".join(g.serialize() for g in grids)  # cached on a dense grid, same serialization
+    grids = [[list(row) for row in g.as_list()] for g in grids]
+    if modulo_symmetry:
+        candidates = list(zip(*(dihedral_variants(rows) for rows in grids)))
+    else:
+        candidates = [tuple(grids)]
+    if modulo_palette:
+        candidates = [_relabel(c) for c in candidates]
+    return min(_serialize(c) for c in candidates)
+
+
+def pair_fingerprint(inp, out, modulo_symmetry: bool = False, modulo_palette: bool = False) -> str:
+    key = canonical_key((inp, out), modulo_symmetry, modulo_palette)
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+    return f"{_mode_tag(modulo_symmetry, modulo_palette)}:{digest}"
+
+
+def _mode_tag(modulo_symmetry: bool, modulo_palette: bool) -> str:
+    return f"d{int(modulo_symmetry)}p{int(modulo_palette)}"
+
+
+# ------------ index ------------
+
+class DedupIndex:
+    """Per-rule sets of pair fingerprints."""
+
+    def __init__(self, modulo_symmetry: bool = False, modulo_palette: bool = False):
+        self.modulo_symmetry = modulo_symmetry
+        self.modulo_palette = modulo_palette
+        self._seen: dict[str, set[str]] = {}
+
+    def fingerprint(self, inp, out) -> str:
+        return pair_fingerprint(inp, out, self.modulo_symmetry, self.modulo_palette)
+
+    def compatible(self, fingerprint: str | None) -> bool:
+        """True if a stored fingerprint was computed under this index's mode."""
+        return bool(fingerprint) and fingerprint.split(":", 1)[0] == _mode_tag(self.modulo_symmetry,
+                                                                               self.modulo_palette)
+
+    def contains(self, rule: str, fingerprint: str) -> bool:
+        return fingerprint in self._seen.get(rule, ())
+
+    def add(self, rule: str, fingerprint: str) -> bool:
+        """Add a fingerprint; returns False if it was already present."""
+        seen = self._seen.setdefault(rule, set())
+        if fingerprint in seen:
+            return False
+        seen.add(fingerprint)
+        return True
+
+    def load_records(self, rule: str, records: list[dict], regenerate=None) -> None:
+        """
+        Seed the index from manifest records. Records without a compatible fingerprint are regenerated from
+        their seed via `regenerate(rec) -> (inp, out)` if given (no rendering involved), otherwise skipped.
+        """
+        for rec in records:
+            fp = rec.get("fingerprint")
+            if not self.compatible(fp):
+                if regenerate is None:
+                    continue
+                fp = self.fingerprint(*regenerate(rec))
+            self.add(rule, fp)
+
+    def __len__(self):
+        return sum(len(s) for s in self._seen.values())
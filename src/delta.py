@@ -0,0 +1,78 @@
+"""
+A pair as its input plus the cells that change: Delta(mask, old, new).
+
+    d = delta.diff(inp, out)          # 2-D palette arrays or (B, H, W) stacks of equal shape
+    out = delta.apply(inp, d)
+    inp = delta.unapply(out, d)
+
+mask marks the changed cells; old / new hold their values before and after, in row-major (for stacks:
+item-major) order, i.e. the order of arr[mask]. Recolor rules change only object cells and expansion only adds
+rays, so a delta is a small fraction of a grid. Uses:
+  storage   delta_bytes / from_bytes: packed mask + new values, the input supplies the rest ("tar-delta" format
+            stores <id>.input.npy + <id>.delta.bin instead of both arrays)
+  transfer  src.codec stores record["grids"]["output"] as a delta when that is shorter
+  features  src.metrics derives added / removed / recolored cell counts from the batch delta
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+from src.components import BACKGROUND
+
+
+class Delta(NamedTuple):
+    mask: np.ndarray  # bool, shape of the pair's arrays
+    old: np.ndarray  # values of the masked cells in the input
+    new: np.ndarray  # values of the masked cells in the output
+
+    def counts(self) -> np.ndarray:
+        """Changed cells per grid (a scalar array for a single pair)."""
+        return self.mask.sum(axis=(-2, -1))
+
+    def kinds(self) -> dict:
+        """Per grid: cells added (background -> color), removed (color -> background) and recolored."""
+        added = (self.old == BACKGROUND) & (self.new != BACKGROUND)
+        removed = (self.old != BACKGROUND) & (self.new == BACKGROUND)
+        recolored = ~added & ~removed
+        return {name: self._per_grid(flags) for name, flags in
+                (("added", added), ("removed", removed), ("recolored", recolored))}
+
+    def _per_grid(self, flags: np.ndarray) -> np.ndarray:
+        if self.mask.ndim == 2:
+            return np.asarray(flags.sum())
+        owner = np.nonzero(self.mask)[0]  # batch index of every changed cell, item-major like old / new
+        return np.bincount(owner, weights=flags, minlength=len(self.mask)).astype(np.int64)
+
+
+def diff(inp: np.ndarray, out: np.ndarray) -> Delta:
+    if inp.shape != out.shape:
+        raise ValueError(f"A delta needs equal shapes, got {inp.shape} and {out.shape}")
+    mask = inp != out
+    return Delta(mask, inp[mask], out[mask])
+
+
+def apply(inp: np.ndarray, delta: Delta) -> np.ndarray:
+    out = inp.copy()
+    out[delta.mask] = delta.new
+    return out
+
+
+def unapply(out: np.ndarray, delta: Delta) -> np.ndarray:
+    inp = out.copy()
+    inp[delta.mask] = delta.old
+    return inp
+
+
+# ------------ storage ------------
+
+def delta_bytes(delta: Delta) -> bytes:
+    """Bit-packed mask followed by the new values (uint8); shape and `old` come from the input (see from_bytes)."""
+    return np.packbits(delta.mask.ravel()).tobytes() + delta.new.astype(np.uint8).tobytes()
+
+
+def from_bytes(data: bytes, inp: np.ndarray) -> Delta:
+    n = inp.size
+    raw = np.frombuffer(data, dtype=np.uint8)
+    mask = np.unpackbits(raw[:(n + 7) // 8], count=n).astype(bool).reshape(inp.shape)
+    return Delta(mask, inp[mask], raw[(n + 7) // 8:])
@@ -1,10 +1,134 @@
+import hashlib
+
+# Palette index order for array views of a grid (ARC convention, background first). Colors outside the list
+# are appended on first use, so indices are only stable within a process unless the palette is stored alongside.
+PALETTE = ["black", "blue", "red", "green", "yellow", "gray", "magenta", "orange", "cyan", "brown"]
+
+
+def color_index(color) -> int:
+    try:
+        return PALETTE.index(color)
+    except ValueError:
+        PALETTE.append(color)
+        return len(PALETTE) - 1
+
+
 class Grid:
+    """
+    Copies are copy-on-write: `copy()` shares the cell buffer, and whichever side writes first copies it.
+    `freeze()` makes a grid immutable (writes raise ValueError), e.g. before it is cached or handed to another
+    pipeline stage.
+
+    Grids compare and hash by content. The serialized form behind `digest` / `__hash__` is computed once and
+    kept until the next write; freeze grids used as dict keys, since a write changes the hash.
+    """
+
     def __init__(self, rows, cols, default_color="black"):
         self.rows = rows
         self.cols = cols
         self.grid = [[default_color for _ in range(cols)] for _ in range(rows)]
+        self._refs = [1]  # grids sharing self.grid (the counter object itself is shared)
+        self._exclusive = True  # sole owner, not frozen, nothing cached: writes go straight to the buffer
+        self._frozen = False
+        self._key = None  # cached serialization, see key()
+
+    # ------------ COPY-ON-WRITE ------------
+
+    def _detach(self):
+        """Make self.grid private before a write."""
+        if self._frozen:
+            raise ValueError("Grid is frozen; write to a copy() instead")
+        if self._refs[0] > 1:
+            self._refs[0] -= 1
+            self._refs = [1]
+            self.grid = [row.copy() for row in self.grid]
+        self._key = None
+        self._exclusive = True
+
+    def _replace(self, grid):
+        """Swap in a new buffer (mutating transforms build one anyway, so nothing is copied)."""
+        if self._frozen:
+            raise ValueError("Grid is frozen; write to a copy() instead")
+        if self._refs[0] > 1:
+            self._refs[0] -= 1
+            self._refs = [1]
+        self._key = None
+        self._exclusive = True
+        self.grid = grid
+
+    def freeze(self):
+        """Make this grid immutable; returns self. A copy() of a frozen grid is writable again."""
+        self._frozen = True
+        self._exclusive = False
+        return self
+
+    @property
+    def frozen(self):
+        return self._frozen
+
+    # ------------ EQUALITY / HASHING ------------
+
+    def key(self):
+        """
+        Hashing / equality key, cached until the next write. Caching turns off the write fast path, so the next
+        write clears it. For a dense grid this is serialize().
+        """
+        if self._key is None:
+            self._key = f"{self.rows}x{self.cols if self.rows else 0}:" + ";".join(",".join(row) for row in self.grid)
+            self._exclusive = False
+        return self._key
+
+    def serialize(self):
+        """"ROWSxCOLS:c,c,..;c,c,.." (same serialization as src.dedup, i.e. the stored fingerprints)."""
+        return self.key()
+
+    @property
+    def digest(self):
+        """16-byte blake2b hex digest of serialize()."""
+        return hashlib.blake2b(self.serialize().encode("utf-8"), digest_size=16).hexdigest()
+
+    def __eq__(self, other):
+        if not isinstance(other, Grid):
+            return NotImplemented
+        if self.grid is other.grid or (self._key is not None and self._key is other._key):
+            return self.rows == other.rows and self.cols == other.cols
+        if self._key is not None and other._key is not None:
+            return self._key == other._key
+        return self.rows == other.rows and self.cols == other.cols and self.grid == other.grid
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def canonical(self, modulo_palette=False):
+        """
+        Frozen minimal representative under the 8 rotations / reflections (smallest (shape, palette indices)),
+        and with `modulo_palette` also under relabeling: non-background colors become PALETTE[1], PALETTE[2], ...
+        in order of first appearance.
+        """
+        import numpy as np
+        from src.transforms import DIHEDRAL
+
+        arr = self.to_array()
+        best = None
+        for op in DIHEDRAL.values():
+            v = np.ascontiguousarray(op(arr))
+            if modulo_palette:
+                values, first = np.unique(v, return_index=True)
+                order = values[np.argsort(first)]
+                order = order[order != 0]
+                lut = np.zeros(max(int(v.max()) + 1, 1), dtype=np.uint8)
+                lut[order] = np.arange(1, len(order) + 1)
+                v = lut[v]
+            candidate = (v.shape, v.tobytes())
+            if best is None or candidate < best[0]:
+                best = (candidate, v)
+        return Grid.from_array(best[1]).freeze()
+
+    # ------------ CELLS ------------
 
     def set(self, row, col, color):
+        if not self._exclusive:
+            self._detach()
         self.grid[row][col] = color
 
     def get(self, row, col):
@@ -21,22 +145,57 @@ class Grid:
             xmin, xmax: horizontal range (columns)
             ymin, ymax: vertical range (rows)
         """
+        if not self._exclusive:
+            self._detach()
         for r in range(ymin, ymax + 1):
             for c in range(xmin, xmax + 1):
                 if 0 <= r < self.rows and 0 <= c < self.cols:
                     self.grid[r][c] = color
 
     def fill_all(self, color):
+        if not self._exclusive:
+            self._detach()
         for r in range(self.rows):
             for c in range(self.cols):
                 self.grid[r][c] = color
 
     def as_list(self):
+        """The cell buffer itself, possibly shared with copies: read only."""
         return self.grid
 
+    def to_array(self):
+        """(rows, cols) uint8 array of PALETTE indices."""
+        import numpy as np
+        lut = {}
+        return np.array(
+            [[lut[c] if c in lut else lut.setdefault(c, color_index(c)) for c in row] for row in self.grid],
+            dtype=np.uint8,
+        ).reshape(self.rows, self.cols)
+
+    @classmethod
+    def from_array(cls, arr):
+        rows, cols = arr.shape
+        g = cls(0, 0)
+        g.rows, g.cols = rows, cols
+        g.grid = [[PALETTE[i] for i in row] for row in arr.tolist()]
+        return g
+
+    def objects(self, connectivity=4, by_color=True):
+        """Connected single-color objects (background excluded), see src.components."""
+        from src.components import components
+        return components(self.to_array(), connectivity=connectivity, by_color=by_color)
+
     def copy(self):
-        new_grid = Grid(self.rows, self.cols)
-        new_grid.grid = [row.copy() for row in self.grid]
+        """O(1): the copy shares the buffer until either side writes."""
+        new_grid = Grid(0, 0)
+        new_grid.rows, new_grid.cols = self.rows, self.cols
+        new_grid.grid = self.grid
+        new_grid._refs = self._refs
+        new_grid._key = self._key
+        new_grid._exclusive = False
+        self._refs[0] += 1
+        if not self._frozen:
+            self._exclusive = False
         return new_grid
 
     # ------------ MUTATING TRANSFORMS ------------
@@ -47,7 +206,7 @@ class Grid:
         for r in range(self.rows):
             for c in range(self.cols):
                 out[self.cols - 1 - c][r] = self.grid[r][c]
-        self.grid = out
+        self._replace(out)
         self.rows, self.cols = self.cols, self.rows  # swap
 
     def mirror_x(self):
@@ -56,7 +215,7 @@ class Grid:
         for r in range(self.rows):
             for c in range(self.cols):
                 out[self.rows - 1 - r][c] = self.grid[r][c]
-        self.grid = out
+        self._replace(out)
 
     def mirror_y(self):
         """Mirror along the y-axis (vertical axis): left ↔ right. Mutates self."""
@@ -64,4 +223,203 @@ class Grid:
         for r in range(self.rows):
             for c in range(self.cols):
                 out[r][self.cols - 1 - c] = self.grid[r][c]
-        self.grid = out
\ No newline at end of file
+        self._replace(out)
+
+
+class SparseGrid(Grid):
+    """
+    Grid storing only the cells that differ from the background: {(row, col): color}. Same API as Grid (including
+    copy-on-write, freeze and hashing); as_list() / to_dense() materialize the rows, e.g. for rendering. Writes,
+    transforms, to_array() and coo() cost O(colored cells) instead of O(area), which pays off for mostly-empty
+    grids such as the recolor rules' scattered blocks.
+    """
+
+    def __init__(self, rows, cols, default_color="black"):
+        self.rows = rows
+        self.cols = cols
+        self.background = default_color
+        self.cells = {}
+        self._refs = [1]
+        self._exclusive = True
+        self._frozen = False
+        self._key = None
+
+    def _detach(self):
+        if self._frozen:
+            raise ValueError("Grid is frozen; write to a copy() instead")
+        if self._refs[0] > 1:
+            self._refs[0] -= 1
+            self._refs = [1]
+            self.cells = dict(self.cells)
+        self._key = None
+        self._exclusive = True
+
+    def _replace(self, cells):
+        if self._frozen:
+            raise ValueError("Grid is frozen; write to a copy() instead")
+        if self._refs[0] > 1:
+            self._refs[0] -= 1
+            self._refs = [1]
+        self._key = None
+        self._exclusive = True
+        self.cells = cells
+
+    def _pos(self, row, col):
+        """Normalized (row, col) with list-index semantics: negative indices wrap, out of range raises."""
+        r = row + self.rows if row < 0 else row
+        c = col + self.cols if col < 0 else col
+        if not (0 <= r < self.rows and 0 <= c < self.cols):
+            raise IndexError(f"cell ({row}, {col}) outside a {self.rows}x{self.cols} grid")
+        return r, c
+
+    # ------------ CELLS ------------
+
+    def set(self, row, col, color):
+        if not self._exclusive:
+            self._detach()
+        pos = self._pos(row, col)
+        if color == self.background:
+            self.cells.pop(pos, None)
+        else:
+            self.cells[pos] = color
+
+    def get(self, row, col):
+        return self.cells.get(self._pos(row, col), self.background)
+
+    def fill_rect(self, xmin, xmax, ymin, ymax, color):
+        if not self._exclusive:
+            self._detach()
+        rows = range(max(ymin, 0), min(ymax, self.rows - 1) + 1)
+        cols = range(max(xmin, 0), min(xmax, self.cols - 1) + 1)
+        if color == self.background:
+            for pos in [p for p in self.cells if p[0] in rows and p[1] in cols]:
+                del self.cells[pos]
+        else:
+            self.cells.update(((r, c), color) for r in rows for c in cols)
+
+    def fill_all(self, color):
+        if not self._exclusive:
+            self._detach()
+        self.cells = {} if color == self.background else {
+            (r, c): color for r in range(self.rows) for c in range(self.cols)}
+
+    @property
+    def grid(self):
+        return self.as_list()
+
+    def as_list(self):
+        """Dense rows, built on every call."""
+        out = [[self.background] * self.cols for _ in range(self.rows)]
+        for (r, c), color in self.cells.items():
+            out[r][c] = color
+        return out
+
+    def to_dense(self):
+        g = Grid(0, 0)
+        g.rows, g.cols = self.rows, self.cols
+        g.grid = self.as_list()
+        return g
+
+    # ------------ ARRAYS ------------
+
+    def coo(self):
+        """(row, col, PALETTE index) arrays of the colored cells, row-major."""
+        import numpy as np
+        items = sorted(self.cells.items())
+        rows = np.array([r for (r, _), _ in items], dtype=np.intp)
+        cols = np.array([c for (_, c), _ in items], dtype=np.intp)
+        values = np.array([color_index(color) for _, color in items], dtype=np.uint8)
+        return rows, cols, values
+
+    @classmethod
+    def from_coo(cls, shape, rows, cols, values, default_color="black"):
+        g = cls(*shape, default_color=default_color)
+        cells = ((int(r), int(c), PALETTE[int(v)]) for r, c, v in zip(rows, cols, values))
+        g.cells = {(r, c): color for r, c, color in cells if color != default_color}
+        return g
+
+    def to_array(self):
+        import numpy as np
+        arr = np.full((self.rows, self.cols), color_index(self.background), dtype=np.uint8)
+        rows, cols, values = self.coo()
+        arr[rows, cols] = values
+        return arr
+
+    @classmethod
+    def from_array(cls, arr, default_color="black"):
+        import numpy as np
+        rows, cols = np.nonzero(arr != color_index(default_color))
+        return cls.from_coo(arr.shape, rows, cols, arr[rows, cols], default_color)
+
+    @classmethod
+    def from_grid(cls, grid, default_color="black"):
+        g = cls(grid.rows, grid.cols, default_color)
+        g.cells = {(r, c): color for r, row in enumerate(grid.as_list()) for c, color in enumerate(row)
+                   if color != default_color}
+        return g
+
+    # ------------ EQUALITY / HASHING ------------
+
+    def key(self):
+        """
+        "ROWSxCOLS/BACKGROUND:r,c=color;..." over the sorted colored cells: O(cells log cells), not O(area). Differs
+        from a dense Grid's key, so hash() agrees with == only among SparseGrids of one background; convert with
+        to_dense() / from_grid() before mixing the two in a set or dict.
+        """
+        if self._key is None:
+            cells = ";".join(f"{r},{c}={color}" for (r, c), color in sorted(self.cells.items()))
+            self._key = f"{self.rows}x{self.cols}/{self.background}:{cells}"
+            self._exclusive = False
+        return self._key
+
+    def serialize(self):
+        """The dense serialization (O(area)), for fingerprints that must not depend on the storage."""
+        empty = ",".join([self.background] * self.cols)
+        by_row = {}
+        for (r, c), color in self.cells.items():
+            by_row.setdefault(r, {})[c] = color
+        lines = []
+        for r in range(self.rows):
+            if r in by_row:
+                row = [self.background] * self.cols
+                for c, color in by_row[r].items():
+                    row[c] = color
+                lines.append(",".join(row))
+            else:
+                lines.append(empty)
+        return f"{self.rows}x{self.cols if self.rows else 0}:" + ";".join(lines)
+
+    def __eq__(self, other):
+        if isinstance(other, SparseGrid) and other.background == self.background:
+            return self.rows == other.rows and self.cols == other.cols and self.cells == other.cells
+        if not isinstance(other, Grid):
+            return NotImplemented
+        return self.rows == other.rows and self.cols == other.cols and self.as_list() == other.as_list()
+
+    __hash__ = Grid.__hash__
+
+    def copy(self):
+        new_grid = SparseGrid(self.rows, self.cols, self.background)
+        new_grid.cells = self.cells
+        new_grid._refs = self._refs
+        new_grid._key = self._key
+        new_grid._exclusive = False
+        self._refs[0] += 1
+        if not self._frozen:
+            self._exclusive = False
+        return new_grid
+
+    # ------------ MUTATING TRANSFORMS ------------
+
+    def rotate_left_90(self):
+        cols = self.cols
+        self._replace({(cols - 1 - c, r): color for (r, c), color in self.cells.items()})
+        self.rows, self.cols = self.cols, self.rows
+
+    def mirror_x(self):
+        rows = self.rows
+        self._replace({(rows - 1 - r, c): color for (r, c), color in self.cells.items()})
+
+    def mirror_y(self):
+        cols = self.cols
+        self._replace({(r, cols - 1 - c): color for (r, c), color in self.cells.items()})
@@ -0,0 +1,188 @@
+"""
+Manifest of completed work inside an output directory.
+
+Each rule directory `out/<rule>/` holds a `stimuli.jsonl` (the manifest) and the PNGs its records point to.
+A record is complete when every file listed under its "files" key exists and matches the stored checksum.
+Records written before checksums were introduced list no files; the default `<id>.<kind>.png` names are
+assumed for them and their checksums are adopted on the next reconcile.
+"""
+
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+FILE_KINDS = ("input", "output", "combined")
+
+_IDX_RE = re.compile(r"\.t(\d+)$")
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def write_bytes_atomic(path: Path, data: bytes) -> None:
+    """Write via a temp file + rename, so a crash never leaves a truncated file under the final name."""
+    tmp = path.with_name(path.name + ".part")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def file_entry(name: str, data: bytes) -> dict:
+    return {"path": name, "sha256": sha256_bytes(data), "bytes": len(data)}
+
+
+def load_records(jsonl_path: Path) -> list[dict]:
+    """Read a manifest, skipping blank or truncated lines (e.g. from a build killed mid-write)."""
+    if not jsonl_path.exists():
+        return []
+    records = []
+    with jsonl_path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def record_files(rec: dict) -> dict:
+    """kind -> file entry; legacy records get the default file names without checksums."""
+    files = rec.get("files")
+    if files is not None:  # {} for metadata-only records
+        return files
+    return {kind: {"path": f"{rec['id']}.{kind}.png"} for kind in FILE_KINDS}
+
+
+def record_idx(rec: dict) -> int:
+    m = _IDX_RE.search(str(rec.get("id", "")))
+    return int(m.group(1)) if m else 0
+
+
+def is_complete(base: Path, rec: dict, verify_checksums: bool = True) -> bool:
+    if not rec.get("id") or not rec.get("rule"):
+        return False
+    for entry in record_files(rec).values():
+        path = base / entry["path"]
+        if not path.is_file():
+            return False
+        if "bytes" in entry and path.stat().st_size != entry["bytes"]:
+            return False
+        if verify_checksums and "sha256" in entry and file_sha256(path) != entry["sha256"]:
+            return False
+    return True
+
+
+def _adopt_checksums(base: Path, rec: dict) -> dict:
+    if rec.get("files") is not None:
+        return rec
+    files = {}
+    for kind, entry in record_files(rec).items():
+        path = base / entry["path"]
+        files[kind] = {"path": entry["path"], "sha256": file_sha256(path), "bytes": path.stat().st_size}
+    return {**rec, "files": files}
+
+
+def reconcile(base: Path, verify_checksums: bool = True, remove_orphans: bool = True) -> list[dict]:
+    """
+    Bring `base/stimuli.jsonl` in line with the files on disk and return the complete records.
+
+    - records whose files are missing or fail their checksum are dropped (and their remaining files removed)
+    - duplicate ids keep the first complete record
+    - files no record points to (orphans, `.part` leftovers) are deleted
+    The manifest is only rewritten when something changed.
+    """
+    jsonl_path = base / "stimuli.jsonl"
+    if not base.is_dir():
+        return []
+
+    lines = jsonl_path.read_text(encoding="utf-8").splitlines() if jsonl_path.exists() else []
+    n_lines = sum(1 for line in lines if line.strip())
+    records = load_records(jsonl_path)
+
+    kept: list[dict] = []
+    seen_ids: set[str] = set()
+    for rec in records:
+        if rec.get("id") in seen_ids or not is_complete(base, rec, verify_checksums):
+            continue
+        seen_ids.add(rec["id"])
+        kept.append(_adopt_checksums(base, rec))
+
+    if kept != records or len(records) != n_lines:
+        tmp = jsonl_path.with_name(jsonl_path.name + ".part")
+        with tmp.open("w", encoding="utf-8") as f:
+            for rec in kept:
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        os.replace(tmp, jsonl_path)
+
+    if remove_orphans:
+        referenced = {entry["path"] for rec in kept for entry in record_files(rec).values()}
+        referenced.add(jsonl_path.name)
+        for path in base.iterdir():
+            if path.is_file() and path.name not in referenced and _is_build_artifact(path):
+                path.unlink()
+
+    return kept
+
+
+def _is_build_artifact(path: Path) -> bool:
+    return path.suffix == ".png" or path.name.endswith(".part")
+
+
+class DirectoryWriter:
+    """
+    Loose-file output: `<out_root>/<rule>/<id>.<kind>.png` plus one manifest per rule directory.
+    With `payload=()` only the manifest is written (metadata-only builds, no rendering).
+    """
+
+    def __init__(self, out_root="out", verify_checksums: bool = True, catalog=None, payload=("png",)):
+        self.out_root = Path(out_root)
+        self.payload = tuple(payload)
+        self.verify_checksums = verify_checksums
+        self.catalog = catalog
+
+    def existing(self, rule: str) -> list[dict]:
+        records = reconcile(self.out_root / rule, verify_checksums=self.verify_checksums)
+        if self.catalog is not None:
+            self.catalog.replace_rule(rule, records)
+        return records
+
+    def write(self, rec: dict, blobs: dict) -> dict:
+        """
+        `blobs`: file suffix (e.g. "input.png") -> bytes. PNGs go first, the manifest line last.
+        Returns the record as written.
+        """
+        base = self.out_root / rec["rule"]
+        base.mkdir(parents=True, exist_ok=True)
+        files = {}
+        for suffix, data in blobs.items():
+            name = f"{rec['id']}.{suffix}"
+            write_bytes_atomic(base / name, data)
+            files[suffix.split(".", 1)[0]] = file_entry(name, data)
+        rec = {**rec, "files": files}
+        with (base / "stimuli.jsonl").open("a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        if self.catalog is not None:
+            self.catalog.add(rec)
+        return rec
+
+    def close(self) -> None:
+        if self.catalog is not None:
+            self.catalog.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,165 @@
+"""
+Peak-memory tracking per rule and stage (the `--memprofile` mode of main.py).
+
+Builds on the stages of src.profiling: with tracking on, every stage also records
+  - its tracemalloc peak (Python allocations, incl. numpy/matplotlib buffers) above the level at stage entry
+  - the process' current RSS at stage entry and exit: per rule its highest value and its largest growth over
+    one stage (ru_maxrss only ever rises, so it is reported once, as the process high-water mark)
+and the first occurrence of each (rule, stage) plus every stage over the threshold take a tracemalloc
+snapshot for the top allocating source lines (what is still live at stage exit; transient buffers freed inside
+the stage only show up in the peak). Stimuli whose peak exceeds `threshold_mb` are flagged.
+
+tracemalloc slows allocation-heavy code noticeably, so this mode is for diagnosis runs, not production builds.
+"""
+
+import os
+import sys
+import tracemalloc
+from collections import defaultdict
+
+from src import profiling
+
+MB = 1024 * 1024
+
+
+def current_rss_bytes() -> int | None:
+    """The process' RSS now: /proc/self/statm on Linux, psutil elsewhere, None if neither is available."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def peak_rss_bytes() -> int | None:
+    """The process' RSS high-water mark; psutil (Windows peak working set) where `resource` is missing, else None."""
+    try:
+        import resource  # Unix only
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return getattr(psutil.Process().memory_info(), "peak_wset", None)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024  # bytes on macOS, KiB on Linux
+
+
+class MemTracker:
+    def __init__(self, threshold_mb: float = 512.0, top_n: int = 10, max_snapshots: int = 50):
+        self.threshold = threshold_mb * MB
+        self.top_n = top_n
+        self.max_snapshots = max_snapshots
+        self.stage_peaks = defaultdict(int)  # (rule, stage) -> max bytes
+        self.rule_rss = defaultdict(int)  # rule -> highest current RSS at entry / exit of its stages
+        self.rule_rss_growth = defaultdict(int)  # rule -> largest RSS growth over one of its stages
+        self.item_peaks = {}  # (rule, item) -> max bytes over its stages
+        self.flagged = {}  # (rule, item) -> {"stage", "peak_mb"} of its largest stage over the threshold
+        self.top_allocators = {}  # (rule, stage) -> [(location, size_bytes, count)]
+        self._stack = []  # [start_bytes, peak_bytes, start_rss] per open stage
+        self._snapshots = 0
+
+    def enter(self) -> None:
+        current, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            self._stack[-1][1] = max(self._stack[-1][1], peak)
+        tracemalloc.reset_peak()
+        self._stack.append([current, current, current_rss_bytes()])
+
+    def exit(self, rule, item, stage: str) -> None:
+        start, peak, start_rss = self._stack.pop()
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        if self._stack:
+            self._stack[-1][1] = max(self._stack[-1][1], peak)
+        used = peak - start
+
+        key = (rule, stage)
+        first = key not in self.stage_peaks
+        self.stage_peaks[key] = max(self.stage_peaks[key], used)
+        rss = current_rss_bytes()
+        if rss is not None:
+            self.rule_rss[rule] = max(self.rule_rss[rule], start_rss, rss)
+            self.rule_rss_growth[rule] = max(self.rule_rss_growth[rule], rss - start_rss)
+        if item is not None:
+            self.item_peaks[(rule, item)] = max(self.item_peaks.get((rule, item), 0), used)
+
+        over = used > self.threshold
+        if over and used / MB > self.flagged.get((rule, item), {}).get("peak_mb", 0):
+            self.flagged[(rule, item)] = {"stage": stage, "peak_mb": used / MB}
+        if (first or over) and self._snapshots < self.max_snapshots:
+            self._snapshots += 1
+            self.top_allocators[key] = self._top(tracemalloc.take_snapshot())
+
+    def _top(self, snapshot) -> list:
+        snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+        return [
+            (f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", stat.size, stat.count)
+            for stat in snapshot.statistics("lineno")[:self.top_n]
+        ]
+
+    # ---- reporting ----
+
+    def print_summary(self) -> None:
+        print(f"{'rule':38} {'stage':22} {'peak_mb':>9}")
+        for (rule, stage), used in sorted(self.stage_peaks.items(), key=lambda kv: (str(kv[0][0]), kv[0][1])):
+            print(f"{str(rule):38} {stage:22} {used / MB:>9.2f}")
+        print()
+        print(f"{'rule':38} {'rss_mb':>9} {'rss_growth_mb':>14} {'max_item_mb':>12}")
+        for rule in sorted({r for r, _ in self.stage_peaks}, key=str):
+            item_max = max((v for (r, _), v in self.item_peaks.items() if r == rule), default=0)
+            if rule in self.rule_rss:
+                rss = f"{self.rule_rss[rule] / MB:>9.1f} {self.rule_rss_growth[rule] / MB:>14.1f}"
+            else:
+                rss = f"{'-':>9} {'-':>14}"  # no RSS probe on this platform
+            print(f"{str(rule):38} {rss} {item_max / MB:>12.2f}")
+        high_water = peak_rss_bytes()
+        if high_water is not None:
+            print(f"process peak RSS (high-water mark): {high_water / MB:.1f} MB")
+        if self.flagged:
+            print(f"\n{len(self.flagged)} stimuli over {self.threshold / MB:.0f} MB:")
+            for (rule, item), f in self.flagged.items():
+                print(f"  {rule} {item} {f['stage']}: {f['peak_mb']:.1f} MB")
+
+    def print_top_allocators(self) -> None:
+        for (rule, stage), stats in sorted(self.top_allocators.items(), key=lambda kv: (str(kv[0][0]), kv[0][1])):
+            print(f"\n{rule} / {stage}")
+            for location, size, count in stats:
+                print(f"  {size / MB:9.2f} MB  {count:>7} blocks  {location}")
+
+    def report(self) -> dict:
+        high_water = peak_rss_bytes()
+        return {
+            "stage_peaks_mb": [
+                {"rule": rule, "stage": stage, "peak_mb": used / MB} for (rule, stage), used in self.stage_peaks.items()
+            ],
+            "rss_mb": {str(rule): rss / MB for rule, rss in self.rule_rss.items()},
+            "rss_growth_mb": {str(rule): growth / MB for rule, growth in self.rule_rss_growth.items()},
+            "process_peak_rss_mb": None if high_water is None else high_water / MB,
+            "flagged": [{"rule": rule, "item": item, **f} for (rule, item), f in self.flagged.items()],
+            "top_allocators": [
+                {"rule": rule, "stage": stage, "top": [{"location": loc, "mb": size / MB, "blocks": count}
+                                                       for loc, size, count in stats]}
+                for (rule, stage), stats in self.top_allocators.items()
+            ],
+        }
+
+
+def enable(threshold_mb: float = 512.0, top_n: int = 10, frames: int = 1) -> MemTracker:
+    """Start tracemalloc and attach a tracker to the profiler (which is enabled as well)."""
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    tracker = MemTracker(threshold_mb=threshold_mb, top_n=top_n)
+    profiling.enable()
+    profiling.PROFILER.mem = tracker
+    return tracker
+
+
+def disable() -> None:
+    profiling.PROFILER.mem = None
+    profiling.disable()
+    tracemalloc.stop()
@@ -0,0 +1,131 @@
+"""
+Structural difficulty metrics of (input, output) pairs.
+
+Computed on palette-index arrays (see Grid.to_array) for a whole batch at once: pairs are grouped by their
+(input shape, output shape) and each group is stacked into (B, H, W) arrays, so the numpy work per call is the
+same for 1 or 10,000 pairs. main._generate_task runs it inline and stores the result in `Stimulus.difficulty`.
+
+Per pair:
+  changed_cells     cells that differ between input and output (inputs aligned at the top-left corner; output
+                    cells outside the input's extent count as changed)
+  edit_distance     changed_cells / output cells
+  added/removed/    changed cells of the aligned part by kind (background -> color, color -> background, color ->
+  recolored_cells   color), from the batch src.delta
+  n_objects_in/out  4-connected single-color components, background excluded (src.components)
+  bbox_overlap      summed pairwise bounding-box intersections of the input objects / summed bbox areas
+  symmetry_in/out   best agreement of the foreground with its own mirror_x, mirror_y or 180° rotation
+  score             composite in [0, 1], weighted by COMPOSITE_WEIGHTS
+  level             score binned into 1..LEVELS (usable as a quota key)
+"""
+
+import numpy as np
+
+from src import components, delta
+from src.components import BACKGROUND
+
+# composite score = sum(weight * feature), every feature scaled to [0, 1]
+COMPOSITE_WEIGHTS = {
+    "objects": 0.35,  # n_objects_in / OBJECTS_SATURATION, clipped
+    "edit_distance": 0.25,  # edit_distance / EDIT_SATURATION, clipped
+    "bbox_overlap": 0.2,
+    "asymmetry": 0.2,  # 1 - symmetry_in
+}
+OBJECTS_SATURATION = 10
+EDIT_SATURATION = 0.25
+LEVELS = 5
+
+
+def _bbox_overlap(labels: np.ndarray, arrs: np.ndarray) -> np.ndarray:
+    b = len(labels)
+    cols = components.stats(labels, arrs)
+    if len(cols["owner"]) == 0:
+        return np.zeros(b)
+    x0, x1, y0, y1 = components.padded(cols, ("xmin", "xmax", "ymin", "ymax"), b, (1, 0, 1, 0))
+
+    ih = np.minimum(y1[:, :, None], y1[:, None, :]) - np.maximum(y0[:, :, None], y0[:, None, :]) + 1
+    iw = np.minimum(x1[:, :, None], x1[:, None, :]) - np.maximum(x0[:, :, None], x0[:, None, :]) + 1
+    inter = np.clip(ih, 0, None) * np.clip(iw, 0, None)
+    pairwise = np.triu(inter, k=1).sum(axis=(1, 2))
+    area = (np.clip(y1 - y0 + 1, 0, None) * np.clip(x1 - x0 + 1, 0, None)).sum(axis=1)
+    return np.divide(pairwise, area, out=np.zeros(b), where=area > 0)
+
+
+# ------------ pair features ------------
+
+def _symmetry(arrs: np.ndarray) -> np.ndarray:
+    fg = arrs != BACKGROUND
+    total = fg.sum(axis=(1, 2))
+    best = np.zeros(len(arrs))
+    for flipped in (arrs[:, ::-1, :], arrs[:, :, ::-1], arrs[:, ::-1, ::-1]):
+        best = np.maximum(best, (fg & (flipped == arrs)).sum(axis=(1, 2)) / np.maximum(total, 1))
+    return np.where(total > 0, best, 1.0)
+
+
+def _changed(inp: np.ndarray, out: np.ndarray):
+    """(changed cells, delta.kinds()) of the batch, inputs and outputs aligned at the top-left corner."""
+    h, w = min(inp.shape[1], out.shape[1]), min(inp.shape[2], out.shape[2])
+    outside = out.shape[1] * out.shape[2] - h * w
+    d = delta.diff(inp[:, :h, :w], out[:, :h, :w])
+    return d.counts() + outside, d.kinds()
+
+
+def _group_metrics(inp: np.ndarray, out: np.ndarray) -> dict:
+    labels_in = components.label(inp)
+    n_in = components.count(labels_in)
+    changed, kinds = _changed(inp, out)
+    edit = changed / (out.shape[1] * out.shape[2])
+    overlap = _bbox_overlap(labels_in, inp)
+    sym_in = _symmetry(inp)
+
+    features = {
+        "objects": np.minimum(n_in / OBJECTS_SATURATION, 1.0),
+        "edit_distance": np.minimum(edit / EDIT_SATURATION, 1.0),
+        "bbox_overlap": np.minimum(overlap, 1.0),
+        "asymmetry": 1.0 - sym_in,
+    }
+    score = sum(weight * features[name] for name, weight in COMPOSITE_WEIGHTS.items())
+    return {
+        "changed_cells": changed,
+        "edit_distance": edit,
+        "added_cells": kinds["added"],
+        "removed_cells": kinds["removed"],
+        "recolored_cells": kinds["recolored"],
+        "n_objects_in": n_in,
+        "n_objects_out": components.count(components.label(out)),
+        "bbox_overlap": overlap,
+        "symmetry_in": sym_in,
+        "symmetry_out": _symmetry(out),
+        "score": score,
+        "level": np.minimum((score * LEVELS).astype(int) + 1, LEVELS),
+    }
+
+
+def batch_metrics(inputs, outputs) -> list[dict]:
+    """Metrics for each (input, output) pair; grids may be Grid objects or 2-D palette-index arrays."""
+    inputs = [_as_array(g) for g in inputs]
+    outputs = [_as_array(g) for g in outputs]
+    groups = {}
+    for i, (a, b) in enumerate(zip(inputs, outputs)):
+        groups.setdefault((a.shape, b.shape), []).append(i)
+
+    results = [None] * len(inputs)
+    for members in groups.values():
+        columns = _group_metrics(np.stack([inputs[i] for i in members]), np.stack([outputs[i] for i in members]))
+        for j, i in enumerate(members):
+            results[i] = {name: _plain(values[j]) for name, values in columns.items()}
+    return results
+
+
+def pair_metrics(inp, out) -> dict:
+    return batch_metrics([inp], [out])[0]
+
+
+def _as_array(grid) -> np.ndarray:
+    return grid if isinstance(grid, np.ndarray) else grid.to_array()
+
+
+def _plain(value):
+    """numpy scalar -> JSON-friendly int/float."""
+    if np.issubdtype(type(value), np.integer):
+        return int(value)
+    return round(float(value), 4)
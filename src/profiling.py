@@ -0,0 +1,201 @@
+"""
+Opt-in instrumentation for the generation pipeline.
+
+    from src import profiling
+    profiling.enable()
+    ...build...
+    profiling.print_summary()
+    profiling.dump_trace("trace.json")   # open in chrome://tracing or https://ui.perfetto.dev
+
+While disabled, `stage()` returns a shared no-op context manager and `count()` returns immediately; the Grid
+mutators are only wrapped (for cell-write counts) between enable() and disable(), so they run unpatched otherwise.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+_NULL = nullcontext()
+
+
+class Profiler:
+    def __init__(self, max_events: int = 1_000_000):
+        self.enabled = False
+        self.max_events = max_events
+        self.rule = None
+        self.item = None  # id of the stimulus being produced, for per-item reports
+        self.mem = None  # optional src.memprofile.MemTracker
+        self.reset()
+
+    def reset(self):
+        self.timers = defaultdict(list)  # (rule, stage) -> [seconds]
+        self.counters = defaultdict(int)  # (rule, name) -> value
+        self.events = []
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def _stage(self, name: str):
+        if self.mem is not None:
+            self.mem.enter()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            if self.mem is not None:
+                self.mem.exit(self.rule, self.item, name)
+            self.timers[(self.rule, name)].append(end - start)
+            if len(self.events) < self.max_events:
+                self.events.append({
+                    "name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                    "ts": (start - self._t0) * 1e6, "dur": (end - start) * 1e6, "args": {"rule": self.rule},
+                })
+
+
+PROFILER = Profiler()
+
+
+def stage(name: str):
+    """Time a block as `name` under the current rule."""
+    if not PROFILER.enabled:
+        return _NULL
+    return PROFILER._stage(name)
+
+
+def count(name: str, n: int = 1) -> None:
+    if PROFILER.enabled:
+        PROFILER.counters[(PROFILER.rule, name)] += n
+
+
+@contextmanager
+def rule_scope(rule: str):
+    """Attribute stages and counters inside the block to `rule`."""
+    prev, PROFILER.rule = PROFILER.rule, rule
+    try:
+        yield
+    finally:
+        PROFILER.rule = prev
+
+
+def set_item(item) -> None:
+    PROFILER.item = item
+
+
+def profiled(name: str):
+    """Decorator form of `stage` for whole functions (one attribute check per call while disabled)."""
+    def wrap(fn):
+        def inner(*args, **kwargs):
+            if not PROFILER.enabled:
+                return fn(*args, **kwargs)
+            with PROFILER._stage(name):
+                return fn(*args, **kwargs)
+        inner.__name__, inner.__doc__, inner.__wrapped__ = fn.__name__, fn.__doc__, fn
+        return inner
+    return wrap
+
+
+# ------------ Grid mutator counting ------------
+
+def _cells_in_rect(grid, xmin, xmax, ymin, ymax, color=None):
+    return max(0, min(xmax, grid.cols - 1) - max(xmin, 0) + 1) * max(0, min(ymax, grid.rows - 1) - max(ymin, 0) + 1)
+
+
+_GRID_WRITES = {
+    "set": lambda g, *a, **k: 1,
+    "fill_rect": lambda g, *a, **k: _cells_in_rect(g, *a, **k),
+    "fill_all": lambda g, *a, **k: g.rows * g.cols,
+    "rotate_left_90": lambda g, *a, **k: g.rows * g.cols,
+    "mirror_x": lambda g, *a, **k: g.rows * g.cols,
+    "mirror_y": lambda g, *a, **k: g.rows * g.cols,
+}
+_originals = {}
+
+
+def _patch_grid():
+    from src.grid import Grid, SparseGrid
+
+    for cls in (Grid, SparseGrid):
+        for name, cells in _GRID_WRITES.items():
+            if name not in vars(cls):
+                continue
+            orig = vars(cls)[name]
+            _originals[(cls, name)] = orig
+
+            def counted(self, *args, _orig=orig, _cells=cells, _name=name, **kwargs):
+                PROFILER.counters[(PROFILER.rule, "cell_writes")] += _cells(self, *args, **kwargs)
+                PROFILER.counters[(PROFILER.rule, f"grid.{_name}")] += 1
+                return _orig(self, *args, **kwargs)
+
+            setattr(cls, name, counted)
+
+
+def _unpatch_grid():
+    for (cls, name), orig in _originals.items():
+        setattr(cls, name, orig)
+    _originals.clear()
+
+
+# ------------ switching ------------
+
+def enable(reset: bool = True) -> None:
+    if reset:
+        PROFILER.reset()
+    if not PROFILER.enabled:
+        _patch_grid()
+    PROFILER.enabled = True
+
+
+def disable() -> None:
+    if PROFILER.enabled:
+        _unpatch_grid()
+    PROFILER.enabled = False
+
+
+# ------------ reporting ------------
+
+# stages that partition a stimulus' time in main._generate_task; used for the "share" column
+TOP_LEVEL_STAGES = ("generate", "augment", "fingerprint", "metrics", "render", "write")
+
+
+def summary() -> list[dict]:
+    rows = []
+    totals = defaultdict(float)
+    for (rule, name), samples in PROFILER.timers.items():
+        totals[rule] += sum(samples) if name in TOP_LEVEL_STAGES else 0.0
+    for (rule, name), samples in sorted(PROFILER.timers.items(), key=lambda kv: (str(kv[0][0]), kv[0][1])):
+        values = sorted(samples)
+        total = sum(values)
+        rows.append({
+            "rule": rule, "stage": name, "calls": len(values), "total_s": total,
+            "mean_ms": 1e3 * total / len(values), "p50_ms": 1e3 * values[len(values) // 2],
+            "share": total / totals[rule] if totals[rule] else None,
+        })
+    return rows
+
+
+def print_summary() -> None:
+    print(f"{'rule':38} {'stage':22} {'calls':>7} {'total_s':>9} {'mean_ms':>9} {'p50_ms':>9} {'share':>6}")
+    for r in summary():
+        share = f"{100 * r['share']:5.1f}%" if r["share"] is not None and r["stage"] in TOP_LEVEL_STAGES else ""
+        print(f"{str(r['rule']):38} {r['stage']:22} {r['calls']:>7} {r['total_s']:>9.3f} {r['mean_ms']:>9.3f} "
+              f"{r['p50_ms']:>9.3f} {share:>6}")
+    if PROFILER.counters:
+        print()
+        print(f"{'rule':38} {'counter':22} {'value':>12}")
+        for (rule, name), value in sorted(PROFILER.counters.items(), key=lambda kv: (str(kv[0][0]), kv[0][1])):
+            print(f"{str(rule):38} {name:22} {value:>12}")
+
+
+def dump_trace(path) -> None:
+    """Chrome trace-event JSON: one complete ("X") event per stage, counters as final "C" events."""
+    end_ts = (time.perf_counter() - PROFILER._t0) * 1e6
+    counter_events = [
+        {"name": name, "ph": "C", "pid": os.getpid(), "ts": end_ts, "args": {str(rule): value}}
+        for (rule, name), value in PROFILER.counters.items()
+    ]
+    doc = {"traceEvents": PROFILER.events + counter_events, "displayTimeUnit": "ms"}
+    Path(path).write_text(json.dumps(doc), encoding="utf-8")
@@ -0,0 +1,156 @@
+"""
+Quota-driven generation: target counts per (rule, bin) instead of a flat N per rule.
+
+A bin is a value derived from a stimulus record, by default `params["n_objects"]`. For every unfilled bin the
+scheduler proposes generator kwargs that steer towards it (e.g. `star_num=(3, 3)` for the 3-object bin). Steering
+is a hint: the produced pair is binned from its actual params and kept only if that bin still has room, which is
+decided before anything is rendered or written. Bins a rule can never produce (e.g. 1 object for a rule that
+always draws two groups) are rejected with a ValueError when the scheduler is built.
+"""
+
+from typing import Any, Callable, Dict, Optional
+
+
+# ------------ steering ------------
+
+def _exact(kwarg: str) -> Callable[[int], dict]:
+    return lambda v: {kwarg: (v, v)}
+
+
+def _at_least(v: int, low: int) -> None:
+    if v < low:
+        raise ValueError(f"n_objects={v} is unreachable, this rule draws at least {low}")
+
+
+def _two_groups_majority(v: int) -> dict:
+    # n = n1 + n2 with n1 in block_num and n2 in [block_num[0] - 1, n1 - 1], n2 = 1 if n1 = 1 (see arithmetic.py)
+    _at_least(v, 2)
+    m = (v + 1) // 2
+    return {"block_num": (m, m)} if v % 2 else {"block_num": (m, m + 1)}
+
+
+def _two_groups_free(v: int) -> dict:
+    # n = n1 + n2 with both drawn from block_num (see color.inversion_recolor), so at least two objects
+    _at_least(v, 2)
+    return {"block_num": (max(1, v // 2), max(1, v - v // 2))}
+
+
+N_OBJECTS_STEERING: Dict[str, Callable[[int], dict]] = {
+    "expansion.star_step": _exact("star_num"),
+    "expansion.star_full": _exact("star_num"),
+    "expansion.plus_step": _exact("plus_num"),
+    "expansion.plus_full": _exact("plus_num"),
+    "expansion.3diagonal_full": _exact("star_num"),
+    "arithmetic.majority_recolor": _two_groups_majority,
+    "arithmetic.minority_recolor": _two_groups_majority,
+    "color.inversion_recolor": _two_groups_free,
+    "color.odd_recolor": _exact("block_num"),
+    "color.cross_plus_recolor": _exact("stamp_num"),
+    "attraction.gravity_dots": _exact("n_objects"),
+}
+
+STEERING: Dict[str, Dict[str, Callable[[Any], dict]]] = {
+    "n_objects": N_OBJECTS_STEERING,
+}
+
+
+def _grid_size_steering(v) -> dict:
+    if not isinstance(v, (tuple, list)) or len(v) != 2:
+        raise ValueError(f"grid_size bins are (rows, cols) pairs, got {v!r}")
+    return {"grid_size": tuple(v)}
+
+
+def steer(key: str, rule: str, value) -> dict:
+    """
+    Generator kwargs that aim at `value` of `key` for `rule`; {} if the rule cannot be steered, ValueError if the
+    rule can never produce `value`.
+    """
+    if key == "grid_size":
+        return _grid_size_steering(value)
+    fn = STEERING.get(key, {}).get(rule)
+    return fn(value) if fn else {}
+
+
+# ------------ binning ------------
+
+def _hashable(v):
+    return tuple(v) if isinstance(v, list) else v
+
+
+def bin_value(rec: dict, key):
+    """Bin of a record: `key(rec)` for callables, else looked up in params, then in difficulty."""
+    if callable(key):
+        return _hashable(key(rec))
+    params = rec.get("params") or {}
+    if key in params:
+        return _hashable(params[key])
+    return _hashable((rec.get("difficulty") or {}).get(key))
+
+
+# ------------ scheduler ------------
+
+class QuotaScheduler:
+    """
+    quotas: {rule: {bin_value: target_count}}
+    key:    params/difficulty name or callable(record) -> bin value
+    """
+
+    def __init__(self, quotas: Dict[str, Dict[Any, int]], key="n_objects", max_misses: int = 200):
+        self.key = key
+        self.max_misses = max_misses
+        self.targets = {rule: {_hashable(b): n for b, n in bins.items()} for rule, bins in quotas.items()}
+        self.counts = {rule: {b: 0 for b in bins} for rule, bins in self.targets.items()}
+        self.misses = {rule: {b: 0 for b in bins} for rule, bins in self.targets.items()}
+        if isinstance(key, str):
+            for rule, bins in self.targets.items():
+                for b in bins:
+                    try:
+                        steer(key, rule, b)
+                    except ValueError as e:
+                        raise ValueError(f"{rule}: {e}") from None
+
+    def load_records(self, rule: str, records: list[dict]) -> None:
+        """Count already finished stimuli (e.g. from a previous, interrupted build)."""
+        for rec in records:
+            b = bin_value(rec, self.key)
+            if b in self.counts.get(rule, {}):
+                self.counts[rule][b] += 1
+
+    def remaining(self, rule: str) -> Dict[Any, int]:
+        return {
+            b: target - self.counts[rule][b]
+            for b, target in self.targets.get(rule, {}).items()
+            if target > self.counts[rule][b] and self.misses[rule][b] < self.max_misses
+        }
+
+    def done(self, rule: Optional[str] = None) -> bool:
+        rules = [rule] if rule else list(self.targets)
+        return all(not self.remaining(r) for r in rules)
+
+    def next_kwargs(self, rule: str) -> tuple[Any, dict]:
+        """The most under-filled bin and the kwargs steering towards it."""
+        remaining = self.remaining(rule)
+        target = max(remaining, key=remaining.get)
+        kwargs = steer(self.key, rule, target) if isinstance(self.key, str) else {}
+        return target, kwargs
+
+    def accept(self, rule: str, rec: dict) -> bool:
+        """Keep `rec` if its bin still has room."""
+        b = bin_value(rec, self.key)
+        if b in self.remaining(rule):
+            self.counts[rule][b] += 1
+            self.misses[rule][b] = 0
+            return True
+        return False
+
+    def miss(self, rule: str, target) -> None:
+        """An attempt aimed at `target` produced nothing usable."""
+        self.misses[rule][target] += 1
+
+    def unfilled(self) -> Dict[str, Dict[Any, int]]:
+        """Bins given up after `max_misses` consecutive misses, with their missing counts."""
+        return {
+            rule: {b: self.targets[rule][b] - n for b, n in counts.items() if n < self.targets[rule][b]}
+            for rule, counts in self.counts.items()
+            if any(n < self.targets[rule][b] for b, n in counts.items())
+        }
@@ -0,0 +1,111 @@
+"""
+Fast single-stimulus regeneration: rebuild one pair from its record (seed, gen_kwargs, params["augment"]) and
+optionally render it.
+
+    python -m src.regenerate out attraction.gravity.t3 --png combined.png
+    python -m src.regenerate --rule attraction.gravity --seed 123456 --png input.png --kind input
+    python -m src.regenerate out color.odd_recolor.t1            # JSON of the grids (color names) on stdout
+
+Only the registry, the rule's module and src.grid are imported; numpy and matplotlib follow for rendering,
+derived (augmented) records and the rules built on src.transforms. The record is found by scanning one
+manifest (or the shard index) for its id, without parsing the other lines.
+"""
+
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+
+def regenerate(rule: str, records: List[dict]):
+    """Yield (record, (inp, out, params) | None, error) for every record, rebuilt from its seed and gen_kwargs."""
+    from src.registry import REGISTRY
+
+    gen = REGISTRY.get(rule).generator
+    for rec in records:
+        random.seed(rec["seed"])
+        try:
+            produced = gen(**(rec.get("gen_kwargs") or {}))
+        except Exception as e:
+            yield rec, None, f"generator raised {type(e).__name__}: {e}"
+            continue
+        if len(produced) < 3:
+            yield rec, None, f"generator returned {len(produced)} values instead of 3"
+            continue
+        if (rec.get("params") or {}).get("augment"):
+            from src.augment import reapply
+
+            produced = reapply(rec["params"], produced)
+        yield rec, produced, None
+
+
+def regenerate_one(rec: dict):
+    """(inp, out, params) of one record; ValueError if the generator fails."""
+    _, produced, error = next(regenerate(rec["rule"], [rec]))
+    if error:
+        raise ValueError(f"{rec.get('id')}: {error}")
+    return produced
+
+
+def _scan(path: Path, stim_id: str) -> Optional[dict]:
+    if not path.exists():
+        return None
+    needle = json.dumps(stim_id)
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if needle in line:
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if rec.get("id") == stim_id:
+                    return rec
+    return None
+
+
+def find_record(out_root, stim_id: str) -> Optional[dict]:
+    """The record of `stim_id` (ids are "<rule>.t<idx>") from its rule manifest or the shard index."""
+    from src.shards import INDEX_NAME, SHARD_DIR
+
+    out_root = Path(out_root)
+    rule = stim_id.rsplit(".t", 1)[0]
+    return _scan(out_root / rule / "stimuli.jsonl", stim_id) or _scan(out_root / SHARD_DIR / INDEX_NAME, stim_id)
+
+
+def render(inp, out, path, kind: str = "combined") -> None:
+    from src.visualize import save_combined_grids, save_grid
+
+    if kind == "combined":
+        save_combined_grids(inp, out, path)
+    else:
+        save_grid(inp if kind == "input" else out, path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Regenerate one stimulus from its seed.")
+    parser.add_argument("out_root", nargs="?", help="build directory holding the record")
+    parser.add_argument("id", nargs="?", help="stimulus id, e.g. attraction.gravity.t3")
+    parser.add_argument("--rule", help="with --seed: regenerate without a record (default generator kwargs)")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--png", metavar="PATH", help="render to PATH instead of printing the grids")
+    parser.add_argument("--kind", choices=("combined", "input", "output"), default="combined")
+    args = parser.parse_args()
+
+    if args.rule is not None and args.seed is not None:
+        record = {"id": None, "rule": args.rule, "seed": args.seed}
+    elif args.out_root and args.id:
+        record = find_record(args.out_root, args.id)
+        if record is None:
+            parser.error(f"no record {args.id!r} in {args.out_root}")
+    else:
+        parser.error("give OUT_ROOT ID, or --rule and --seed")
+
+    inp, out, params = regenerate_one(record)
+    if args.png:
+        render(inp, out, args.png, args.kind)
+    else:
+        json.dump({"id": record["id"], "rule": record["rule"], "seed": record["seed"], "params": params,
+                   "input": inp.as_list(), "output": out.as_list()}, sys.stdout, default=list)
+        print()
@@ -0,0 +1,157 @@
+"""
+Rule registry.
+
+Every rule is declared by a RuleSpec: name, family, parameter schema and the generator as an import path
+("module:function"). The generator module is only imported when the rule is actually used, so selecting one rule
+does not import all of src/rules/*.
+
+Third-party rule packs register through the "arc_task_creator.rules" entry point group. An entry point may
+resolve to a RuleSpec, an iterable of RuleSpecs, or a callable returning either:
+
+    [project.entry-points."arc_task_creator.rules"]
+    my_pack = "my_pack.rules:RULES"
+"""
+
+import fnmatch
+import importlib
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+
+ENTRY_POINT_GROUP = "arc_task_creator.rules"
+
+# parameter types of the schemas
+PAIR = "pair"  # two ints, e.g. grid_size=(12, 12) or a (min, max) range
+COLORS = "colors"  # tuple of color names
+
+
+@dataclass(frozen=True)
+class RuleSpec:
+    name: str  # e.g. "color.cross_plus_recolor"
+    target: str  # "module:function" of the generator
+    params: Dict[str, str] = field(default_factory=dict)  # kwarg -> parameter type
+    family: Optional[str] = None  # defaults to the name's prefix
+
+    @property
+    def family_name(self) -> str:
+        return self.family or self.name.split(".", 1)[0]
+
+    @property
+    def generator(self) -> Callable:
+        return _load(self.target)
+
+    def check_kwargs(self, kwargs: dict) -> None:
+        unknown = set(kwargs) - set(self.params)
+        if unknown:
+            raise ValueError(f"{self.name}: unknown parameter(s) {sorted(unknown)}; known: {sorted(self.params)}")
+
+
+_loaded: Dict[str, Callable] = {}
+
+
+def _load(target: str) -> Callable:
+    if target not in _loaded:
+        module, _, attr = target.partition(":")
+        _loaded[target] = getattr(importlib.import_module(module), attr)
+    return _loaded[target]
+
+
+def parse_param(kind: str, text: str):
+    """CLI text -> value: "32,32" for pairs, "red,blue" for colors."""
+    parts = [p.strip() for p in text.split(",") if p.strip()]
+    if kind == PAIR:
+        if len(parts) == 1:
+            parts = parts * 2
+        if len(parts) != 2:
+            raise ValueError(f"Expected two integers, got {text!r}")
+        return tuple(int(p) for p in parts)
+    if kind == COLORS:
+        return tuple(parts)
+    raise ValueError(f"Unknown parameter type: {kind}")
+
+
+def _rule(name: str, target: str, count_kwarg: Optional[str] = None, **extra) -> RuleSpec:
+    params = {"grid_size": PAIR, "colors": COLORS, **extra}
+    if count_kwarg:
+        params[count_kwarg] = PAIR
+    return RuleSpec(name=name, target=target, params=params)
+
+
+BUILTIN_RULES: List[RuleSpec] = [
+    _rule("occlusion_reversal", "src.rules.occlusion:generate_occlusion_reversal", size_range=PAIR),
+    _rule("mirror_rotate.occlusion_mirror_x", "src.rules.mirror_rotate:generate_occlusion_mirror_x", size_range=PAIR),
+    _rule("mirror_rotate.occlusion_mirror_y", "src.rules.mirror_rotate:generate_occlusion_mirror_y", size_range=PAIR),
+    _rule("mirror_rotate.occlusion_rotate_90", "src.rules.mirror_rotate:generate_occlusion_rotate_90", size_range=PAIR),
+    _rule("mirror_rotate.occlusion_rotate_180", "src.rules.mirror_rotate:generate_occlusion_rotate_180", size_range=PAIR),
+    _rule("attraction.color", "src.rules.attraction:generate_color_attraction", size_range=PAIR),
+    _rule("attraction.size", "src.rules.attraction:generate_size_attraction", size_range=PAIR),
+    _rule("attraction.gravity", "src.rules.attraction:generate_gravity", size_range=PAIR),
+    _rule("attraction.float", "src.rules.attraction:generate_float", size_range=PAIR),
+    _rule("attraction.repulsion_gun", "src.rules.attraction:generate_repulsion_gun", size_range=PAIR),
+    _rule("attraction.repulsion_ambiguous", "src.rules.attraction:generate_repulsion_ambiguous", size_range=PAIR),
+    _rule("expansion.star_step", "src.rules.expansion:generate_star_expansion_single_step", "star_num"),
+    _rule("expansion.star_full", "src.rules.expansion:generate_star_expansion_full", "star_num"),
+    _rule("expansion.plus_step", "src.rules.expansion:generate_plus_expansion_single_step", "plus_num"),
+    _rule("expansion.plus_full", "src.rules.expansion:generate_plus_expansion_full", "plus_num"),
+    _rule("expansion.3diagonal_full", "src.rules.expansion:generate_3diagonal_expansion_full", "star_num"),
+    _rule("arithmetic.majority_recolor", "src.rules.arithmetic:generate_majority_recolor", "block_num"),
+    _rule("arithmetic.minority_recolor", "src.rules.arithmetic:generate_minority_recolor", "block_num"),
+    _rule("color.inversion_recolor", "src.rules.color:generate_inversion_recolor", "block_num"),
+    _rule("color.odd_recolor", "src.rules.color:generate_odd_color_recolor", "block_num"),
+    _rule("color.cross_plus_recolor", "src.rules.color:generate_cross_plus_recolor", "stamp_num"),
+    _rule("attraction.gravity_dots", "src.rules.attraction:generate_dots_gravity", "n_objects"),
+]
+
+
+class Registry:
+    def __init__(self, specs: Iterable[RuleSpec] = ()):
+        self._specs: Dict[str, RuleSpec] = {}
+        self._plugins_loaded = False
+        for spec in specs:
+            self.register(spec)
+
+    def register(self, spec: RuleSpec) -> None:
+        if spec.name in self._specs and self._specs[spec.name] != spec:
+            raise ValueError(f"Rule {spec.name!r} is already registered")
+        self._specs[spec.name] = spec
+
+    def load_plugins(self) -> None:
+        """Register rule packs from installed entry points (once)."""
+        if self._plugins_loaded:
+            return
+        self._plugins_loaded = True
+        from importlib.metadata import entry_points
+
+        for ep in entry_points(group=ENTRY_POINT_GROUP):
+            obj = ep.load()
+            if callable(obj) and not isinstance(obj, RuleSpec):
+                obj = obj()
+            for spec in [obj] if isinstance(obj, RuleSpec) else obj:
+                self.register(spec)
+
+    def get(self, name: str) -> RuleSpec:
+        if name not in self._specs:
+            self.load_plugins()
+        try:
+            return self._specs[name]
+        except KeyError:
+            raise KeyError(f"Unknown rule: {name}") from None
+
+    def specs(self) -> List[RuleSpec]:
+        self.load_plugins()
+        return list(self._specs.values())
+
+    def names(self) -> List[str]:
+        return [spec.name for spec in self.specs()]
+
+    def select(self, patterns: Iterable[str] = ("*",)) -> List[RuleSpec]:
+        """Rules whose name or family matches any glob pattern, in registration order."""
+        patterns = list(patterns)
+        if all(p in self._specs for p in patterns):  # exact names: no plugin discovery needed
+            return [self._specs[p] for p in patterns]
+        return [
+            spec for spec in self.specs()
+            if any(fnmatch.fnmatchcase(spec.name, p) or fnmatch.fnmatchcase(spec.family_name, p) for p in patterns)
+        ]
+
+
+REGISTRY = Registry(BUILTIN_RULES)
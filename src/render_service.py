@@ -0,0 +1,98 @@
+"""
+PNG rendering in a pool of worker processes.
+
+    with RenderService(workers=8) as service:
+        future = service.submit("combined", inp_arr, out_arr)     # palette-index arrays in, PNG bytes out
+        pngs = service.map([("grid", arr) for arr in arrays])
+
+Kinds: "grid" (as save_grid) and "combined" (as save_combined_grids); the bytes are identical to theirs.
+Each worker runs Agg and keeps one figure per kind and grid shape (src.visualize.grid_figure / combined_figure):
+a render only swaps the image data (`set_data`) and saves, the axes, gridlines and arrow are built once. Workers
+are processes because pyplot-era matplotlib state is not thread-safe; a figure is never shared between them.
+
+render_png does the same in the calling process; main uses it when no service is running.
+"""
+
+import io
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import numpy as np
+
+from src.grid import PALETTE
+
+KINDS = {"grid": 1, "combined": 2}  # kind -> number of grids
+MAX_FIGURES = 32  # figures kept per process, oldest shape dropped first
+
+_FIGURES = {}  # (kind, shapes) -> (figure, images), per process
+_LUTS = {}  # palette -> (n, 3) RGB lookup table
+
+
+def _figure(kind: str, shapes: tuple):
+    key = (kind, shapes)
+    if key not in _FIGURES:
+        from src import visualize
+
+        if len(_FIGURES) >= MAX_FIGURES:
+            del _FIGURES[next(iter(_FIGURES))]
+        _FIGURES[key] = visualize.grid_figure(*shapes[0]) if kind == "grid" else visualize.combined_figure(*shapes)
+    return _FIGURES[key]
+
+
+def _rgb(arr: np.ndarray, palette: tuple) -> np.ndarray:
+    if palette not in _LUTS:
+        import matplotlib.colors as mcolors
+
+        _LUTS[palette] = np.array([mcolors.to_rgb(color) for color in palette])
+    return _LUTS[palette][arr]
+
+
+def render_png(kind: str, *arrays, palette=None) -> bytes:
+    """PNG of one or two palette-index arrays; `palette` defaults to this process' PALETTE."""
+    from src.visualize import save_figure
+
+    if KINDS.get(kind) != len(arrays):
+        raise ValueError(f"Render kind {kind!r} needs {KINDS.get(kind, '?')} arrays, got {len(arrays)}")
+    palette = tuple(palette or PALETTE)
+    fig, images = _figure(kind, tuple(arr.shape for arr in arrays))
+    for im, arr in zip(images, arrays):
+        im.set_data(_rgb(arr, palette))
+    buf = io.BytesIO()
+    save_figure(fig, buf)
+    return buf.getvalue()
+
+
+def _init_worker():
+    import matplotlib
+
+    matplotlib.use("Agg")
+    from src import visualize  # noqa: F401  (import and font setup once per worker)
+
+
+def _render_job(job) -> bytes:
+    (kind, *arrays), palette = job
+    return render_png(kind, *arrays, palette=palette)
+
+
+class RenderService:
+    def __init__(self, workers: int | None = None):
+        self.workers = workers or os.cpu_count() or 1
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+
+    def submit(self, kind: str, *arrays) -> Future:
+        """Future of the PNG bytes. PALETTE is sent along, so colors added since start-up render correctly."""
+        return self._pool.submit(render_png, kind, *arrays, palette=tuple(PALETTE))
+
+    def map(self, jobs, chunksize: int = 16) -> list:
+        """PNG bytes of every (kind, *arrays) job, in order."""
+        palette = tuple(PALETTE)
+        return list(self._pool.map(_render_job, [(job, palette) for job in jobs], chunksize=chunksize))
+
+    def close(self) -> None:
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
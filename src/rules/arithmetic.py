@@ -1,11 +1,11 @@
 import random
 from src.util import rand_between
-from src.grid import Grid
+from src.grid import SparseGrid
 
 
 def generate_majority_recolor(grid_size=(12, 12), block_num=(2, 6), colors=("red", "blue")):
     rows, cols = grid_size
-    grid_input, grid_output = Grid(rows, cols), Grid(rows, cols)
+    grid_input, grid_output = SparseGrid(rows, cols), SparseGrid(rows, cols)
 
     n1 = rand_between(*block_num)
     n2 = rand_between(block_num[0] - 1, n1 - 1) if n1 > 1 else 1
@@ -35,7 +35,7 @@ def generate_majority_recolor(grid_size=(12, 12), block_num=(2, 6), colors=("red
 
 def generate_minority_recolor(grid_size=(12, 12), block_num=(2, 6), colors=("red", "blue")):
     rows, cols = grid_size
-    grid_input, grid_output = Grid(rows, cols), Grid(rows, cols)
+    grid_input, grid_output = SparseGrid(rows, cols), SparseGrid(rows, cols)
 
     n1 = rand_between(*block_num)
     n2 = rand_between(block_num[0] - 1, n1 - 1) if n1 > 1 else 1
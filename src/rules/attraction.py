@@ -1,6 +1,6 @@
 import random
 
-from src.grid import Grid
+from src.grid import Grid, SparseGrid
 from src.util import rand_between
 
 
@@ -186,7 +186,7 @@ def generate_dots_gravity(
         colors=("red", "blue"),
 ):
     rows, cols = grid_size
-    grid_input = Grid(rows, cols)
+    grid_input = SparseGrid(rows, cols)
 
     n = rand_between(*n_objects)
     positions = random.sample([(r, c) for r in range(rows) for c in range(cols)], n)
@@ -201,8 +201,17 @@ def generate_dots_gravity(
 
 
 def apply_gravity(grid: Grid) -> Grid:
+    """Output of the same type as `grid` (a SparseGrid only visits its colored cells)."""
     rows, cols = grid.rows, grid.cols
-    out = Grid(rows, cols)
+    out = type(grid)(rows, cols)
+
+    if isinstance(grid, SparseGrid):
+        height = {}
+        for (r, c), color in sorted(grid.cells.items(), key=lambda cell: (cell[0][1], cell[0][0])):
+            if color != "black":
+                out.fill_cell(height.get(c, 0), c, color)
+                height[c] = height.get(c, 0) + 1
+        return out
 
     for c in range(cols):
         col = [grid.get(r, c) for r in range(rows) if grid.get(r, c) != "black"]
@@ -1,12 +1,13 @@
 import random
 from typing import Dict, Tuple, Any, List
-from src.grid import Grid
+from src.bitboard import stamp_bits
+from src.grid import Grid, SparseGrid
 from src.util import rand_between
 
 
 def generate_inversion_recolor(grid_size=(12, 12), block_num=(1, 6), colors=("red", "blue")):
     rows, cols = grid_size
-    grid_input, grid_output = Grid(rows, cols), Grid(rows, cols)
+    grid_input, grid_output = SparseGrid(rows, cols), SparseGrid(rows, cols)
 
     n1 = rand_between(*block_num)
     n2 = rand_between(*block_num)
@@ -87,16 +88,17 @@ def generate_cross_plus_recolor(grid_size=(12, 12), stamp_num=(2, 6), colors=("g
     candidates = [(r, c) for r in range(rows - 2) for c in range(cols - 2)]
     random.shuffle(candidates)
 
-    used = set()
+    stamps = {shape: stamp_bits(offsets, cols) for shape, offsets in OFFSETS.items()}
+    used = 0  # bit plane of the occupied cells, see src.bitboard
     placed: List[Tuple[str, List[Tuple[int, int]]]] = []
 
     for top_r, top_c in candidates:
         shape = random.choice(("cross", "plus"))
-        cells = [(top_r + dr, top_c + dc) for dr, dc in OFFSETS[shape]]
-        if any(cell in used for cell in cells):
+        stamp = stamps[shape] << (top_r * cols + top_c)
+        if used & stamp:
             continue
-        used.update(cells)
-        placed.append((shape, cells))
+        used |= stamp
+        placed.append((shape, [(top_r + dr, top_c + dc) for dr, dc in OFFSETS[shape]]))
         if len(placed) == k:
             break
 
@@ -1,69 +1,89 @@
-from src.rules.occlusion import generate_occlusion_reversal
+from src.rules.occlusion import draw_blocks, occlusion_blocks
 
+# Every rule of this module (and occlusion_reversal) shares one kind of input: two overlapping blocks. The
+# outputs are derived from the block coordinates instead of copying and transforming the input grid, so one
+# OcclusionSet yields all of them; the generators below draw the same random numbers as
+# generate_occlusion_reversal, hence one seed gives the same input for every rule (see main.ensure_matched_sets).
 
-def generate_occlusion_mirror_x(grid_size=(12, 12), size_range=(2, 5), colors=("red", "blue")):
-    grid_input, _, _ = generate_occlusion_reversal(
-        grid_size=grid_size, size_range=size_range, colors=colors
-    )
+OUTPUTS = ("reversal", "mirror_x", "mirror_y", "rotate_90", "rotate_180")
 
-    # TODO: abstract out the grid_input creation to reduce code redundancy
 
-    grid_output = grid_input.copy()
-    grid_output.mirror_x()
+def _clip(block, rows, cols):
+    return {**block, "xmin": max(block["xmin"], 0), "xmax": min(block["xmax"], cols - 1),
+            "ymin": max(block["ymin"], 0), "ymax": min(block["ymax"], rows - 1)}
 
-    params = {
-        "grid_size": grid_size,
-        "colors": colors,
-        "n_objects": 2
-    }
 
-    return grid_input, grid_output, params
+def _mirror_x(block, rows, cols):
+    return {**block, "ymin": rows - 1 - block["ymax"], "ymax": rows - 1 - block["ymin"]}
 
 
-def generate_occlusion_mirror_y(grid_size=(12, 12), size_range=(2, 5), colors=("red", "blue")):
-    grid_input, _, _ = generate_occlusion_reversal(
-        grid_size=grid_size, size_range=size_range, colors=colors
-    )
-    grid_output = grid_input.copy()
-    grid_output.mirror_y()
+def _mirror_y(block, rows, cols):
+    return {**block, "xmin": cols - 1 - block["xmax"], "xmax": cols - 1 - block["xmin"]}
 
-    params = {
-        "grid_size": grid_size,
-        "colors": colors,
-        "n_objects": 2
-    }
 
-    return grid_input, grid_output, params
+def _rotate_90(block, rows, cols):
+    """Counterclockwise like Grid.rotate_left_90: cell (r, c) moves to (cols - 1 - c, r)."""
+    return {**block, "xmin": block["ymin"], "xmax": block["ymax"],
+            "ymin": cols - 1 - block["xmax"], "ymax": cols - 1 - block["xmin"]}
 
 
-def generate_occlusion_rotate_90(grid_size=(12, 12), size_range=(2, 5), colors=("red", "blue")):
-    grid_input, _, _ = generate_occlusion_reversal(
-        grid_size=grid_size, size_range=size_range, colors=colors
-    )
-    grid_output = grid_input.copy()
-    grid_output.rotate_left_90()
+def _rotate_180(block, rows, cols):
+    return _mirror_y(_mirror_x(block, rows, cols), rows, cols)
+
+
+_TRANSFORMS = {"mirror_x": _mirror_x, "mirror_y": _mirror_y, "rotate_90": _rotate_90, "rotate_180": _rotate_180}
+
+
+class OcclusionSet:
+    """One random occlusion input and the outputs of OUTPUTS derived from it, each drawn on first access."""
+
+    def __init__(self, grid_size=(12, 12), size_range=(2, 5), colors=("red", "blue")):
+        self.grid_size = tuple(grid_size)
+        self.colors = colors
+        rows, cols = self.grid_size
+        self.blocks = tuple(_clip(b, rows, cols) for b in occlusion_blocks(grid_size, size_range, colors))
+        self._grids = {}
+
+    @property
+    def input(self):
+        if "input" not in self._grids:
+            self._grids["input"] = draw_blocks(self.grid_size, self.blocks)
+        return self._grids["input"]
 
-    params = {
-        "grid_size": grid_size,
-        "colors": colors,
-        "n_objects": 2
-    }
+    def output(self, name):
+        if name not in self._grids:
+            if name not in OUTPUTS:
+                raise ValueError(f"Unknown output {name!r}, expected one of {OUTPUTS}")
+            rows, cols = self.grid_size
+            if name == "reversal":
+                self._grids[name] = draw_blocks(self.grid_size, self.blocks[::-1])
+            else:
+                size = (cols, rows) if name == "rotate_90" else self.grid_size
+                blocks = [_TRANSFORMS[name](b, rows, cols) for b in self.blocks]
+                self._grids[name] = draw_blocks(size, blocks)
+        return self._grids[name]
 
-    return grid_input, grid_output, params
+    def pair(self, name):
+        """(input, output, params) like a generator; every pair gets its own (copy-on-write) copy of the input."""
+        params = {
+            "grid_size": self.grid_size,
+            "colors": self.colors,
+            "n_objects": 2
+        }
+        return self.input.copy(), self.output(name).copy(), params
+
+
+def generate_occlusion_mirror_x(grid_size=(12, 12), size_range=(2, 5), colors=("red", "blue")):
+    return OcclusionSet(grid_size, size_range, colors).pair("mirror_x")
+
+
+def generate_occlusion_mirror_y(grid_size=(12, 12), size_range=(2, 5), colors=("red", "blue")):
+    return OcclusionSet(grid_size, size_range, colors).pair("mirror_y")
+
+
+def generate_occlusion_rotate_90(grid_size=(12, 12), size_range=(2, 5), colors=("red", "blue")):
+    return OcclusionSet(grid_size, size_range, colors).pair("rotate_90")
 
 
 def generate_occlusion_rotate_180(grid_size=(12, 12), size_range=(2, 5), colors=("red", "blue")):
-    grid_input, _, _ = generate_occlusion_reversal(
-        grid_size=grid_size, size_range=size_range, colors=colors
-    )
-    grid_output = grid_input.copy()
-    grid_output.rotate_left_90()
-    grid_output.rotate_left_90()
-
-    params = {
-        "grid_size": grid_size,
-        "colors": colors,
-        "n_objects": 2
-    }
-
-    return grid_input, grid_output, params
+    return OcclusionSet(grid_size, size_range, colors).pair("rotate_180")
@@ -2,11 +2,9 @@ import random
 from src.grid import Grid
 
 
-def generate_occlusion_reversal(grid_size=(12, 12), size_range=(2, 5), colors=("red", "blue")):
+def occlusion_blocks(grid_size=(12, 12), size_range=(2, 5), colors=("red", "blue")):
+    """Random back and front block (fill_rect kwargs); a corner of the front block lies inside the back one."""
     rows, cols = grid_size
-    grid_input = Grid(rows, cols)
-    grid_output = Grid(rows, cols)
-
     w, h = random.randint(*size_range), random.randint(*size_range)
 
     # TODO: update the block location generation logic. Use always top-left corner, calculate valid window from
@@ -41,13 +39,25 @@ def generate_occlusion_reversal(grid_size=(12, 12), size_range=(2, 5), colors=("
     else:
         front_block = {"xmin": x2 - w, "ymin": y2, "xmax": x2, "ymax": y2 + h, "color": colors[1]}
 
+    return back_block, front_block
+
+
+def draw_blocks(grid_size, blocks):
+    """Fresh grid with `blocks` painted in order (later ones on top)."""
+    grid = Grid(*grid_size)
+    for block in blocks:
+        grid.fill_rect(**block)
+    return grid
+
+
+def generate_occlusion_reversal(grid_size=(12, 12), size_range=(2, 5), colors=("red", "blue")):
+    back_block, front_block = occlusion_blocks(grid_size, size_range, colors)
+
     # Input: back first, front second
-    grid_input.fill_rect(**back_block)
-    grid_input.fill_rect(**front_block)
+    grid_input = draw_blocks(grid_size, (back_block, front_block))
 
     # Output: front first, back second (reversed)
-    grid_output.fill_rect(**front_block)
-    grid_output.fill_rect(**back_block)
+    grid_output = draw_blocks(grid_size, (front_block, back_block))
 
     params = {
         "grid_size": grid_size,
@@ -0,0 +1,278 @@
+"""
+Sharded tar output (WebDataset-style) for large builds.
+
+Layout under `<out_root>/shards/`:
+
+  shard-000000.tar     members grouped by stimulus key: <id>.input.png, <id>.output.png, <id>.combined.png,
+                       <id>.input.npy, <id>.output.npy, <id>.delta.bin (depending on payload) and the <id>.json record
+  index.jsonl          one line per stimulus: its record plus "shard" and "members"
+                       (member name -> {"offset", "size", "sha256"}) for random access without tar parsing
+
+Index lines are only written once their shard is closed, so a killed build leaves at most one unindexed shard,
+which the next writer removes. A resumed build appends to the last indexed shard while it has room, after cutting
+it back to its last indexed member (a build killed while appending leaves an unindexed tail there), so repeated
+interruptions do not leave a trail of small shards. Rules are mixed within shards.
+"""
+
+import io
+import json
+import os
+import tarfile
+from pathlib import Path
+from typing import Iterator
+
+from src.manifest import sha256_bytes
+
+SHARD_DIR = "shards"
+INDEX_NAME = "index.jsonl"
+
+
+def shard_root(out_root) -> Path:
+    root = Path(out_root)
+    return root if (root / INDEX_NAME).exists() or root.name == SHARD_DIR else root / SHARD_DIR
+
+
+def npy_bytes(arr) -> bytes:
+    import numpy as np
+    buf = io.BytesIO()
+    np.save(buf, arr, allow_pickle=False)
+    return buf.getvalue()
+
+
+# ------------ writing ------------
+
+class ShardWriter:
+    def __init__(
+            self,
+            out_root,
+            shard_size: int = 1000,
+            payload=("png",),
+            verify_checksums: bool = False,
+            catalog=None,
+    ):
+        self.root = shard_root(out_root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.shard_size = shard_size
+        self.payload = tuple(payload)
+        self.index_path = self.root / INDEX_NAME
+        self.catalog = catalog
+
+        self._by_rule: dict[str, list[dict]] = {}
+        indexed = read_index(self.root)
+        if verify_checksums:
+            ok = [rec for rec in indexed if _entry_ok(self.root, rec)]
+            if len(ok) != len(indexed):
+                _rewrite_index(self.index_path, ok)
+            indexed = ok
+        for rec in indexed:
+            self._by_rule.setdefault(rec["rule"], []).append(rec)
+
+        # shards without index lines are leftovers of an interrupted build
+        listed = {rec["shard"] for rec in indexed}
+        for path in self.root.glob("shard-*.tar*"):
+            if path.name not in listed:
+                path.unlink()
+        self._next_shard = max((int(name[6:12]) for name in listed), default=-1) + 1
+
+        self._tar = None
+        self._tar_path = None
+        self._tar_file = None  # our own handle of a reopened shard (tarfile leaves it open)
+        self._pending: list[dict] = []
+        self._earlier = 0  # entries of an earlier build in the open shard
+
+        # the last shard is reopened on the first write if it has room
+        self._resume = None
+        if listed:
+            last = max(listed)
+            ids = {rec["id"] for rec in indexed if rec["shard"] == last}
+            if len(ids) < shard_size and (self.root / last).exists():
+                self._resume = (self.root / last, ids)
+
+    def existing(self, rule: str) -> list[dict]:
+        records = list(self._by_rule.get(rule, []))
+        if self.catalog is not None:
+            self.catalog.replace_rule(rule, records, sharded=True)
+        return records
+
+    def write(self, rec: dict, blobs: dict) -> dict:
+        """
+        `blobs`: member suffix (e.g. "input.png") -> bytes; the JSON sidecar is added here.
+        Returns the index entry.
+        """
+        if self._tar is None:
+            self._open_shard()
+
+        key = rec["id"]
+        members = {}
+        for suffix, data in blobs.items():
+            members[suffix] = self._add(f"{key}.{suffix}", data)
+        self._add(f"{key}.json", json.dumps(rec, ensure_ascii=False).encode("utf-8"))
+
+        entry = {**rec, "shard": self._tar_path.name, "members": members}
+        self._pending.append(entry)
+        self._by_rule.setdefault(rec["rule"], []).append(entry)
+        if self._earlier + len(self._pending) >= self.shard_size:
+            self._close_shard()
+        return entry
+
+    def close(self) -> None:
+        if self._tar is not None:
+            self._close_shard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _open_shard(self):
+        resume, self._resume = self._resume, None
+        if resume is not None:
+            path, ids = resume
+            end = _indexed_end(path, ids)
+            if end:
+                # "w" on the cut-back file continues at its end (tarfile's "a" mode needs an end-of-archive marker)
+                self._tar_file = path.open("r+b")
+                self._tar_file.truncate(end)
+                self._tar_file.seek(end)
+                self._tar_path, self._earlier = path, len(ids)
+                self._tar = tarfile.open(fileobj=self._tar_file, mode="w", format=tarfile.PAX_FORMAT)
+                return
+        self._earlier = 0
+        self._tar_path = self.root / f"shard-{self._next_shard:06d}.tar"
+        self._next_shard += 1
+        self._tar = tarfile.open(self._tar_path, "w", format=tarfile.PAX_FORMAT)
+
+    def _add(self, name: str, data: bytes) -> dict:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        self._tar.addfile(info, io.BytesIO(data))
+        # after addfile the tar offset sits at the end of the 512-padded data block
+        return {"offset": self._tar.offset - _padded(len(data)), "size": len(data), "sha256": sha256_bytes(data)}
+
+    def _close_shard(self):
+        self._tar.close()
+        if self._tar_file is not None:
+            self._tar_file.close()
+            self._tar_file = None
+        with self._tar_path.open("rb") as f:
+            os.fsync(f.fileno())
+        with self.index_path.open("a", encoding="utf-8") as f:
+            for entry in self._pending:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        if self.catalog is not None:
+            self.catalog.add_many(self._pending)
+        self._tar = None
+        self._pending = []
+
+
+def _padded(size: int) -> int:
+    return -(-size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+
+
+def _indexed_end(path: Path, ids: set) -> int:
+    """Byte offset right after the last member of the stimuli `ids` in shard `path`; 0 if not all are found."""
+    end, found = 0, set()
+    try:
+        with tarfile.open(path, "r:") as tar:
+            for info in tar:
+                key = _split_member(info.name)[0]
+                if key in ids:
+                    found.add(key)
+                    end = info.offset_data + _padded(info.size)
+    except (tarfile.TarError, OSError, ValueError):  # truncated tail of an interrupted append
+        pass
+    return end if found == ids else 0
+
+
+def _rewrite_index(path: Path, entries: list[dict]) -> None:
+    tmp = path.with_name(path.name + ".part")
+    with tmp.open("w", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+
+
+# ------------ reading ------------
+
+def read_index(root) -> list[dict]:
+    path = Path(root) / INDEX_NAME
+    if not path.exists():
+        return []
+    entries = []
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return entries
+
+
+def read_member(root, entry: dict, suffix: str) -> bytes:
+    m = entry["members"][suffix]
+    with (Path(root) / entry["shard"]).open("rb") as f:
+        f.seek(m["offset"])
+        return f.read(m["size"])
+
+
+def _entry_ok(root: Path, entry: dict) -> bool:
+    try:
+        return all(
+            sha256_bytes(read_member(root, entry, suffix)) == m["sha256"] for suffix, m in entry["members"].items()
+        )
+    except OSError:
+        return False
+
+
+class ShardIndex:
+    """Random access to stimuli by id through the shard index."""
+
+    def __init__(self, out_root):
+        self.root = shard_root(out_root)
+        self.entries = {entry["id"]: entry for entry in read_index(self.root)}
+
+    def records(self, rule: str | None = None) -> list[dict]:
+        return [e for e in self.entries.values() if rule is None or e["rule"] == rule]
+
+    def read(self, stim_id: str, suffix: str) -> bytes:
+        return read_member(self.root, self.entries[stim_id], suffix)
+
+    def extract(self, stim_id: str, suffix: str, dest: Path) -> Path:
+        """Write one member to `dest` (skipped if an identical file is already there)."""
+        entry = self.entries[stim_id]
+        if not (dest.exists() and dest.stat().st_size == entry["members"][suffix]["size"]):
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            dest.write_bytes(self.read(stim_id, suffix))
+        return dest
+
+
+def iter_shards(out_root) -> Iterator[dict]:
+    """
+    Stream all stimuli shard by shard in write order, without the index.
+    Yields {"__key__": id, "json": record, "<suffix>": bytes, ...}.
+    """
+    root = shard_root(out_root)
+    for path in sorted(root.glob("shard-*.tar")):
+        with tarfile.open(path, "r|") as tar:
+            sample = None
+            for info in tar:
+                key, suffix = _split_member(info.name)
+                if sample is not None and sample["__key__"] != key:
+                    yield sample
+                    sample = None
+                if sample is None:
+                    sample = {"__key__": key}
+                data = tar.extractfile(info).read()
+                sample[suffix] = json.loads(data) if suffix == "json" else data
+            if sample is not None:
+                yield sample
+
+
+def _split_member(name: str) -> tuple[str, str]:
+    """"<rule>.t<idx>.input.png" -> ("<rule>.t<idx>", "input.png")."""
+    if name.endswith(".json"):
+        return name[:-5], "json"
+    stem, kind, ext = name.rsplit(".", 2)
+    return stem, f"{kind}.{ext}"
@@ -11,7 +11,11 @@ class Stimulus:
     family: str  # e.g. "color" (inferred)
     seed: int
     params: Dict[str, Any]
-    difficulty: Optional[Dict[str, Any]] = None  # Hard counting is the only case -> can be a separate method
+    difficulty: Optional[Dict[str, Any]] = None  # structural metrics + composite score, see src.metrics
+    files: Optional[Dict[str, Dict[str, Any]]] = None  # kind -> {"path", "sha256", "bytes"}, relative to rule dir
+    fingerprint: Optional[str] = None  # canonical (input, output) hash, see src.dedup
+    gen_kwargs: Optional[Dict[str, Any]] = None  # generator overrides needed to reproduce from seed
+    grids: Optional[Dict[str, Any]] = None  # compact input/output encoding, see src.codec
 
     def to_json_dict(self) -> Dict[str, Any]:
         d = asdict(self)
@@ -0,0 +1,221 @@
+"""
+Composable grid transforms, compiled into fused array programs.
+
+    from src import transforms as T
+
+    float_rule = T.dihedral("rot180") >> T.gravity() >> T.dihedral("rot180")
+    float_rule.compile()        # (Gravity(direction=(1, 0)),): the rotations fold into the gravity direction
+    out = float_rule(grid)      # Grid -> Grid, 2-D array -> array, (B, H, W) batch -> batch
+
+Ops act on palette-index arrays (see Grid.to_array), background = 0:
+  dihedral(name)             one of DIHEDRAL (same conventions as Grid.mirror_x / mirror_y / rotate_left_90)
+  recolor({old: new})        color names, one lookup table
+  gravity(axis, toward_end)  stable compaction of the foreground of every column (axis=0) or row (axis=1)
+  move_rect(bbox, dr, dc)    move the foreground inside bbox = (xmin, xmax, ymin, ymax) by (dr, dc), clipped
+
+`a >> b` applies a, then b. compile() pushes every dihedral op to the front of its segment (moving a gravity
+past a dihedral turns its direction), so a segment costs at most one dihedral, its gravities and one LUT gather;
+successive recolors fold into one LUT and a repeated gravity collapses. move_rect depends on the grid layout
+and ends a segment, as does a recolor that touches the background.
+"""
+
+from dataclasses import dataclass
+from typing import Tuple
+
+import numpy as np
+
+from src.grid import Grid, color_index
+
+BACKGROUND = 0
+
+# name -> array op on the last two axes; _MATRICES: the same transforms acting on (d_row, d_col) displacements
+DIHEDRAL = {
+    "id": lambda a: a,
+    "rot90": lambda a: np.rot90(a, 1, axes=(-2, -1)),
+    "rot180": lambda a: a[..., ::-1, ::-1],
+    "rot270": lambda a: np.rot90(a, -1, axes=(-2, -1)),
+    "mirror_x": lambda a: a[..., ::-1, :],
+    "mirror_y": lambda a: a[..., :, ::-1],
+    "transpose": lambda a: np.swapaxes(a, -2, -1),
+    "anti_transpose": lambda a: np.swapaxes(a, -2, -1)[..., ::-1, ::-1],
+}
+_MATRICES = {
+    "id": ((1, 0), (0, 1)),
+    "rot90": ((0, -1), (1, 0)),
+    "rot180": ((-1, 0), (0, -1)),
+    "rot270": ((0, 1), (-1, 0)),
+    "mirror_x": ((-1, 0), (0, 1)),
+    "mirror_y": ((1, 0), (0, -1)),
+    "transpose": ((0, 1), (1, 0)),
+    "anti_transpose": ((0, -1), (-1, 0)),
+}
+_NAMES = {m: name for name, m in _MATRICES.items()}
+
+
+def _matmul(a, b):
+    return tuple(tuple(sum(a[i][k] * b[k][j] for k in range(2)) for j in range(2)) for i in range(2))
+
+
+def _apply_matrix(m, v):
+    return tuple(m[i][0] * v[0] + m[i][1] * v[1] for i in range(2))
+
+
+# ------------ ops ------------
+
+@dataclass(frozen=True)
+class Dihedral:
+    name: str
+
+    def run(self, a):
+        return DIHEDRAL[self.name](a)
+
+
+@dataclass(frozen=True)
+class Recolor:
+    lut: Tuple[int, ...]  # palette index -> palette index
+
+    def __repr__(self):
+        return f"Recolor({ {i: j for i, j in enumerate(self.lut) if i != j} })"
+
+    def keeps_background(self) -> bool:
+        """Background stays background and nothing becomes background (commutes with gravity)."""
+        return self.lut[BACKGROUND] == BACKGROUND and BACKGROUND not in self.lut[1:]
+
+    def run(self, a):
+        return np.asarray(self.lut, dtype=np.uint8)[a]
+
+
+@dataclass(frozen=True)
+class Gravity:
+    direction: Tuple[int, int]  # (-1, 0): toward row 0, (1, 0): toward the last row, (0, -1) / (0, 1): columns
+
+    def run(self, a):
+        axis = -2 if self.direction[0] else -1
+        toward_end = sum(self.direction) > 0
+        if toward_end:
+            a = np.flip(a, axis)
+        order = np.argsort(a == BACKGROUND, axis=axis, kind="stable")
+        a = np.take_along_axis(a, order, axis=axis)
+        return np.flip(a, axis) if toward_end else a
+
+
+@dataclass(frozen=True)
+class MoveRect:
+    bbox: Tuple[int, int, int, int]  # (xmin, xmax, ymin, ymax), inclusive
+    shift: Tuple[int, int]  # (d_row, d_col)
+
+    def run(self, a):
+        x0, x1, y0, y1 = self.bbox
+        dr, dc = self.shift
+        out = a.copy()
+        block = a[..., y0:y1 + 1, x0:x1 + 1]
+        out[..., y0:y1 + 1, x0:x1 + 1] = BACKGROUND
+        h, w = a.shape[-2:]
+        r0, c0 = y0 + dr, x0 + dc
+        rs, cs = slice(max(r0, 0), min(r0 + block.shape[-2], h)), slice(max(c0, 0), min(c0 + block.shape[-1], w))
+        src = block[..., rs.start - r0:rs.stop - r0, cs.start - c0:cs.stop - c0]
+        dst = out[..., rs, cs]
+        out[..., rs, cs] = np.where(src != BACKGROUND, src, dst)
+        return out
+
+
+# ------------ programs ------------
+
+class Program:
+    """A sequence of ops, applied left to right; compose with `>>`."""
+
+    def __init__(self, ops=()):
+        self.ops = tuple(ops)
+        self._compiled = None
+
+    def __rshift__(self, other: "Program") -> "Program":
+        return Program(self.ops + other.ops)
+
+    def __repr__(self):
+        return " >> ".join(map(repr, self.ops)) or "Program()"
+
+    def compile(self) -> tuple:
+        """The fused ops; cached."""
+        if self._compiled is None:
+            self._compiled = _fuse(self.ops)
+        return self._compiled
+
+    def run(self, a: np.ndarray) -> np.ndarray:
+        """2-D palette array or (B, H, W) batch."""
+        for op in self.compile():
+            a = op.run(a)
+        return np.ascontiguousarray(a)
+
+    def __call__(self, x):
+        if isinstance(x, Grid):
+            return Grid.from_array(self.run(x.to_array()))
+        return self.run(np.asarray(x))
+
+
+def _fuse(ops) -> tuple:
+    out = []
+    matrix, gravities, lut = _MATRICES["id"], [], None
+
+    def flush():
+        nonlocal matrix, gravities, lut
+        if matrix != _MATRICES["id"]:
+            out.append(Dihedral(_NAMES[matrix]))
+        out.extend(gravities)
+        if lut is not None and lut.lut != tuple(range(len(lut.lut))):
+            out.append(lut)
+        matrix, gravities, lut = _MATRICES["id"], [], None
+
+    for op in ops:
+        if isinstance(op, Dihedral):
+            # [.., G_d, h] == [.., h, G_hd]: h moves to the front and turns every gravity after it
+            m = _MATRICES[op.name]
+            gravities = [Gravity(_apply_matrix(m, g.direction)) for g in gravities]
+            matrix = _matmul(m, matrix)
+        elif isinstance(op, Recolor):
+            if lut is None:
+                lut = op
+            else:
+                size = max(len(lut.lut), len(op.lut))
+                first = lut.lut + tuple(range(len(lut.lut), size))
+                second = op.lut + tuple(range(len(op.lut), size))
+                lut = Recolor(tuple(second[i] for i in first))
+            if not lut.keeps_background():
+                held = lut
+                lut = None
+                flush()
+                out.append(held)
+        elif isinstance(op, Gravity):
+            if not gravities or gravities[-1] != op:
+                gravities.append(op)
+        else:
+            flush()
+            out.append(op)
+    flush()
+    return tuple(out)
+
+
+# ------------ constructors ------------
+
+def dihedral(name: str) -> Program:
+    if name not in DIHEDRAL:
+        raise ValueError(f"Unknown dihedral transform {name!r}, expected one of {list(DIHEDRAL)}")
+    return Program([Dihedral(name)])
+
+
+def recolor(mapping: dict) -> Program:
+    lut = list(range(256))
+    for old, new in mapping.items():
+        lut[color_index(old)] = color_index(new)
+    return Program([Recolor(tuple(lut))])
+
+
+def gravity(axis: int = 0, toward_end: bool = False) -> Program:
+    sign = 1 if toward_end else -1
+    return Program([Gravity((sign, 0) if axis == 0 else (0, sign))])
+
+
+def move_rect(bbox, dr: int, dc: int) -> Program:
+    return Program([MoveRect(tuple(bbox), (dr, dc))])
+
+
+IDENTITY = Program()
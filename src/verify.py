@@ -0,0 +1,490 @@
+"""
+Rule verification: re-derive the expected output of every pair from its input (and params) and compare arrays.
+
+    python -m src.verify out --workers 8 --report verify.json
+
+A dataset is checked by regenerating each record from its seed (and gen_kwargs), so nothing has to be decoded
+from PNGs. Records are verified per rule in chunks; chunks are spread over `workers` processes. Each mismatch is
+reported with the record id, seed and gen_kwargs needed to reproduce it.
+
+A verifier takes a (B, H, W) input batch, the (B, H', W') output batch and the params of each pair, and returns
+one reason string per pair (None = correct). Rules whose output is a pure function of the input are checked
+vectorized over the batch; rules with a hidden random choice (rotation of the attraction scenes, the omitted ray
+of 3diagonal, the stamp layout of cross_plus) search the choices per pair and accept any that reproduces the
+output. Ties that the generator resolves at random (e.g. 1 vs 1 blocks in minority) accept either color.
+"""
+
+import argparse
+import itertools
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from src import transforms as T
+from src.bitboard import Bitboard, lowest_cell, stamp_bits
+from src.components import BACKGROUND, components
+from src.grid import color_index
+from src.regenerate import regenerate
+
+MISMATCH = "output differs from the rule applied to the input"
+
+
+def _colors(params: list, i: int) -> np.ndarray:
+    """(B,) palette index of params["colors"][i] per pair."""
+    return np.array([color_index(p["colors"][i]) for p in params])
+
+
+def _reasons(ok: np.ndarray, reason: str = MISMATCH) -> list:
+    return [None if good else reason for good in ok.tolist()]
+
+
+def _same(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    if a.shape != b.shape:
+        return np.zeros(len(a), dtype=bool)
+    return (a == b).all(axis=(1, 2))
+
+
+def _per_pair(check: Callable) -> Callable:
+    """Batch verifier from `check(inp, out, params) -> reason | None` on single 2-D arrays."""
+    def verifier(inp, out, params):
+        return [check(a, b, p) for a, b, p in zip(inp, out, params)]
+    verifier.__name__, verifier.__doc__ = check.__name__, check.__doc__
+    return verifier
+
+
+def _bbox(mask: np.ndarray):
+    """(ymin, ymax, xmin, xmax) of a non-empty 2-D mask."""
+    rows, cols = np.nonzero(mask.any(axis=1))[0], np.nonzero(mask.any(axis=0))[0]
+    return rows[0], rows[-1], cols[0], cols[-1]
+
+
+# ------------ occlusion / mirror_rotate ------------
+
+def _occlusion_input(a: np.ndarray, params: dict) -> Optional[str]:
+    back, front = a == color_index(params["colors"][0]), a == color_index(params["colors"][1])
+    if not back.any() or not front.any():
+        return "input lacks the back or the front block"
+    if (a != BACKGROUND)[~(back | front)].any():
+        return "input has cells outside the two blocks"
+    fy0, fy1, fx0, fx1 = _bbox(front)
+    if not front[fy0:fy1 + 1, fx0:fx1 + 1].all():
+        return "front block is not a rectangle"
+    by0, by1, bx0, bx1 = _bbox(back)
+    region = a[by0:by1 + 1, bx0:bx1 + 1]
+    if not front[by0:by1 + 1, bx0:bx1 + 1].any():
+        return "front block does not occlude the back block"
+    if (region == BACKGROUND).any():
+        return "back block is not a rectangle behind the front block"
+    return None
+
+
+@_per_pair
+def _occlusion_reversal(a, b, params):
+    reason = _occlusion_input(a, params)
+    if reason:
+        return reason
+    expected = a.copy()
+    by0, by1, bx0, bx1 = _bbox(a == color_index(params["colors"][0]))
+    expected[by0:by1 + 1, bx0:bx1 + 1] = color_index(params["colors"][0])
+    return None if np.array_equal(expected, b) else MISMATCH
+
+
+def _transformed(fn: Callable) -> Callable:
+    def verifier(inp, out, params):
+        inputs = [_occlusion_input(a, p) for a, p in zip(inp, params)]
+        ok = _reasons(_same(fn(inp), out))
+        return [bad_input or mismatch for bad_input, mismatch in zip(inputs, ok)]
+    return verifier
+
+
+# ------------ attraction ------------
+
+def _rect(mask: np.ndarray):
+    """bbox of `mask` if the mask fills it, else None."""
+    if not mask.any():
+        return None
+    y0, y1, x0, x1 = _bbox(mask)
+    return (y0, y1, x0, x1) if mask[y0:y1 + 1, x0:x1 + 1].all() else None
+
+
+def _attract(a, b, params):
+    c0, c1 = (color_index(c) for c in params["colors"][:2])
+    first, second = _rect(a == c0), _rect(a == c1)
+    if first is None or second is None or second[2] <= first[3]:
+        return False
+    expected = np.zeros_like(b)
+    y0, y1, x0, x1 = first
+    expected[y0:y1 + 1, x0:x1 + 1] = c0
+    y0, y1, sx0, sx1 = second
+    expected[y0:y1 + 1, first[3] + 1:first[3] + 1 + sx1 - sx0 + 1] = c1
+    return np.array_equal(expected, b)
+
+
+def _attract_size(a, b, params):
+    objs = components(a)
+    if len(objs) != 2:
+        return False
+    big, small = sorted(objs, key=lambda o: -o.area)
+    if big.area == small.area or small.bbox[0] <= big.bbox[1] or not (big.mask.all() and small.mask.all()):
+        return False
+    expected = np.zeros_like(b)
+    x0, x1, y0, y1 = big.bbox
+    expected[y0:y1 + 1, x0:x1 + 1] = big.color
+    x0, x1, y0, y1 = small.bbox
+    shift = big.bbox[1] + 1 - x0
+    expected[y0:y1 + 1, x0 + shift:x1 + shift + 1] = small.color
+    return np.array_equal(expected, b)
+
+
+def _repel(a, b, params):
+    """The first block (possibly occluded) stays, the second slides to the right edge."""
+    c0, c1 = (color_index(c) for c in params["colors"][:2])
+    first, second = a == c0, a == c1
+    if not first.any() or _rect(second) is None:
+        return False
+    y0, y1, x0, x1 = _bbox(first)
+    if not (first | second)[y0:y1 + 1, x0:x1 + 1].all():
+        return False
+    expected = np.zeros_like(b)
+    expected[y0:y1 + 1, x0:x1 + 1] = c0
+    sy0, sy1, sx0, sx1 = _bbox(second)
+    shift = a.shape[1] - 1 - sx1
+    expected[sy0:sy1 + 1, sx0 + shift:sx1 + shift + 1] = c1
+    return np.array_equal(expected, b)
+
+
+def _any_rotation(check: Callable) -> Callable:
+    """The generators rotate input and output together 0-3 times; undo each candidate rotation."""
+    def verify(a, b, params):
+        for k in range(4):
+            if np.rot90(a, -k).shape == np.rot90(b, -k).shape and check(np.rot90(a, -k), np.rot90(b, -k), params):
+                return None
+        return MISMATCH
+    verify.__name__ = check.__name__
+    return _per_pair(verify)
+
+
+# ------------ color counting ------------
+
+def _counts(inp: np.ndarray) -> np.ndarray:
+    """(B, P) cell count per palette index, background excluded."""
+    size = max(int(inp.max()) + 1, 1)
+    counts = (inp[..., None] == np.arange(size)).sum(axis=(1, 2))
+    counts[:, BACKGROUND] = 0
+    return counts
+
+
+def _recolor_all(inp, out, candidates: np.ndarray) -> list:
+    """Output = every foreground cell recolored with one of the (B, P) `candidates` colors."""
+    fg = inp != BACKGROUND
+    ok = np.zeros(len(inp), dtype=bool)
+    for c in np.nonzero(candidates.any(axis=0))[0]:
+        ok |= candidates[:, c] & _same(np.where(fg, c, BACKGROUND), out)
+    return _reasons(ok)
+
+
+def _majority(inp, out, params):
+    counts = _counts(inp)
+    return _recolor_all(inp, out, (counts == counts.max(axis=1, keepdims=True)) & (counts > 0))
+
+
+def _minority(inp, out, params):
+    counts = _counts(inp)
+    present = counts > 0
+    least = np.where(present, counts, np.iinfo(counts.dtype).max)
+    candidates = present & (least == least.min(axis=1, keepdims=True))
+    # a single color in the input: the generator's second color was drawn but not placed
+    single = present.sum(axis=1) == 1
+    if single.any():
+        declared = np.zeros((len(inp), max(counts.shape[1], 1 + max(
+            color_index(c) for p in params for c in p["colors"]))), dtype=bool)
+        for i, p in enumerate(params):
+            declared[i, [color_index(c) for c in p["colors"]]] = True
+        candidates = np.pad(candidates, ((0, 0), (0, declared.shape[1] - counts.shape[1])))
+        present = np.pad(present, ((0, 0), (0, declared.shape[1] - counts.shape[1])))
+        candidates[single] = declared[single] & ~present[single]
+    return _recolor_all(inp, out, candidates)
+
+
+def _inversion(inp, out, params):
+    present = _counts(inp) > 0
+    lo = present.argmax(axis=1)[:, None, None]
+    hi = (present.shape[1] - 1 - present[:, ::-1].argmax(axis=1))[:, None, None]
+    expected = np.where(inp == lo, hi, np.where(inp == hi, lo, inp))
+    ok = _same(expected, out) & (present.sum(axis=1) == 2)
+    return _reasons(ok)
+
+
+@_per_pair
+def _cross_plus(a, b, params):
+    """Exact cover of the gray cells by cross and plus stamps whose output colors match."""
+    from src.rules.color import OFFSETS
+
+    gray = color_index(params["colors"][0])
+    stamp_color = {"cross": color_index(params["colors"][1]), "plus": color_index(params["colors"][2])}
+    if ((a != BACKGROUND) & (a != gray)).any() or a.shape != b.shape:
+        return "input has non-gray cells"
+    if ((b != BACKGROUND) != (a == gray)).any():
+        return MISMATCH
+    # bit planes (src.bitboard): a stamp placement is valid if it lies within the remaining gray cells and
+    # within the output cells of its color
+    rows, cols = a.shape
+    anchors = {shape: min(offsets) for shape, offsets in OFFSETS.items()}  # first cell in row-major order
+    stamps = {shape: stamp_bits(offsets, cols) for shape, offsets in OFFSETS.items()}
+    extent = {shape: (max(dr for dr, _ in offsets), max(dc for _, dc in offsets)) for shape, offsets in OFFSETS.items()}
+    colored = {shape: Bitboard.from_mask(b == stamp_color[shape]).bits for shape in OFFSETS}
+
+    def cover(remaining: int) -> bool:
+        if not remaining:
+            return True
+        r, c = lowest_cell(remaining, cols)
+        for shape, (ar, ac) in anchors.items():
+            top_r, top_c = r - ar, c - ac
+            if not (0 <= top_r < rows - extent[shape][0] and 0 <= top_c < cols - extent[shape][1]):
+                continue
+            stamp = stamps[shape] << (top_r * cols + top_c)
+            if stamp & remaining & colored[shape] == stamp and cover(remaining ^ stamp):
+                return True
+        return False
+
+    gray_cells = Bitboard.from_mask(a == gray).bits
+    return None if cover(gray_cells) else "gray cells are no exact cover of stamps"
+
+
+# ------------ expansion ------------
+
+def _centers(inp, params):
+    c0, c1 = _colors(params, 0)[:, None, None], _colors(params, 1)[:, None, None]
+    return inp == c0, c0, c1
+
+
+def _expansion(rays_of: Callable) -> Callable:
+    def verifier(inp, out, params):
+        centers, c0, c1 = _centers(inp, params)
+        expected = np.where(centers, c0, np.where(rays_of(centers), c1, BACKGROUND))
+        ok = _same(expected, out) & ((inp != BACKGROUND) == centers).all(axis=(1, 2))
+        return _reasons(ok)
+    return verifier
+
+
+def _step(offsets) -> Callable:
+    def rays(centers):
+        padded = np.pad(centers, ((0, 0), (1, 1), (1, 1)))
+        h, w = centers.shape[1:]
+        hit = np.zeros_like(centers)
+        for dr, dc in offsets:
+            hit |= padded[:, 1 - dr:1 - dr + h, 1 - dc:1 - dc + w]
+        return hit
+    return rays
+
+
+def _plus_rays(centers):
+    return centers.any(axis=2)[:, :, None] | centers.any(axis=1)[:, None, :]
+
+
+def _star_rays(centers):
+    b, h, w = centers.shape
+    rows, cols = np.indices((h, w))
+    diag, anti = cols - rows + h - 1, cols + rows
+    g, r, c = np.nonzero(centers)
+    has_diag = np.zeros((b, h + w - 1), dtype=bool)
+    has_anti = np.zeros((b, h + w - 1), dtype=bool)
+    has_diag[g, diag[r, c]] = True
+    has_anti[g, anti[r, c]] = True
+    return has_diag[:, diag] | has_anti[:, anti]
+
+
+@_per_pair
+def _three_diagonal(a, b, params):
+    """Every center draws three of its four diagonal rays; search the omitted one per center."""
+    c0, c1 = (color_index(c) for c in params["colors"][:2])
+    centers = a == c0
+    if ((a != BACKGROUND) != centers).any() or a.shape != b.shape or not np.array_equal(b == c0, centers):
+        return MISMATCH
+    painted = b == c1
+    h, w = a.shape
+
+    def ray(r, c, dr, dc):
+        cells = []
+        r, c = r + dr, c + dc
+        while 0 <= r < h and 0 <= c < w:
+            cells.append((r, c))
+            r, c = r + dr, c + dc
+        return cells
+
+    options = []
+    for r, c in zip(*np.nonzero(centers)):
+        rays = [ray(r, c, dr, dc) for dr, dc in ((1, 1), (1, -1), (-1, 1), (-1, -1))]
+        full = [all(painted[cell] or centers[cell] for cell in cells) for cells in rays]
+        # the three drawn rays must be fully painted (cells on other centers are repainted with the center color)
+        options.append([[cells for j, cells in enumerate(rays) if j != skip]
+                        for skip in range(4) if all(full[j] for j in range(4) if j != skip)])
+    for choice in itertools.product(*options):
+        drawn = np.zeros_like(painted)
+        for cells in itertools.chain.from_iterable(choice):
+            drawn[tuple(zip(*cells))] = True
+        if np.array_equal(drawn & ~centers, painted):
+            return None
+    return MISMATCH
+
+
+# ------------ registry ------------
+
+VERIFIERS: Dict[str, Callable] = {
+    "occlusion_reversal": _occlusion_reversal,
+    "mirror_rotate.occlusion_mirror_x": _transformed(T.dihedral("mirror_x")),
+    "mirror_rotate.occlusion_mirror_y": _transformed(T.dihedral("mirror_y")),
+    "mirror_rotate.occlusion_rotate_90": _transformed(T.dihedral("rot90")),
+    "mirror_rotate.occlusion_rotate_180": _transformed(T.dihedral("rot180")),
+    "attraction.color": _any_rotation(_attract),
+    "attraction.size": _any_rotation(_attract_size),
+    "attraction.gravity": lambda inp, out, params: _reasons(_same(T.gravity()(inp), out)),
+    "attraction.float": lambda inp, out, params: _reasons(_same(T.gravity(toward_end=True)(inp), out)),
+    "attraction.repulsion_gun": _any_rotation(_repel),
+    "attraction.repulsion_ambiguous": _any_rotation(_repel),
+    "attraction.gravity_dots": lambda inp, out, params: _reasons(_same(T.gravity()(inp), out)),
+    "expansion.star_step": _expansion(_step(((1, 1), (1, -1), (-1, 1), (-1, -1)))),
+    "expansion.star_full": _expansion(_star_rays),
+    "expansion.plus_step": _expansion(_step(((1, 0), (-1, 0), (0, 1), (0, -1)))),
+    "expansion.plus_full": _expansion(_plus_rays),
+    "expansion.3diagonal_full": _three_diagonal,
+    "arithmetic.majority_recolor": _majority,
+    "arithmetic.minority_recolor": _minority,
+    "color.inversion_recolor": _inversion,
+    "color.odd_recolor": _minority,  # the odd block is the minority color (either one with 1 vs 1)
+    "color.cross_plus_recolor": _cross_plus,
+}
+
+
+def verify_pairs(rule: str, inputs, outputs, params: List[dict]) -> List[Optional[str]]:
+    """Reason per pair (None = correct); grids may be Grid objects or 2-D palette arrays."""
+    verifier = VERIFIERS[rule]
+    inputs = [g if isinstance(g, np.ndarray) else g.to_array() for g in inputs]
+    outputs = [g if isinstance(g, np.ndarray) else g.to_array() for g in outputs]
+    groups = {}
+    for i, (a, b) in enumerate(zip(inputs, outputs)):
+        groups.setdefault((a.shape, b.shape), []).append(i)
+    reasons = [None] * len(inputs)
+    for members in groups.values():
+        batch = verifier(np.stack([inputs[i] for i in members]), np.stack([outputs[i] for i in members]),
+                         [params[i] for i in members])
+        for i, reason in zip(members, batch):
+            reasons[i] = reason
+    return reasons
+
+
+# ------------ datasets ------------
+
+def verify_records(rule: str, records: List[dict], check_fingerprints: bool = True) -> List[dict]:
+    """Regenerate `records` of `rule` from their seeds and return the mismatches."""
+    from src.codec import decode_pair
+    from src.dedup import pair_fingerprint
+
+    mismatches, pairs = [], []
+    for rec, produced, error in regenerate(rule, records):
+        if error:
+            mismatches.append(_mismatch(rec, error))
+            continue
+        inp, out, params = produced
+        fp = rec.get("fingerprint")
+        if check_fingerprints and fp:
+            sym, pal = (flag == "1" for flag in fp[1:4:2])
+            if pair_fingerprint(inp, out, sym, pal) != fp:
+                mismatches.append(_mismatch(rec, "regenerated pair differs from the recorded fingerprint"))
+                continue
+        if rec.get("grids"):
+            a, b = decode_pair(rec["grids"])
+            if not (np.array_equal(a, inp.to_array()) and np.array_equal(b, out.to_array())):
+                mismatches.append(_mismatch(rec, "regenerated pair differs from the recorded grids"))
+                continue
+        pairs.append((rec, inp, out, params))
+
+    if pairs:
+        reasons = verify_pairs(rule, [p[1] for p in pairs], [p[2] for p in pairs], [p[3] for p in pairs])
+        mismatches += [_mismatch(rec, reason) for (rec, *_), reason in zip(pairs, reasons) if reason]
+    return mismatches
+
+
+def _mismatch(rec: dict, reason: str) -> dict:
+    return {"id": rec.get("id"), "rule": rec.get("rule"), "seed": rec.get("seed"),
+            "gen_kwargs": rec.get("gen_kwargs"), "reason": reason}
+
+
+def dataset_records(out_root) -> Dict[str, List[dict]]:
+    """rule -> records of a build: loose-file manifests plus the shard index."""
+    from src.manifest import load_records
+    from src.shards import SHARD_DIR, read_index
+
+    out_root = Path(out_root)
+    by_rule: Dict[str, List[dict]] = {}
+    recs = [rec for d in sorted(out_root.iterdir()) if d.is_dir() and d.name != SHARD_DIR
+            for rec in load_records(d / "stimuli.jsonl")]
+    for rec in recs + read_index(out_root / SHARD_DIR):
+        if rec.get("rule") and rec.get("seed") is not None:
+            by_rule.setdefault(rec["rule"], []).append(rec)
+    return by_rule
+
+
+def _verify_job(job) -> tuple:
+    rule, records = job
+    return rule, len(records), verify_records(rule, records)
+
+
+def verify_dataset(out_root, rules=("*",), workers: int = 1, chunk_size: int = 2000) -> dict:
+    """Verify every record of the selected rules in `out_root`; returns a report with all mismatches."""
+    import fnmatch
+
+    by_rule = {rule: recs for rule, recs in dataset_records(out_root).items()
+               if any(fnmatch.fnmatchcase(rule, p) or fnmatch.fnmatchcase(rule.split(".", 1)[0], p) for p in rules)}
+    report = {"checked": {}, "skipped": {}, "mismatches": []}
+    jobs = []
+    for rule, recs in sorted(by_rule.items()):
+        if rule not in VERIFIERS:
+            report["skipped"][rule] = len(recs)
+            continue
+        jobs += [(rule, recs[i:i + chunk_size]) for i in range(0, len(recs), chunk_size)]
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_verify_job, jobs))
+    else:
+        results = [_verify_job(job) for job in jobs]
+    for rule, n, mismatches in results:
+        report["checked"][rule] = report["checked"].get(rule, 0) + n
+        report["mismatches"] += mismatches
+    return report
+
+
+def print_report(report: dict) -> None:
+    failed = {}
+    for m in report["mismatches"]:
+        failed[m["rule"]] = failed.get(m["rule"], 0) + 1
+    print(f"{'rule':38} {'checked':>9} {'failed':>8}")
+    for rule, n in sorted(report["checked"].items()):
+        print(f"{rule:38} {n:>9} {failed.get(rule, 0):>8}")
+    for rule, n in sorted(report["skipped"].items()):
+        print(f"{rule:38} {n:>9} {'no verifier':>8}")
+    for m in report["mismatches"][:50]:
+        print(f"  {m['id']} seed={m['seed']} {m['gen_kwargs'] or ''}: {m['reason']}")
+    if len(report["mismatches"]) > 50:
+        print(f"  ... {len(report['mismatches']) - 50} more")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify a build by regenerating every pair from its seed.")
+    parser.add_argument("out_root", nargs="?", default="out")
+    parser.add_argument("--rule", action="append", metavar="GLOB", help="rule name or family glob, repeatable")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=2000, help="records per job")
+    parser.add_argument("--report", metavar="JSON", help="write the full report here")
+    args = parser.parse_args()
+
+    result = verify_dataset(args.out_root, args.rule or ("*",), args.workers, args.chunk_size)
+    print_report(result)
+    if args.report:
+        Path(args.report).write_text(json.dumps(result, indent=2), encoding="utf-8")
+    sys.exit(1 if result["mismatches"] else 0)
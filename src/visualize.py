@@ -1,21 +1,25 @@
-import numpy as np
-import matplotlib.colors as mcolors
-import matplotlib.pyplot as plt
+from src.profiling import profiled, stage
 
 
-def save_grid(grid, save_path="output.png"):
-    rows, cols = grid.rows, grid.cols
-    color_grid = grid.as_list()
+# ------------ figures ------------
+# Built without pyplot (no global figure manager, always Agg); the image data is set afterwards, so a figure can
+# be kept and reused for every grid of its shape (see src.render_service).
+# numpy and matplotlib (~0.5 s) are imported on the first render, not with this module.
 
-    # Convert color names/hex to normalized RGB
-    rgb_grid = np.array([
-        [mcolors.to_rgb(color_grid[r][c]) for c in range(cols)]
-        for r in range(rows)
-    ])
+def _new_figure(figsize):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
 
-    fig, ax = plt.subplots(figsize=(cols, rows))
-    fig.patch.set_facecolor("gray")
-    ax.imshow(rgb_grid, interpolation='none', extent=(0, cols, rows, 0))
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _grid_axes(ax, rows, cols):
+    """Image artist + gridlines of one grid; fill it with `set_data(rgb)`."""
+    import numpy as np
+
+    im = ax.imshow(np.zeros((rows, cols, 3)), interpolation='none', extent=(0, cols, rows, 0))
 
     # Draw vertical and horizontal gridlines
     for x in range(cols + 1):
@@ -27,30 +31,21 @@ def save_grid(grid, save_path="output.png"):
     ax.set_ylim(0, rows)
     ax.set_aspect('equal')
     ax.axis('off')
+    return im
 
-    plt.savefig(save_path, dpi=100, bbox_inches='tight', pad_inches=0.03)
 
-    plt.close()
+def grid_figure(rows, cols):
+    """(figure, [image]) for a single rows x cols grid."""
+    fig = _new_figure((cols, rows))
+    fig.patch.set_facecolor("gray")
+    return fig, [_grid_axes(fig.subplots(), rows, cols)]
 
 
-def save_combined_grids(grid1, grid2, save_path="combined.png"):
-    rows1, cols1 = grid1.rows, grid1.cols
-    rows2, cols2 = grid2.rows, grid2.cols
-
-    rgb_grid1 = np.array([
-        [mcolors.to_rgb(grid1.as_list()[r][c]) for c in range(cols1)]
-        for r in range(rows1)
-    ])
-    rgb_grid2 = np.array([
-        [mcolors.to_rgb(grid2.as_list()[r][c]) for c in range(cols2)]
-        for r in range(rows2)
-    ])
-
-    fig, axs = plt.subplots(
-        1, 2,
-        figsize=(cols1 + cols2 + 2, max(rows1, rows2)),  # extra horizontal room
-        gridspec_kw={'wspace': 0.25}  # space for arrow
-    )
+def combined_figure(shape1, shape2):
+    """(figure, [image1, image2]) for an input -> output pair of the given (rows, cols) shapes."""
+    (rows1, cols1), (rows2, cols2) = shape1, shape2
+    fig = _new_figure((cols1 + cols2 + 2, max(rows1, rows2)))  # extra horizontal room
+    axs = fig.subplots(1, 2, gridspec_kw={'wspace': 0.25})  # space for arrow
     fig.patch.set_facecolor("gray")
 
     fig.text(
@@ -63,28 +58,35 @@ def save_combined_grids(grid1, grid2, save_path="combined.png"):
         color="white",
         fontweight="bold"
     )
+    return fig, [_grid_axes(axs[0], rows1, cols1), _grid_axes(axs[1], rows2, cols2)]
+
+
+def save_figure(fig, save_path):
+    with stage("savefig"):
+        fig.savefig(save_path, dpi=100, bbox_inches='tight', pad_inches=0.03)
 
-    # First grid
-    axs[0].imshow(rgb_grid1, interpolation='none', extent=(0, cols1, rows1, 0))
-    for x in range(cols1 + 1):
-        axs[0].axvline(x, color='gray', linewidth=2)
-    for y in range(rows1 + 1):
-        axs[0].axhline(y, color='gray', linewidth=2)
-    axs[0].set_xlim(0, cols1)
-    axs[0].set_ylim(0, rows1)
-    axs[0].set_aspect('equal')
-    axs[0].axis('off')
-
-    # Second grid
-    axs[1].imshow(rgb_grid2, interpolation='none', extent=(0, cols2, rows2, 0))
-    for x in range(cols2 + 1):
-        axs[1].axvline(x, color='gray', linewidth=2)
-    for y in range(rows2 + 1):
-        axs[1].axhline(y, color='gray', linewidth=2)
-    axs[1].set_xlim(0, cols2)
-    axs[1].set_ylim(0, rows2)
-    axs[1].set_aspect('equal')
-    axs[1].axis('off')
-
-    plt.savefig(save_path, dpi=100, bbox_inches='tight', pad_inches=0.03)
-    plt.close()
+
+def rgb_array(grid):
+    """Color names/hex of a grid -> normalized (rows, cols, 3) RGB."""
+    import numpy as np
+    import matplotlib.colors as mcolors
+
+    color_grid = grid.as_list()
+    return np.array([[mcolors.to_rgb(color) for color in row] for row in color_grid]).reshape(grid.rows, grid.cols, 3)
+
+
+# ------------ one-off renders ------------
+
+@profiled("save_grid")
+def save_grid(grid, save_path="output.png"):
+    fig, (im,) = grid_figure(grid.rows, grid.cols)
+    im.set_data(rgb_array(grid))
+    save_figure(fig, save_path)
+
+
+@profiled("save_combined_grids")
+def save_combined_grids(grid1, grid2, save_path="combined.png"):
+    fig, (im1, im2) = combined_figure((grid1.rows, grid1.cols), (grid2.rows, grid2.cols))
+    im1.set_data(rgb_array(grid1))
+    im2.set_data(rgb_array(grid2))
+    save_figure(fig, save_path)